@@ -8,9 +8,13 @@ MODEL_PATH = MODEL_BASE_PATH / "sorafenib_body_flat.xml"
 RESULTS_PATH = SORAFENIB_PATH / "results"
 RESULTS_PATH_SIMULATION = RESULTS_PATH / "simulation"
 RESULTS_PATH_FIT = RESULTS_PATH / "fit"
+RESULTS_PATH_POPULATION = RESULTS_PATH / "population"
 
 H5_PATH = RESULTS_PATH / "pkdb.h5"
 
+# on-disk cache of simulation results
+CACHE_PATH = SORAFENIB_PATH / "cache"
+
 # DATA_PATH_BASE = SORAFENIB_PATH.parents[3] / "pkdb_data" / "studies"
 DATA_PATH_BASE = SORAFENIB_PATH / "data"
 DATA_PATH_SORAFENIB = DATA_PATH_BASE / "sorafenib"
@@ -0,0 +1,191 @@
+"""On-disk cache for simulation results.
+
+Results are stored content-addressed, i.e. the key is the hash of the
+SBML model, the complete simulation definition (including all changes),
+the timecourse selections and the integrator settings. The cache is size
+bounded with least recently used results being evicted first.
+"""
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from pint import Quantity
+from sbmlsim.result import XResult
+from sbmlsim.simulation import ScanSim, TimecourseSim
+from sbmlutils.log import get_logger
+
+from pkdb_models.models.sorafenib import CACHE_PATH
+from pkdb_models.models.sorafenib.dosing import DosingSimulatorSerial
+
+logger = get_logger(__name__)
+
+
+def _canonical(o: Any) -> Any:
+    """JSON representation of simulation definitions for hashing."""
+    if isinstance(o, Quantity):
+        return {"magnitude": _canonical(o.magnitude), "units": str(o.units)}
+    if isinstance(o, np.ndarray):
+        return o.tolist()
+    if isinstance(o, np.generic):
+        return o.item()
+    if isinstance(o, Path):
+        return str(o)
+    if hasattr(o, "__dict__"):
+        # complete state, 'to_dict' is incomplete for some simulations
+        return {"type": o.__class__.__name__, **o.__dict__}
+    return str(o)
+
+
+def hash_json(o: Any) -> str:
+    """Hash for JSON serializable object."""
+    content = json.dumps(o, default=_canonical, sort_keys=True)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+_file_hashes: Dict[Tuple[str, int, int], str] = {}
+
+
+def hash_file(path: Path) -> str:
+    """Hash for file content.
+
+    Hashes are memoized on path, size and modification time.
+    """
+    stat = path.stat()
+    key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+    if key not in _file_hashes:
+        with open(path, "rb") as f:
+            _file_hashes[key] = hashlib.sha256(f.read()).hexdigest()
+    return _file_hashes[key]
+
+
+class ResultCache:
+    """Size bounded LRU cache of simulation results on disk."""
+
+    def __init__(self, cache_path: Path = CACHE_PATH, max_size: int = 2 * 1024**3):
+        """Create cache.
+
+        :param cache_path: directory for the cached results
+        :param max_size: maximum size of the cache in bytes
+        """
+        self.cache_path = Path(cache_path)
+        self.max_size = max_size
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_path / f"{key}.pkl"
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get cached object for key, None if not cached."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, EOFError) as err:
+            logger.warning(f"Corrupted cache entry '{path}' removed: {err}")
+            path.unlink(missing_ok=True)
+            return None
+
+        # update access time for LRU
+        os.utime(path)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        """Store object for key."""
+        # write atomically, the cache is shared between worker processes
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_path, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._path(key))
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits max_size."""
+        entries = []
+        for path in self.cache_path.glob("*.pkl"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        size = sum(e[1] for e in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            size -= entry_size
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        for path in self.cache_path.glob("*.pkl"):
+            path.unlink(missing_ok=True)
+
+
+class CachedSimulatorSerial(DosingSimulatorSerial):
+    """Serial simulator which looks up results in a ResultCache.
+
+    Simulations are only integrated if the result is not cached.
+    """
+
+    def __init__(self, model=None, cache: ResultCache = None, **kwargs):
+        self.cache = cache if cache is not None else ResultCache()
+        self._caching = False
+        super().__init__(model=model, **kwargs)
+
+    def _cache_key(self, simulation: Any) -> str:
+        """Key from model, simulation, selections and integrator settings."""
+        source = self.model.source
+        if source.is_path():
+            model_hash = hash_file(source.path)
+        else:
+            model_hash = hashlib.sha256(source.content.encode("utf-8")).hexdigest()
+
+        integrator = self.r.integrator
+        return hash_json({
+            "model": model_hash,
+            "simulation": simulation,
+            "selections": list(self.r.timeCourseSelections),
+            "integrator": {
+                "name": integrator.getName(),
+                "settings": {
+                    key: str(integrator.getValue(key))
+                    for key in integrator.getSettings()
+                },
+            },
+        })
+
+    def run_timecourse(self, simulation: TimecourseSim) -> XResult:
+        """Run single timecourse or get result from cache."""
+        return self._cached(simulation, super().run_timecourse)
+
+    def run_scan(self, scan: ScanSim) -> XResult:
+        """Run scan simulation or get result from cache."""
+        return self._cached(scan, super().run_scan)
+
+    def _cached(self, simulation, f_run) -> XResult:
+        if self._caching:
+            # nested call, e.g. run_timecourse via run_scan
+            return f_run(simulation)
+
+        # normalize before hashing so equal changes in different units match
+        simulation.normalize(uinfo=self.uinfo)
+        key = self._cache_key(simulation)
+        xds = self.cache.get(key)
+        if xds is not None:
+            logger.debug(f"Simulation result from cache: '{key}'")
+            return XResult(xdataset=xds, uinfo=self.uinfo)
+
+        self._caching = True
+        try:
+            xres = f_run(simulation)
+        finally:
+            self._caching = False
+        self.cache.put(key, xres.xds)
+        return xres
@@ -0,0 +1,155 @@
+"""Parquet cache of the datasets of simulation experiments.
+
+Loading the datasets of a study parses the TSV files, splits them in
+DataSets and converts the units (molecular weights). This is repeated on
+every run and in every fit worker. The processed, unit converted DataSets
+are therefore cached as parquet files (one file per dataset) in
+
+    CACHE_PATH/datasets/<sid>/<dataset>.parquet
+
+together with the units in 'metadata.json'. The cache is invalidated by the
+hash of the study TSV files ('.<sid>_*.tsv'), the source files of the
+experiment class (dataset processing, molecular weights) and the sbmlsim
+version. Cached datasets are read memory-mapped.
+
+Experiments are initialized concurrently by worker processes, so a cache is
+written to a temporary directory of the process and moved in place; caches
+which cannot be read (e.g. replaced while reading) are cache misses.
+"""
+import functools
+import inspect
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+import sbmlsim
+from sbmlsim.data import DataSet
+from sbmlsim.units import UnitsInformation
+from sbmlutils.log import get_logger
+
+from pkdb_models.models.sorafenib import CACHE_PATH
+from pkdb_models.models.sorafenib.cache import hash_file, hash_json
+
+logger = get_logger(__name__)
+
+DATASETS_CACHE_PATH = CACHE_PATH / "datasets"
+
+
+def datasets_hash(experiment) -> str:
+    """Hash of all inputs of the datasets of the experiment."""
+    data_paths = experiment.data_path
+    if isinstance(data_paths, Path):
+        data_paths = [data_paths]
+
+    sources: List[Path] = []
+    for data_path in data_paths:
+        sources.extend(
+            sorted((Path(data_path) / experiment.sid).glob(f".{experiment.sid}_*.tsv"))
+        )
+    for cls in type(experiment).__mro__:
+        if cls.__module__.startswith("pkdb_models"):
+            sources.append(Path(inspect.getsourcefile(cls)))
+
+    return hash_json({
+        "sbmlsim": sbmlsim.__version__,
+        "sources": {str(path): hash_file(path) for path in sources},
+    })
+
+
+def load_datasets(path: Path, key: str, ureg) -> Optional[Dict[str, DataSet]]:
+    """Load cached datasets, None if not cached or outdated."""
+    try:
+        with open(path / "metadata.json", "r") as f:
+            metadata = json.load(f)
+        if metadata["key"] != key:
+            return None
+
+        dsets = {}
+        for dkey, info in metadata["datasets"].items():
+            df = pd.read_parquet(path / info["file"], memory_map=True)
+            dset = DataSet(df)
+            dset.uinfo = UnitsInformation(info["units"], ureg=ureg)
+            dset.Q_ = dset.uinfo.ureg.Quantity
+            dsets[dkey] = dset
+    except (OSError, ValueError) as err:
+        # not cached, or replaced by a concurrent worker while reading
+        logger.debug(f"Datasets not loaded from '{path}': {err}")
+        return None
+    return dsets
+
+
+def save_datasets(path: Path, key: str, dsets: Dict[str, DataSet]) -> None:
+    """Store datasets in the cache.
+
+    The cache is written to a temporary directory and replaces the cache at
+    path, readers never see a partially written cache.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = Path(tempfile.mkdtemp(dir=path.parent, prefix=f".{path.name}_"))
+    metadata = {"key": key, "datasets": {}}
+    try:
+        for k, (dkey, dset) in enumerate(dsets.items()):
+            filename = f"{k:03d}.parquet"
+            pd.DataFrame(dset).to_parquet(tmp_path / filename, index=False)
+            metadata["datasets"][dkey] = {
+                "file": filename,
+                "units": dict(dset.uinfo.udict),
+            }
+        with open(tmp_path / "metadata.json", "w") as f:
+            json.dump(metadata, f, indent=2)
+    except Exception as err:
+        # e.g. columns with mixed types, which cannot be stored as parquet
+        logger.warning(f"Datasets could not be cached in '{path}': {err}")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        return
+
+    stale_path = None
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        # existing cache (outdated or stored by a concurrent worker) is
+        # moved aside, directories are only replaced if empty
+        stale_path = Path(tempfile.mkdtemp(dir=path.parent, prefix=f".{path.name}_"))
+        try:
+            os.replace(path, stale_path)
+            os.replace(tmp_path, path)
+        except OSError:
+            # cache was replaced concurrently, it is equally valid
+            pass
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if stale_path is not None:
+            shutil.rmtree(stale_path, ignore_errors=True)
+
+
+def cached_datasets(datasets: Callable) -> Callable:
+    """Decorator of 'SimulationExperiment.datasets' using the datasets cache.
+
+    Cache is used if the 'cache_datasets' attribute of the experiment is set.
+    """
+
+    @functools.wraps(datasets)
+    def wrapper(self) -> Dict[str, DataSet]:
+        if not getattr(self, "cache_datasets", False) or getattr(
+            self, "_datasets_caching", False
+        ):
+            return datasets(self)
+
+        path = DATASETS_CACHE_PATH / self.sid
+        key = datasets_hash(self)
+        dsets = load_datasets(path, key=key, ureg=self.ureg)
+        if dsets is None:
+            # nested calls, e.g. super().datasets(), are not cached separately
+            self._datasets_caching = True
+            try:
+                dsets = datasets(self)
+            finally:
+                self._datasets_caching = False
+            save_datasets(path, key=key, dsets=dsets)
+        return dsets
+
+    return wrapper
@@ -0,0 +1,153 @@
+"""Shape-preserving decimation of dense lines in matplotlib figures.
+
+Multi-dose timecourses (e.g. 29 doses with 200 points each) contain many
+more points per curve than the axes have pixels, so vector formats (SVG)
+become large and slow to render. Before figures are serialized, the
+simulation lines are decimated to a pixel budget of the figure:
+
+    LTTB    largest-triangle-three-buckets, keeps per bucket the point which
+            spans the largest triangle with its neighbours (visual shape)
+    MINMAX  keeps minimum and maximum per bucket (exact envelope, peaks
+            and troughs of the dosing are never lost)
+
+The budget of every axes is its width in screen pixels times
+'points_per_pixel'. Screen pixels are counted at SCREEN_DPI independent of the
+dpi of the figure: figures are rendered at 300-600 dpi, a budget in output
+pixels would not decimate any of the multi-dose timecourses.
+Only lines without markers (simulations) with finite data are decimated,
+lines with markers (data points, error bars) are never changed.
+"""
+from enum import Enum
+from typing import Optional
+
+import numpy as np
+from matplotlib.figure import Figure as FigureMPL
+from matplotlib.lines import Line2D
+
+# resolution of the pixel budget of the figures [pixel/inch]
+SCREEN_DPI = 72
+
+
+class Decimation(str, Enum):
+    """Decimation method of lines."""
+
+    LTTB = "lttb"
+    MINMAX = "minmax"
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices of the points selected by largest-triangle-three-buckets.
+
+    :param x: monotonic x values
+    :param y: y values
+    :param n_out: number of points to keep (including first and last point)
+    :return: sorted indices of the selected points
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # buckets of the inner points, first and last point are always kept
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    indices = np.empty(n_out, dtype=int)
+    indices[0], indices[-1] = 0, n - 1
+
+    a = 0
+    for k in range(n_out - 2):
+        start, end = edges[k], edges[k + 1]
+        # average of the next bucket (last point for the last bucket)
+        next_end = edges[k + 2] if k + 2 < len(edges) else n
+        next_start = end if k + 2 < len(edges) else n - 1
+        x_avg = x[next_start:next_end].mean()
+        y_avg = y[next_start:next_end].mean()
+
+        # twice the triangle areas (a, point, average of next bucket)
+        areas = np.abs(
+            (x[a] - x_avg) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (y_avg - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        indices[k + 1] = a
+
+    return indices
+
+
+def minmax(y: np.ndarray, n_out: int) -> np.ndarray:
+    """Indices of the minimum and maximum of n_out/2 equally sized buckets.
+
+    :param y: y values
+    :param n_out: maximal number of points to keep
+    :return: sorted indices of the selected points
+    """
+    n = len(y)
+    n_buckets = n_out // 2
+    if n_out >= n or n_buckets < 1:
+        return np.arange(n)
+
+    buckets = np.arange(n) * n_buckets // n
+    # sorted by bucket and value, first and last entry are minimum and maximum
+    order = np.lexsort((y, buckets))
+    starts = np.searchsorted(buckets[order], np.arange(n_buckets))
+    ends = np.append(starts[1:], n) - 1
+    indices = np.concatenate([[0], order[starts], order[ends], [n - 1]])
+    return np.unique(indices)
+
+
+def decimate_line(
+    line: Line2D,
+    n_out: int,
+    method: Decimation = Decimation.LTTB,
+) -> bool:
+    """Decimate data of line in place.
+
+    :return: True if line was decimated
+    """
+    if line.get_marker() not in {"None", "", " ", None}:
+        return False
+    x = np.asarray(line.get_xdata(), dtype=float)
+    y = np.asarray(line.get_ydata(), dtype=float)
+    if x.ndim != 1 or len(x) <= n_out or len(x) != len(y):
+        return False
+
+    # shape is preserved in display coordinates
+    ax = line.axes
+    with np.errstate(divide="ignore", invalid="ignore"):
+        xd = np.log10(x) if ax is not None and ax.get_xscale() == "log" else x
+        yd = np.log10(y) if ax is not None and ax.get_yscale() == "log" else y
+    if not (np.all(np.isfinite(xd)) and np.all(np.isfinite(yd))):
+        return False
+    if np.any(np.diff(xd) < 0):
+        return False
+
+    if Decimation(method) == Decimation.LTTB:
+        indices = lttb(xd, yd, n_out)
+    else:
+        indices = minmax(yd, n_out)
+    line.set_data(x[indices], y[indices])
+    return True
+
+
+def decimate_figure(
+    fig: FigureMPL,
+    method: Decimation = Decimation.LTTB,
+    pixels: Optional[int] = None,
+    points_per_pixel: float = 2.0,
+) -> int:
+    """Decimate all simulation lines of the figure to a pixel budget.
+
+    :param fig: matplotlib figure
+    :param method: decimation method
+    :param pixels: pixel budget (width) of the figure, defaults to the
+        width of the figure in screen pixels (SCREEN_DPI)
+    :param points_per_pixel: points per pixel of the axes width
+    :return: number of decimated lines
+    """
+    if pixels is None:
+        pixels = fig.get_figwidth() * SCREEN_DPI
+
+    count = 0
+    for ax in fig.get_axes():
+        n_out = max(int(ax.get_position().width * pixels * points_per_pixel), 3)
+        for line in ax.get_lines():
+            count += decimate_line(line, n_out=n_out, method=method)
+    return count
@@ -0,0 +1,331 @@
+"""Dosing schedules simulated on a single output grid.
+
+Multiple dosing was encoded as chains of deep-copied Timecourse objects,
+one per dose, each with its own output grid and DataFrame. A DosingSchedule
+describes the regimen compactly (dose times, amounts, missed doses) and is
+simulated in a single pass over one output grid. Doses are applied as
+instantaneous increments of the dose state at the dosing times, i.e. like
+the event assignment 'PODOSE_sor = PODOSE_sor + dose'.
+"""
+from copy import deepcopy
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from pint import Quantity
+from roadrunner import SelectionRecord
+from sbmlsim.simulation import Timecourse, TimecourseSim
+from sbmlsim.simulator import SimulatorSerial
+from sbmlsim.units import UnitsInformation
+from sbmlutils.log import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class DosingSchedule:
+    """Oral dosing schedule.
+
+    :param times: dosing times [min]
+    :param doses: dose amounts, one per dosing time
+    :param missed: indices of missed doses
+    :param sid: id of the dose state
+    """
+
+    times: List[float]
+    doses: List[Quantity]
+    missed: List[int] = field(default_factory=list)
+    sid: str = "PODOSE_sor"
+
+    def __post_init__(self):
+        if len(self.times) != len(self.doses):
+            raise ValueError(
+                f"Number of dosing times and doses differ: "
+                f"{len(self.times)} != {len(self.doses)}"
+            )
+
+    @classmethod
+    def regular(
+        cls,
+        dose: Quantity,
+        interval: float,
+        n_doses: int,
+        start: float = 0.0,
+        missed: Optional[Iterable[int]] = None,
+        sid: str = "PODOSE_sor",
+    ) -> "DosingSchedule":
+        """Create schedule of n_doses equal doses every interval [min]."""
+        return cls(
+            times=[start + k * interval for k in range(n_doses)],
+            doses=[dose] * n_doses,
+            missed=list(missed) if missed else [],
+            sid=sid,
+        )
+
+    def applied(self) -> List[Tuple[float, Quantity]]:
+        """Taken doses as (time, dose) sorted by time."""
+        missed = set(self.missed)
+        return sorted(
+            (
+                (t, dose)
+                for k, (t, dose) in enumerate(zip(self.times, self.doses))
+                if k not in missed
+            ),
+            key=lambda item: item[0],
+        )
+
+    def normalize(self, uinfo: UnitsInformation) -> None:
+        """Normalize doses to model units."""
+        self.doses = [
+            UnitsInformation.normalize_changes({self.sid: dose}, uinfo=uinfo)[self.sid]
+            for dose in self.doses
+        ]
+
+    def strip_units(self) -> None:
+        """Strip units from doses, doses must be normalized."""
+        self.doses = [
+            dose.magnitude if hasattr(dose, "magnitude") else dose
+            for dose in self.doses
+        ]
+
+
+class DosingTimecourseSim(TimecourseSim):
+    """Timecourse simulation of a dosing schedule on a single output grid.
+
+    The output grid consists of steps + 1 equidistant points between start and
+    end, complemented by the dosing times. Values at a dosing time are after
+    the dose.
+    """
+
+    def __init__(
+        self,
+        schedule: DosingSchedule,
+        start: float,
+        end: float,
+        steps: int,
+        changes: Dict = None,
+        model_changes: Dict = None,
+        time_offset: float = 0.0,
+    ):
+        """Create dosing schedule simulation.
+
+        :param schedule: dosing schedule; doses outside of [start, end) are ignored
+        :param start: start time [min]
+        :param end: end time [min]
+        :param steps: number of equidistant output steps
+        :param changes: changes applied before the first dose
+        :param model_changes: model changes applied before the first dose
+        :param time_offset: time shift of the results
+        """
+        # required by the time vector calculated in the constructor
+        self.schedule = deepcopy(schedule)
+        super().__init__(
+            timecourses=[
+                Timecourse(
+                    start=start,
+                    end=end,
+                    steps=steps,
+                    changes=changes,
+                    model_changes=model_changes,
+                )
+            ],
+            reset=True,
+            time_offset=time_offset,
+        )
+
+    def __repr__(self) -> str:
+        """Get representation."""
+        return f"DosingTimecourseSim({self.schedule}, {self.timecourses[0]})"
+
+    def grid(self) -> np.ndarray:
+        """Output grid including the dosing times [min].
+
+        With output times (see set_output_times) the grid only contains the
+        output times, start, end and the dosing times.
+        """
+        tc = self.timecourses[0]
+        output_times = getattr(self, "output_times", None)
+        if output_times is None:
+            times = np.linspace(tc.start, tc.end, num=tc.steps + 1)
+        else:
+            times = np.asarray(output_times) - self.time_offset
+            times = np.union1d(
+                times[(times >= tc.start) & (times <= tc.end)], [tc.start, tc.end]
+            )
+        return np.union1d(
+            times,
+            [t for t, _ in self.schedule.applied() if tc.start <= t <= tc.end],
+        )
+
+    def _time(self) -> np.ndarray:
+        return self.grid() + self.time_offset
+
+    def normalize(self, uinfo: UnitsInformation) -> None:
+        """Normalize changes and doses."""
+        super().normalize(uinfo=uinfo)
+        self.schedule.normalize(uinfo=uinfo)
+
+    def strip_units(self) -> None:
+        """Strip units from changes and doses."""
+        super().strip_units()
+        self.schedule.strip_units()
+
+    def to_dict(self) -> Dict:
+        """Convert to dictionary."""
+        d = super().to_dict()
+        d["schedule"] = {
+            "times": self.schedule.times,
+            "doses": [str(dose) for dose in self.schedule.doses],
+            "missed": self.schedule.missed,
+            "sid": self.schedule.sid,
+        }
+        return d
+
+
+def set_output_times(simulation: TimecourseSim, times: Optional[Iterable[float]]) -> None:
+    """Restrict the output of the simulation to the given times.
+
+    The integrator only reports the state at the output times (including the
+    time offset), the start and end of the timecourses and the dosing times,
+    instead of the complete output grid. Used in fitting, where only the
+    time points of the data are required. None restores the complete grid.
+    """
+    simulation.output_times = None if times is None else np.unique(
+        np.asarray(list(times), dtype=float)
+    )
+
+
+def _magnitude(item) -> float:
+    try:
+        return float(item.magnitude)
+    except AttributeError:
+        return float(item)
+
+
+class DosingSimulatorSerial(SimulatorSerial):
+    """Serial simulator supporting DosingTimecourseSim.
+
+    Selections of the simulation (TimecourseSim.selections) restrict the
+    timecourse selections of the simulator for the simulation, output times
+    (see set_output_times) restrict the output grid.
+    """
+
+    def _timecourse(self, simulation: TimecourseSim) -> pd.DataFrame:
+        if not simulation.selections:
+            return self._dosing_timecourse(simulation)
+
+        r = self.r
+        selections = list(r.timeCourseSelections)
+        r.timeCourseSelections = list(simulation.selections)
+        try:
+            return self._dosing_timecourse(simulation)
+        finally:
+            r.timeCourseSelections = selections
+
+    def _dosing_timecourse(self, simulation: TimecourseSim) -> pd.DataFrame:
+        if not isinstance(simulation, DosingTimecourseSim):
+            if getattr(simulation, "output_times", None) is not None:
+                return self._sampled_timecourse(simulation)
+            return super()._timecourse(simulation)
+
+        r = self.r
+        tc = simulation.timecourses[0]
+        if simulation.reset:
+            r.resetToOrigin()
+
+        # changes are applied as in SimulatorSerial._timecourse
+        if tc.model_changes:
+            for key, item in tc.model_changes.items():
+                r[key] = _magnitude(item)
+            r.reset(SelectionRecord.DEPENDENT_FLOATING_AMOUNT)
+            r.reset(SelectionRecord.DEPENDENT_INITIAL_GLOBAL_PARAMETER)
+        for key, item in tc.changes.items():
+            r[key] = _magnitude(item)
+
+        grid = simulation.grid()
+        doses: Dict[float, float] = {}
+        for t, dose in simulation.schedule.applied():
+            if tc.start <= t < tc.end:
+                doses[t] = doses.get(t, 0.0) + _magnitude(dose)
+            else:
+                logger.warning(
+                    f"Dose at t={t} outside of [{tc.start}, {tc.end}) is ignored: "
+                    f"'{simulation}'"
+                )
+
+        # integrate between subsequent doses, the state is continued
+        boundaries = sorted(set(doses) | {tc.start, tc.end})
+        sid = simulation.schedule.sid
+        blocks = []
+        colnames = None
+        # output is requested on the grid, also for variable step size
+        integrator = r.integrator
+        variable_step_size = integrator.getValue("variable_step_size")
+        integrator.setValue("variable_step_size", False)
+        try:
+            for k, (t_start, t_end) in enumerate(
+                zip(boundaries[:-1], boundaries[1:])
+            ):
+                if t_start in doses:
+                    r[sid] = r[sid] + doses[t_start]
+                times = grid[(grid >= t_start) & (grid <= t_end)]
+                s = r.simulate(times=times)
+                colnames = s.colnames
+                # the end point is the start of the next segment
+                is_last = k == len(boundaries) - 2
+                blocks.append(np.asarray(s) if is_last else np.asarray(s)[:-1])
+        finally:
+            integrator.setValue("variable_step_size", variable_step_size)
+
+        df = pd.DataFrame(np.vstack(blocks), columns=colnames)
+        df.time = df.time + simulation.time_offset
+        return df
+
+    def _sampled_timecourse(self, simulation: TimecourseSim) -> pd.DataFrame:
+        """Timecourse simulation with output only at the output times.
+
+        Changes are applied as in SimulatorSerial._timecourse, every
+        timecourse is integrated from start to end with output at the output
+        times within the timecourse.
+        """
+        if any(tc.model_manipulations for tc in simulation.timecourses):
+            # model manipulations are only supported on the complete grid
+            return super()._timecourse(simulation)
+
+        r = self.r
+        if simulation.reset:
+            r.resetToOrigin()
+
+        frames = []
+        t_offset = simulation.time_offset
+        integrator = r.integrator
+        variable_step_size = integrator.getValue("variable_step_size")
+        integrator.setValue("variable_step_size", False)
+        try:
+            for k, tc in enumerate(simulation.timecourses):
+                if k == 0 and tc.model_changes:
+                    for key, item in tc.model_changes.items():
+                        r[key] = _magnitude(item)
+                    r.reset(SelectionRecord.DEPENDENT_FLOATING_AMOUNT)
+                    r.reset(SelectionRecord.DEPENDENT_INITIAL_GLOBAL_PARAMETER)
+                for key, item in tc.changes.items():
+                    r[key] = _magnitude(item)
+
+                times = [tc.start, tc.end]
+                if not tc.discard:
+                    local = simulation.output_times - t_offset
+                    times = np.union1d(
+                        local[(local > tc.start) & (local < tc.end)], times
+                    )
+                s = r.simulate(times=times)
+                df = pd.DataFrame(np.asarray(s), columns=s.colnames)
+                df.time = df.time + t_offset
+
+                if not tc.discard:
+                    t_offset += tc.end
+                    frames.append(df)
+        finally:
+            integrator.setValue("variable_step_size", variable_step_size)
+
+        return pd.concat(frames, sort=False)
@@ -1,19 +1,36 @@
 """Reusable functionality for multiple simulation experiments."""
 from collections import namedtuple
-from typing import Dict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
 
 import pandas as pd
 import numpy as np
 import matplotlib
-from sbmlsim.experiment import SimulationExperiment
+import xarray as xr
+from sbmlsim.experiment import ExperimentResult, SimulationExperiment
 from sbmlsim.model import AbstractModel
+from sbmlsim.simulation import Dimension, ScanSim, TimecourseSim
 from sbmlsim.task import Task
-
-from pkdb_models.models.sorafenib import MODEL_PATH
+from sbmlutils.log import get_logger
+
+from pkdb_models.models.sorafenib import figure_collection, figure_rendering
+from pkdb_models.models.sorafenib.data_cache import cached_datasets
+from pkdb_models.models.sorafenib.decimation import Decimation, decimate_figure
+from pkdb_models.models.sorafenib.dosing import DosingSchedule, DosingTimecourseSim
+from pkdb_models.models.sorafenib.experiments.scan_cube import scan_cube, scan_pk_cube
+from pkdb_models.models.sorafenib.experiments.scan_grid import (
+    ScanAxis,
+    ScanDesign,
+    ScanGrid,
+)
+from pkdb_models.models.sorafenib.model_pool import MODEL
+from pkdb_models.models.sorafenib.results_store import ResultsStore
 
 # Constants for conversion
 from pkdb_models.models.sorafenib.sorafenib_pk import calculate_sorafenib_pk
 
+logger = get_logger(__name__)
+
 MolecularWeights = namedtuple("MolecularWeights", "sor m2 sg")
 
 
@@ -114,15 +131,41 @@ class SorafenibSimulationExperiment(SimulationExperiment):
         "Severe renal impairment": "#006d2c",
     }
 
+    # datasets are additionally written as TSV, the HTML report links these
+    save_tsv: bool = True
+
+    # observables of the tasks used in the figures (selections are
+    # reduced to these observables and the observables of the fit mappings)
+    observables: List[str] = ["[Cve_sor]"]
+
+    # processed datasets are cached as parquet, see data_cache
+    cache_datasets: bool = True
+
+    # number of processes for rendering figures, see figure_rendering
+    figure_jobs: int = 1
+
+    # decimation of dense simulation lines before rendering (None: all
+    # points), pixel budget defaults to the figure width at screen
+    # resolution, see decimation
+    decimation: Optional[Decimation] = None
+    decimation_pixels: Optional[int] = None
+
+    # compression of the HDF5 results store (None: contiguous series which
+    # can be memory-mapped), see results_store
+    results_compression: Optional[str] = "gzip"
+
+    # PNG figures are collected in '<output_path>/_figures', see figure_collection
+    collect_figures: bool = True
+
+    def __init_subclass__(cls, **kwargs):
+        """Use the datasets cache for datasets of all experiments."""
+        super().__init_subclass__(**kwargs)
+        if "datasets" in vars(cls):
+            cls.datasets = cached_datasets(vars(cls)["datasets"])
+
     def models(self) -> Dict[str, AbstractModel]:
-        Q_ = self.Q_
-        return {
-            "model": AbstractModel(
-                source=MODEL_PATH,
-                language_type=AbstractModel.LanguageType.SBML,
-                changes={},
-            )
-        }
+        # shared definition, resolved to the compiled model of the model pool
+        return {"model": MODEL}
 
     @staticmethod
     def _default_changes(Q_):
@@ -147,6 +190,239 @@ class SorafenibSimulationExperiment(SimulationExperiment):
         """Default changes to simulations."""
         return SorafenibSimulationExperiment._default_changes(Q_=self.Q_)
 
+    def dosing_simulation(
+        self,
+        schedule: DosingSchedule,
+        end: float,
+        steps: int,
+        changes: Dict = None,
+        time_offset: float = 0.0,
+    ) -> DosingTimecourseSim:
+        """Simulation of dosing schedule with default changes.
+
+        The complete regimen is simulated on a single output grid with
+        steps + 1 points between 0 and end [min].
+        """
+        return DosingTimecourseSim(
+            schedule=schedule,
+            start=0,
+            end=end,
+            steps=steps,
+            changes={
+                **self.default_changes(),
+                **(changes if changes else {}),
+            },
+            time_offset=time_offset,
+        )
+
+    def scan_grid(
+        self,
+        design: ScanDesign = ScanDesign.ONE_AT_A_TIME,
+        center: Optional[Dict[str, str]] = None,
+        axes: Optional[Dict[str, ScanAxis]] = None,
+    ) -> ScanGrid:
+        """Grid of cirrhosis and renal impairment conditions.
+
+        :param design: design of the grid
+        :param center: center levels for the STAR design
+        :param axes: additional axes of the grid
+        """
+        return ScanGrid(
+            axes={
+                "cirrhosis": ScanAxis(
+                    parameter="f_cirrhosis", levels=self.cirrhosis_map
+                ),
+                "renal": ScanAxis(
+                    parameter="KI__f_renal_function", levels=self.renal_map
+                ),
+                **(axes if axes else {}),
+            },
+            design=design,
+            center=center,
+        )
+
+    def scan_grid_simulations(
+        self,
+        grid: ScanGrid,
+        scan_map: Dict[str, Dict],
+        simulation: Callable[[Dict], TimecourseSim],
+    ) -> Dict[str, ScanSim]:
+        """Parameter scans for all conditions of the grid.
+
+        Simulations are stored as 'scan_{scan_key}_{level keys}', e.g.
+        'scan_renal_Control_Normal renal function'.
+
+        :param grid: grid of conditions
+        :param scan_map: scanned parameters (scan_key: parameter, range, units)
+        :param simulation: creates the timecourse simulation for the changes
+            of a condition
+        """
+        Q_ = self.Q_
+        tcscans = {}
+        for scan_key, scan_data in scan_map.items():
+            for condition in grid.conditions():
+                tcscans[grid.simulation_key(scan_key, condition)] = ScanSim(
+                    simulation=simulation(grid.changes(condition, Q_=Q_)),
+                    dimensions=[
+                        Dimension(
+                            "dim_scan",
+                            changes={
+                                scan_data["parameter"]: Q_(
+                                    scan_data["range"], scan_data["units"]
+                                )
+                            },
+                        ),
+                    ],
+                )
+        return tcscans
+
+    def scan_cube(
+        self,
+        grid: ScanGrid,
+        scan_key: str,
+        sids: Optional[List[str]] = None,
+    ) -> xr.Dataset:
+        """Results of scan over all conditions of the grid in plotting units.
+
+        :param grid: grid of the scan simulations
+        :param scan_key: key of the scan in the scan_map
+        :param sids: observables, default all observables of the experiment
+            with units
+        :return: Dataset with dimensions (scan, <grid axes>, time)
+        """
+        return scan_cube(
+            grid=grid,
+            results=lambda condition: self.results[
+                f"task_{grid.simulation_key(scan_key, condition)}"
+            ],
+            scan_data=self.scan_map[scan_key],
+            sids=sids if sids else [sid for sid in self.units if sid in self.observables],
+            units=self.units,
+            ureg=self.ureg,
+        )
+
+    def scan_pk_cube(self, grid: ScanGrid, scan_key: str) -> xr.Dataset:
+        """Pharmacokinetic parameters of scan over all conditions of the grid.
+
+        Requires the pharmacokinetic parameters in 'self.pk_dfs'.
+
+        :return: Dataset with dimensions (scan, <grid axes>)
+        """
+        return scan_pk_cube(
+            grid=grid,
+            pk_dfs=lambda condition: self.pk_dfs[
+                grid.simulation_key(scan_key, condition)
+            ],
+            scan_data=self.scan_map[scan_key],
+            pk_units=self.pk_units,
+            ureg=self.ureg,
+        )
+
+    def run(
+        self,
+        simulator,
+        output_path: Path = None,
+        save_results: bool = False,
+        **kwargs,
+    ) -> ExperimentResult:
+        """Execute experiment and store results in '<output_path>/<sid>.h5'.
+
+        The store is written after the figures, so it includes the
+        pharmacokinetic parameters calculated for the figures.
+        """
+        result = super().run(
+            simulator=simulator,
+            output_path=output_path,
+            save_results=False,
+            **kwargs,
+        )
+        if output_path and save_results:
+            self.save_store(Path(output_path) / f"{self.sid}.h5")
+        return result
+
+    def save_mpl_figures(
+        self,
+        results_path: Path,
+        mpl_figures: Dict,
+        figure_formats: List[str] = None,
+    ) -> Dict[str, List[Path]]:
+        """Save matplotlib figures, only figures with changed inputs are rendered."""
+        if figure_formats is None:
+            figure_formats = ["svg"]
+        figure_paths = {
+            fkey: [
+                results_path / f"{self.sid}_{fkey}.{fig_format}"
+                for fig_format in figure_formats
+            ]
+            for fkey in mpl_figures
+        }
+        key = figure_rendering.figures_hash(self, figure_formats=figure_formats)
+        outdated = figure_rendering.outdated_figures(
+            results_path, sid=self.sid, figure_paths=figure_paths, key=key
+        )
+        if len(outdated) < len(mpl_figures):
+            logger.info(
+                f"{self.sid}: {len(mpl_figures) - len(outdated)} figures unchanged"
+            )
+        if self.decimation is not None:
+            for fkey in outdated:
+                decimate_figure(
+                    mpl_figures[fkey],
+                    method=self.decimation,
+                    pixels=self.decimation_pixels,
+                )
+        figure_rendering.render_figures(
+            mpl_figures={fkey: mpl_figures[fkey] for fkey in outdated},
+            figure_paths=figure_paths,
+            jobs=self.figure_jobs,
+        )
+        figure_rendering.write_manifest(
+            results_path, sid=self.sid, keys={fkey: key for fkey in mpl_figures}
+        )
+
+        paths: Dict[str, List[Path]] = {fig_format: [] for fig_format in figure_formats}
+        for fkey_paths in figure_paths.values():
+            for fig_format, path in zip(figure_formats, fkey_paths):
+                paths[fig_format].append(path)
+
+        if self.collect_figures and "png" in paths:
+            figure_collection.collect_figures(
+                sid=self.sid,
+                paths=paths["png"],
+                figures_dir=results_path.parent / figure_collection.FIGURES_DIR,
+            )
+        return paths
+
+    def save_datasets(self, results_path: Path) -> None:
+        """Save datasets as TSV for the HTML report, disabled with 'save_tsv'."""
+        if self.save_tsv:
+            super().save_datasets(results_path)
+
+    def save_store(self, path: Path) -> None:
+        """Save results, datasets and pharmacokinetic parameters in HDF5 store."""
+        path.unlink(missing_ok=True)
+        ResultsStore(path, compression=self.results_compression).write_experiment(
+            study=self.sid,
+            results=self._results,
+            datasets=self._datasets,
+            pk=self.pk_tables(),
+        )
+
+    def pk_tables(self) -> Dict[str, pd.DataFrame]:
+        """Pharmacokinetic parameters calculated by the experiment.
+
+        Collects all 'pk_dfs*' attributes, e.g. 'pk_dfs_single' results in
+        the keys 'single_<sim_key>'.
+        """
+        tables = {}
+        for attr, pk_dfs in vars(self).items():
+            if not attr.startswith("pk_dfs") or not isinstance(pk_dfs, dict):
+                continue
+            prefix = attr[len("pk_dfs_"):]
+            for key, df in pk_dfs.items():
+                tables[f"{prefix}_{key}" if prefix else key] = df
+        return tables
+
     def tasks(self) -> Dict[str, Task]:
         if self.simulations():
             return {
@@ -155,23 +431,39 @@ class SorafenibSimulationExperiment(SimulationExperiment):
             }
         return {}
 
+    def task_observables(self) -> Dict[str, List[str]]:
+        """Observables used per task, default 'observables' for all tasks."""
+        return {task_key: self.observables for task_key in self._tasks}
+
+    def task_selections(self) -> Dict[str, List[str]]:
+        """Minimal selections per task.
+
+        Time, the observables of the task and all data already defined for
+        the task (e.g. observables of the fit mappings).
+        """
+        selections = {
+            task_key: {"time", *sids}
+            for task_key, sids in self.task_observables().items()
+        }
+        for d in self._data.values():
+            if d.is_task() and d.task_id in selections:
+                selections[d.task_id].add(d.index)
+        return {task_key: sorted(sids) for task_key, sids in selections.items()}
+
     def data(self) -> Dict:
-        self.add_selections_data(
-            selections=[
-                "time",
-                "[Cve_sor]",
-                "[Cve_m2]",
-                "[Cve_sg]",
-                "Afeces_sor",
-                "Aurine_sg",
-                "Afeces_sg",
-                "Cve_sg_sor",
-                "Cve_m2_sor",
-                "PODOSE_sor",
-                "f_cirrhosis",
-                "KI__f_renal_function",
-            ]
-        )
+        simulation_selections: Dict[str, set] = {}
+        for task_key, selections in self.task_selections().items():
+            self.add_selections_data(selections=selections, task_ids=[task_key])
+            simulation_id = self._tasks[task_key].simulation_id
+            simulation_selections.setdefault(simulation_id, set()).update(selections)
+
+        # only the selections of the tasks are simulated
+        for simulation_id, selections in simulation_selections.items():
+            simulation = self._simulations[simulation_id]
+            if isinstance(simulation, ScanSim):
+                simulation = simulation.simulation
+            simulation.selections = sorted(selections)
+
         return {}
 
     @property
@@ -1,4 +1,16 @@
-from .dose_dependency import DoseDependencyExperiment
-from .dose_dependency import DoseDependencyExperiment
-from .hepatic_impairment import HepaticImpairmentExperiment
-from .renal_impairment import RenalImpairmentExperiment
+"""Miscellaneous experiments, imported lazily on first access."""
+from pkdb_models.models.sorafenib.experiments.registry import (
+    load_module_attribute,
+    subpackage_modules,
+)
+
+_MODULES = subpackage_modules("misc")
+__all__ = list(_MODULES)
+
+
+def __getattr__(name: str):
+    if name in _MODULES:
+        value = load_module_attribute(__name__, _MODULES, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
@@ -13,6 +13,17 @@ from pkdb_models.models.sorafenib.helpers import run_experiments
 class DoseDependencyExperiment(SorafenibSimulationExperiment):
     """Tests multi dose oral sorafenib."""
 
+    observables = [
+        "[Cve_sor]",
+        "[Cve_m2]",
+        "[Cve_sg]",
+        "Afeces_sor",
+        "Aurine_sg",
+        "Afeces_sg",
+        "Cve_sg_sor",
+        "Cve_m2_sor",
+    ]
+
     doses = [
         100, 200, 400, 800, 1600, 3200
     ]
@@ -13,6 +13,15 @@ from pkdb_models.models.sorafenib.helpers import run_experiments
 class RenalImpairmentExperiment(SorafenibSimulationExperiment):
     """Tests renal impairment oral sorafenib."""
 
+    observables = [
+        "[Cve_sor]",
+        "[Cve_m2]",
+        "[Cve_sg]",
+        "Afeces_sor",
+        "Afeces_sg",
+        "Aurine_sg",
+    ]
+
     def simulations(self) -> Dict[str, TimecourseSim]:
         Q_ = self.Q_
         tcsims = {}
@@ -0,0 +1,120 @@
+"""Registry of the simulation experiments.
+
+Maps experiment names to their modules, so experiments can be listed and
+selected without importing them. An experiment class is only imported when
+it is loaded, i.e. listing experiments or running a single study does not
+import all studies (and matplotlib, sbmlsim, pint, ...).
+"""
+import importlib
+from typing import Dict, List, Type
+
+_PACKAGE = "pkdb_models.models.sorafenib.experiments"
+
+# experiment name -> module (relative to the experiments package)
+EXPERIMENT_MODULES: Dict[str, str] = {
+    # studies
+    "Aboualfa2006": "studies.aboualfa2006",
+    "Andriamanana2013": "studies.andriamanana2013",
+    "Awada2005": "studies.awada2005",
+    "Bins2017": "studies.bins2017",
+    "Duran2007": "studies.duran2007",
+    "Ferrario2016": "studies.ferrario2016",
+    "Fucile2015": "studies.fucile2015",
+    "Fukudo2014": "studies.fukudo2014",
+    "Hornecker2012": "studies.hornecker2012",
+    "Huang2017": "studies.huang2017",
+    "Huh2021": "studies.huh2021",
+    "Hussaarts2020": "studies.hussaarts2020",
+    "Ishii2014": "studies.ishii2014",
+    "Mammatas2020": "studies.mammatas2020",
+    "Strumberg2005": "studies.strumberg2005",
+    "Zimmerman2012": "studies.zimmerman2012",
+    # misc
+    "DoseDependencyExperiment": "misc.dose_dependency",
+    "HepaticImpairmentExperiment": "misc.hepatic_impairment",
+    "RenalImpairmentExperiment": "misc.renal_impairment",
+    # scans
+    "CirrhosisScan": "scans.scan_cirrhosis",
+    "ParametersScan": "scans.scan_parameters",
+}
+
+# experiment groups which can be selected by name
+EXPERIMENT_GROUPS: Dict[str, List[str]] = {
+    "studies": [
+        "Aboualfa2006",
+        "Andriamanana2013",
+        "Awada2005",
+        "Bins2017",
+        "Duran2007",
+        # "Ferrario2016",
+        "Fucile2015",
+        "Fukudo2014",
+        "Hornecker2012",
+        "Huang2017",
+        "Huh2021",
+        "Hussaarts2020",
+        "Ishii2014",
+        "Mammatas2020",
+        "Strumberg2005",
+        "Zimmerman2012",  # children
+    ],
+    "misc": [
+        "DoseDependencyExperiment",
+        "HepaticImpairmentExperiment",
+        "RenalImpairmentExperiment",
+    ],
+}
+EXPERIMENT_GROUPS["all"] = EXPERIMENT_GROUPS["studies"] + EXPERIMENT_GROUPS["misc"]
+
+
+def load_module_attribute(package: str, modules: Dict[str, str], name: str):
+    """Import attribute name from its module in package."""
+    module = importlib.import_module(f"{package}.{modules[name]}")
+    return getattr(module, name)
+
+
+def subpackage_modules(subpackage: str) -> Dict[str, str]:
+    """Experiments of subpackage mapped to their modules (relative to it)."""
+    prefix = f"{subpackage}."
+    return {
+        name: module[len(prefix):]
+        for name, module in EXPERIMENT_MODULES.items()
+        if module.startswith(prefix)
+    }
+
+
+def load_experiment(name: str) -> Type:
+    """Import experiment class by name."""
+    if name not in EXPERIMENT_MODULES:
+        raise KeyError(
+            f"Unknown experiment '{name}', use one of {list(EXPERIMENT_MODULES)}"
+        )
+    return load_module_attribute(_PACKAGE, EXPERIMENT_MODULES, name)
+
+
+def load_group(group: str) -> List[Type]:
+    """Import experiment classes of group."""
+    return [load_experiment(name) for name in EXPERIMENT_GROUPS[group]]
+
+
+def resolve_experiment_names(names: List[str]) -> tuple:
+    """Resolve experiment and group names.
+
+    Individual experiments must be part of a group to be selectable.
+
+    :return: tuple of selected experiment names and names not found
+    """
+    selectable = {
+        name for group_names in EXPERIMENT_GROUPS.values() for name in group_names
+    }
+    selected: List[str] = []
+    not_found: List[str] = []
+    for name in names:
+        if name in EXPERIMENT_GROUPS:
+            selected.extend(EXPERIMENT_GROUPS[name])
+        elif name in selectable:
+            selected.append(name)
+        else:
+            not_found.append(name)
+
+    return selected, not_found
@@ -0,0 +1,128 @@
+"""Labeled N-D results of scans over grids of conditions.
+
+The results of all scans of a grid are combined in a single xarray Dataset
+with dimensions (scan, <grid axes>, time), e.g. (scan, cirrhosis, renal,
+time). Every observable is stored in a single contiguous buffer, converted
+once to the plotting units. Conditions which are not part of the grid (e.g.
+double changes in a one-at-a-time design) are NaN.
+
+Plots and pharmacokinetics slice the cube by labels, e.g.
+
+    cube["[Cve_sor]"].sel(cirrhosis="Control", renal="Normal renal function")
+"""
+from typing import Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+from sbmlsim.result import XResult
+
+from pkdb_models.models.sorafenib.experiments.scan_grid import ScanGrid
+
+
+def scan_cube(
+    grid: ScanGrid,
+    results: Callable[[tuple], XResult],
+    scan_data: Dict,
+    sids: List[str],
+    units: Dict[str, str],
+    ureg,
+) -> xr.Dataset:
+    """Combine scan results of all conditions of the grid.
+
+    :param grid: grid of conditions
+    :param results: scan result for condition
+    :param scan_data: scanned parameter (parameter, range, units)
+    :param sids: observables in the cube
+    :param units: units of the time and observables in the cube
+    :return: Dataset with dimensions (scan, <grid axes>, time)
+    """
+    conditions = grid.conditions()
+    xres0 = results(conditions[0])
+    scandim = xres0._redop_dims()[0]
+
+    t = xres0["time"].values[:, 0] * _factor(ureg, xres0.uinfo["time"], units["time"])
+    shape = (len(scan_data["range"]),) + tuple(
+        len(axis.levels) for axis in grid.axes.values()
+    ) + (len(t),)
+    factors = {
+        sid: _factor(ureg, xres0.uinfo[sid], units[sid]) for sid in sids
+    }
+
+    data = {sid: np.full(shape, np.nan) for sid in sids}
+    for condition in conditions:
+        xres = results(condition)
+        index = (slice(None),) + grid.index(condition)
+        for sid in sids:
+            values = xres[sid].transpose(scandim, "_time").values
+            np.multiply(values, factors[sid], out=data[sid][index])
+
+    dims = ["scan", *grid.axes, "time"]
+    cube = xr.Dataset(
+        {sid: xr.DataArray(data=values, dims=dims) for sid, values in data.items()},
+        coords={
+            "scan": np.asarray(scan_data["range"]),
+            **{axis_key: list(axis.levels) for axis_key, axis in grid.axes.items()},
+            "time": t,
+        },
+    )
+    cube["scan"].attrs["units"] = scan_data["units"]
+    cube["scan"].attrs["parameter"] = scan_data["parameter"]
+    cube["time"].attrs["units"] = units["time"]
+    for sid in sids:
+        cube[sid].attrs["units"] = units[sid]
+
+    return cube
+
+
+def scan_pk_cube(
+    grid: ScanGrid,
+    pk_dfs: Callable[[tuple], pd.DataFrame],
+    scan_data: Dict,
+    pk_units: Dict[str, str],
+    ureg,
+) -> xr.Dataset:
+    """Combine pharmacokinetic parameters of all conditions of the grid.
+
+    :param grid: grid of conditions
+    :param pk_dfs: pharmacokinetic parameters for condition
+    :param scan_data: scanned parameter (parameter, range, units)
+    :param pk_units: units of the pharmacokinetic parameters in the cube
+    :return: Dataset with dimensions (scan, <grid axes>)
+    """
+    conditions = grid.conditions()
+    df0 = pk_dfs(conditions[0])
+    shape = (len(scan_data["range"]),) + tuple(
+        len(axis.levels) for axis in grid.axes.values()
+    )
+    factors = {
+        key: _factor(ureg, df0[f"{key}_unit"].iloc[0], unit)
+        for key, unit in pk_units.items()
+    }
+
+    data = {key: np.full(shape, np.nan) for key in pk_units}
+    for condition in conditions:
+        df = pk_dfs(condition)
+        index = (slice(None),) + grid.index(condition)
+        for key in pk_units:
+            data[key][index] = df[key].to_numpy() * factors[key]
+
+    dims = ["scan", *grid.axes]
+    cube = xr.Dataset(
+        {key: xr.DataArray(data=values, dims=dims) for key, values in data.items()},
+        coords={
+            "scan": np.asarray(scan_data["range"]),
+            **{axis_key: list(axis.levels) for axis_key, axis in grid.axes.items()},
+        },
+    )
+    cube["scan"].attrs["units"] = scan_data["units"]
+    cube["scan"].attrs["parameter"] = scan_data["parameter"]
+    for key, unit in pk_units.items():
+        cube[key].attrs["units"] = unit
+
+    return cube
+
+
+def _factor(ureg, units: str, target_units: str) -> float:
+    """Conversion factor between units."""
+    return ureg.Quantity(1.0, units).to(target_units).magnitude
@@ -0,0 +1,124 @@
+"""Declarative grids of scan conditions.
+
+A scan grid combines the levels of multiple axes (e.g. cirrhosis and renal
+impairment) into the conditions which are simulated. Instead of running the
+full factorial grid, the design defines the combinations which are needed:
+
+    FULL_FACTORIAL  all combinations of all levels
+    ONE_AT_A_TIME   reference condition plus every axis varied alone, all
+                    other axes at their reference (first) level
+    STAR            one-at-a-time around a center condition, the center can
+                    be any level of the axes
+
+For n axes with k levels the factorial grid has k^n conditions, the
+one-at-a-time and star designs only 1 + n * (k - 1).
+"""
+import itertools
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Dict, List, Optional, Tuple
+
+
+class ScanDesign(str, Enum):
+    """Design of a scan grid."""
+
+    FULL_FACTORIAL = "full_factorial"
+    ONE_AT_A_TIME = "one_at_a_time"
+    STAR = "star"
+
+
+@dataclass
+class ScanAxis:
+    """Axis of a scan grid.
+
+    :param parameter: model parameter changed by the axis
+    :param levels: parameter values of the levels (level key: value), the
+        first level is the reference level
+    :param units: units of the level values
+    """
+
+    parameter: str
+    levels: Dict[str, float]
+    units: str = "dimensionless"
+
+    @property
+    def reference(self) -> str:
+        return next(iter(self.levels))
+
+
+@dataclass
+class ScanGrid:
+    """Grid of scan conditions.
+
+    :param axes: axes of the grid (axis key: axis), the order of the axes
+        defines the order of the level keys in the conditions
+    :param design: design of the grid
+    :param center: center level per axis for the STAR design, defaults to the
+        reference level of the axis
+    """
+
+    axes: Dict[str, ScanAxis]
+    design: ScanDesign = ScanDesign.ONE_AT_A_TIME
+    center: Optional[Dict[str, str]] = field(default=None)
+
+    def __post_init__(self):
+        self.design = ScanDesign(self.design)
+        for axis_key, level in (self.center or {}).items():
+            if axis_key not in self.axes:
+                raise ValueError(
+                    f"Unknown axis '{axis_key}' in center, use one of {list(self.axes)}"
+                )
+            if level not in self.axes[axis_key].levels:
+                raise ValueError(
+                    f"Unknown level '{level}' of axis '{axis_key}', use one of "
+                    f"{list(self.axes[axis_key].levels)}"
+                )
+
+    def origin(self) -> Tuple[str, ...]:
+        """Condition around which axes are varied in sparse designs."""
+        center = self.center if self.design == ScanDesign.STAR else None
+        return tuple(
+            (center or {}).get(axis_key, axis.reference)
+            for axis_key, axis in self.axes.items()
+        )
+
+    def conditions(self) -> List[Tuple[str, ...]]:
+        """Level keys of all conditions of the grid (in order of the axes)."""
+        if self.design == ScanDesign.FULL_FACTORIAL:
+            return list(
+                itertools.product(*[list(axis.levels) for axis in self.axes.values()])
+            )
+
+        origin = self.origin()
+        conditions = [origin]
+        for k, axis in enumerate(self.axes.values()):
+            for level in axis.levels:
+                if level == origin[k]:
+                    continue
+                conditions.append(origin[:k] + (level,) + origin[k + 1:])
+        return conditions
+
+    def index(self, condition: Tuple[str, ...]) -> Tuple[int, ...]:
+        """Position of the condition levels on the axes."""
+        return tuple(
+            list(axis.levels).index(level)
+            for axis, level in zip(self.axes.values(), condition)
+        )
+
+    @staticmethod
+    def simulation_key(scan_key: str, condition: Tuple[str, ...]) -> str:
+        """Key of the scan simulation of condition."""
+        return "_".join(["scan", scan_key, *condition])
+
+    def changes(self, condition: Tuple[str, ...], Q_) -> Dict:
+        """Model changes of condition."""
+        return {
+            axis.parameter: Q_(axis.levels[level], axis.units)
+            for axis, level in zip(self.axes.values(), condition)
+        }
+
+    def __contains__(self, condition: Tuple[str, ...]) -> bool:
+        return tuple(condition) in set(self.conditions())
+
+    def __len__(self) -> int:
+        return len(self.conditions())
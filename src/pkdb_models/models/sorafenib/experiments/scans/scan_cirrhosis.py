@@ -9,12 +9,16 @@ from sbmlsim.simulation import Timecourse, TimecourseSim, ScanSim, Dimension
 from sbmlsim.plot.serialization_matplotlib import FigureMPL
 from sbmlsim.plot.serialization_matplotlib import plt
 from pkdb_models.models.sorafenib.experiments.base_experiment import SorafenibSimulationExperiment
+from pkdb_models.models.sorafenib.experiments.scan_grid import ScanAxis, ScanDesign, ScanGrid
 from pkdb_models.models.sorafenib.helpers import run_experiments
 
 
 class CirrhosisScan(SorafenibSimulationExperiment):
     """Scan the effect of hepatic function on sorafenib pharmacokinetics."""
 
+    # dose required for the pharmacokinetics
+    observables = ["[Cve_sor]", "Afeces_sor", "Aurine_sg", "Afeces_sg", "PODOSE_sor"]
+
     scan_map = {
         "hepatic": {
             "parameter": "f_cirrhosis",
@@ -24,39 +28,36 @@ class CirrhosisScan(SorafenibSimulationExperiment):
         },
     }
 
+    def grid(self) -> ScanGrid:
+        """Renal impairment conditions of the scans."""
+        return ScanGrid(
+            axes={
+                "renal": ScanAxis(
+                    parameter="KI__f_renal_function", levels=self.renal_map
+                ),
+            },
+            design=ScanDesign.FULL_FACTORIAL,
+        )
+
     def simulations(self) -> Dict[str, ScanSim]:
         Q_ = self.Q_
-        tcscans = {}
-        for scan_key, scan_data in self.scan_map.items():
-            for renal_key in self.renal_map.keys():
-
-                # FIXME: Only calculation on single dose! This has to be performed on multiple doses
-                tcscans[f"scan_{scan_key}_{renal_key}"] = ScanSim(
-                    simulation=TimecourseSim(
-                        Timecourse(
-                            start=0,
-                            end=24 * 60,
-                            steps=200,
-                            changes={
-                                **self.default_changes(),
-                                "PODOSE_sor": Q_(400, 'mg'),
-                                "KI__f_renal_function": Q_(self.renal_map[renal_key], "dimensionless"),
-                            },
-                        )
-                    ),
-                    dimensions=[
-                        Dimension(
-                            "dim_scan",
-                            changes={
-                                scan_data["parameter"]: Q_(
-                                    scan_data["range"], scan_data["units"]
-                                )
-                            },
-                        ),
-                    ],
+        # FIXME: Only calculation on single dose! This has to be performed on multiple doses
+        return self.scan_grid_simulations(
+            grid=self.grid(),
+            scan_map=self.scan_map,
+            simulation=lambda changes: TimecourseSim(
+                Timecourse(
+                    start=0,
+                    end=24 * 60,
+                    steps=200,
+                    changes={
+                        **self.default_changes(),
+                        "PODOSE_sor": Q_(400, 'mg'),
+                        **changes,
+                    },
                 )
-
-        return tcscans
+            ),
+        )
 
     def figures_mpl(self) -> Dict[str, FigureMPL]:
         # calculate the pharmacokinetic parameters
@@ -64,6 +65,17 @@ class CirrhosisScan(SorafenibSimulationExperiment):
 
         )
 
+        # results and pharmacokinetics as (scan, renal, ...) cubes
+        grid = self.grid()
+        self.cubes = {
+            scan_key: self.scan_cube(grid=grid, scan_key=scan_key)
+            for scan_key in self.scan_map
+        }
+        self.pk_cubes = {
+            scan_key: self.scan_pk_cube(grid=grid, scan_key=scan_key)
+            for scan_key in self.scan_map
+        }
+
         return {
            **self.figures_mpl_timecourses(),
            **self.figures_mpl_pharmacokinetics(),
@@ -98,27 +110,16 @@ class CirrhosisScan(SorafenibSimulationExperiment):
                 for kcol, renal_key in enumerate(self.renal_map.keys()):
                     ax = axes[krow, kcol]
                     # get data
-                    Q_ = self.Q_
-                    xres = self.results[f"task_scan_{scan_key}_{renal_key}"]
-
-                    # scanned dimension
-                    scandim = xres._redop_dims()[0]
-
-                    parameter_id = scan_data["parameter"]
-                    par_vec = Q_(xres[parameter_id].values[0], xres.uinfo[parameter_id])
-                    t_vec = xres.dim_mean("time").to(self.units["time"])
+                    cube = self.cubes[scan_key]
+                    par_vec = cube["scan"].values
+                    t_vec = cube["time"].values
+                    c_data = cube[sid].sel(renal=renal_key).values
 
                     # update ymax
-                    y = Q_(
-                        xres[sid].values, xres.uinfo[sid]
-                    ).to(self.units[sid])
-                    if np.max(y.magnitude) > ymax[sid]:
-                        ymax[sid] = np.max(y.magnitude)
+                    ymax[sid] = max(ymax[sid], np.max(c_data))
 
                     for k_par, par in enumerate(par_vec):
-                        c_vec = Q_(
-                            xres[sid].sel({scandim: k_par}).values, xres.uinfo[sid]
-                        ).to(self.units[sid])
+                        c_vec = c_data[k_par]
 
                         # plot all curves for the scan
                         facecolor = self.renal_colors[renal_key]
@@ -135,7 +136,7 @@ class CirrhosisScan(SorafenibSimulationExperiment):
                             cvalue = 0.5 - par/0.9 * 0.5
                             color = cmap(cvalue)
 
-                        ax.plot(t_vec.magnitude, c_vec.magnitude, color=color, linewidth=linewidth)
+                        ax.plot(t_vec, c_vec, color=color, linewidth=linewidth)
 
                     ax: matplotlib.axes.Axes
                     if krow == 0:
@@ -185,7 +186,6 @@ class CirrhosisScan(SorafenibSimulationExperiment):
 
     def figures_mpl_pharmacokinetics(self):
         """Visualize dependency of pharmacokinetics parameters."""
-        Q_ = self.Q_
         figures = {}
         parameters = [
             "aucinf",
@@ -198,6 +198,7 @@ class CirrhosisScan(SorafenibSimulationExperiment):
         ]
 
         for scan_key, scan_data in self.scan_map.items():
+            pk_cube = self.pk_cubes[scan_key]
             f, axes = plt.subplots(nrows=1, ncols=5, figsize=(6*5, 6*1)) #6*3, 6*2
             f.subplots_adjust(wspace=0.3)
             axes = axes.flatten()
@@ -224,20 +225,9 @@ class CirrhosisScan(SorafenibSimulationExperiment):
                 ax.tick_params(axis="y", labelsize=SorafenibSimulationExperiment.tick_font_size)
 
                 for renal_key in self.renal_map:
-                    sim_key = f"scan_{scan_key}_{renal_key}"
-                    xres = self.results[f"task_{sim_key}"]
-                    df = self.pk_dfs[sim_key]
-
                     # This was scanned
-                    parameter_id = scan_data["parameter"]
-                    x_vec = Q_(xres[parameter_id].values[0], xres.uinfo[parameter_id])
-
-                    pk_vec = df[f"{pk_key}"]
-                    pk_vec = pk_vec.to_numpy()
-
-                    x = x_vec
-                    y = Q_(pk_vec, df[f"{pk_key}_unit"][0])
-                    y = y.to(self.pk_units[pk_key])
+                    x = pk_cube["scan"].values
+                    y = pk_cube[pk_key].sel(renal=renal_key).values
 
                     ax.plot(
                         x,
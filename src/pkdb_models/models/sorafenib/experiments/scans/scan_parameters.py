@@ -12,12 +12,16 @@ from sbmlsim.plot import Figure, Axis
 from sbmlsim.plot.serialization_matplotlib import FigureMPL, MatplotlibFigureSerializer
 from sbmlsim.plot.serialization_matplotlib import plt
 from pkdb_models.models.sorafenib.experiments.base_experiment import SorafenibSimulationExperiment
+from pkdb_models.models.sorafenib.experiments.scan_grid import ScanDesign
 from pkdb_models.models.sorafenib.helpers import run_experiments
 
 
 class ParametersScan(SorafenibSimulationExperiment):
     """Scan the effect of renal function on sorafenib pharmacokinetics."""
 
+    # dose required for the pharmacokinetics
+    observables = ["[Cve_sor]", "Afeces_sor", "Aurine_sg", "Afeces_sg", "PODOSE_sor"]
+
     # FIXME: BETTER SCANS: "range": np.sort(np.append(np.logspace(-1, 1, num=num_points), [1.0])),  # [10^-1=0.1, 10^1=10]
     num_points = 19
     scan_map = {
@@ -35,46 +39,44 @@ class ParametersScan(SorafenibSimulationExperiment):
         # },
     }
 
+    # only conditions used in the figures: cirrhosis and renal impairment
+    # are varied alone, no double changes
+    scan_design = ScanDesign.ONE_AT_A_TIME
+
     def simulations(self) -> Dict[str, ScanSim]:
         Q_ = self.Q_
-        tcscans = {}
-
-        for scan_key, scan_data in self.scan_map.items():
-            print(scan_data["range"])
-            for cirrhosis_key in self.cirrhosis_map.keys():
-                for renal_key in self.renal_map.keys():
-                    tcscans[f"scan_{scan_key}_{cirrhosis_key}_{renal_key}"] = ScanSim(
-                        simulation=TimecourseSim(
-                            Timecourse(
-                                start=0,
-                                end=24 * 60,
-                                steps=200,
-                                changes={
-                                    **self.default_changes(),
-                                    "PODOSE_sor": Q_(400, 'mg'),
-                                    "f_cirrhosis": Q_(self.cirrhosis_map[cirrhosis_key], "dimensionless"),
-                                    "KI__f_renal_function": Q_(self.renal_map[renal_key], "dimensionless"),
-                                },
-                            )
-                        ),
-                        dimensions=[
-                            Dimension(
-                                "dim_scan",
-                                changes={
-                                    scan_data["parameter"]: Q_(
-                                        scan_data["range"], scan_data["units"]
-                                    )
-                                },
-                            ),
-                        ],
-                    )
-
-        return tcscans
+        return self.scan_grid_simulations(
+            grid=self.scan_grid(design=self.scan_design),
+            scan_map=self.scan_map,
+            simulation=lambda changes: TimecourseSim(
+                Timecourse(
+                    start=0,
+                    end=24 * 60,
+                    steps=200,
+                    changes={
+                        **self.default_changes(),
+                        "PODOSE_sor": Q_(400, 'mg'),
+                        **changes,
+                    },
+                )
+            ),
+        )
 
     def figures_mpl(self) -> Dict[str, FigureMPL]:
         # calculate the pharmacokinetic parameters
         self.pk_dfs = self.calculate_sorafenib_pk()
 
+        # results and pharmacokinetics as (scan, cirrhosis, renal, ...) cubes
+        grid = self.scan_grid(design=self.scan_design)
+        self.cubes = {
+            scan_key: self.scan_cube(grid=grid, scan_key=scan_key)
+            for scan_key in self.scan_map
+        }
+        self.pk_cubes = {
+            scan_key: self.scan_pk_cube(grid=grid, scan_key=scan_key)
+            for scan_key in self.scan_map
+        }
+
         return {
             **self.figures_mpl_timecourses_cirrhosis(),
             **self.figures_mpl_timecourses_renal(),
@@ -108,25 +110,18 @@ class ParametersScan(SorafenibSimulationExperiment):
 
                     ax = axes[krow, kcol]
                     # get data
-                    Q_ = self.Q_
-                    xres = self.results[f"task_scan_{scan_key}_{cirrhosis_key}_{list(self.renal_map.keys())[0]}"]
+                    cube = self.cubes[scan_key]
+                    par_vec = cube["scan"].values
+                    t_vec = cube["time"].values
+                    c_data = cube[sid].sel(
+                        cirrhosis=cirrhosis_key, renal=list(self.renal_map.keys())[0]
+                    ).values
 
-                    # scanned dimension
-                    scandim = xres._redop_dims()[0]
-
-                    parameter_id = scan_data["parameter"]
-                    par_vec = Q_(xres[parameter_id].values[0], xres.uinfo[parameter_id])
-                    print(par_vec)
-                    t_vec = xres.dim_mean("time").to(self.units["time"])
+                    # update ymax
+                    ymax[sid] = max(ymax[sid], np.max(c_data))
 
                     for k_par, par in enumerate(par_vec):
-                        c_vec = Q_(
-                            xres[sid].sel({scandim: k_par}).values, xres.uinfo[sid]
-                        ).to(self.units[sid])
-
-                        # update ymax
-                        if np.max(c_vec.magnitude) > ymax[sid]:
-                            ymax[sid] = np.max(c_vec.magnitude)
+                        c_vec = c_data[k_par]
 
                         # plot all curves for the scan
                         facecolor = self.cirrhosis_colors[cirrhosis_key]
@@ -145,9 +140,9 @@ class ParametersScan(SorafenibSimulationExperiment):
                             cvalue = 1 - ((par - 0.1) / 1.8)  # red less function, blue more function
                             color = cmap(cvalue)
 
-                        ax.plot(t_vec.magnitude, c_vec.magnitude, color=color, linewidth=linewidth)
+                        ax.plot(t_vec, c_vec, color=color, linewidth=linewidth)
 
-                    ax.plot(t_vec_one.magnitude, c_vec_one.magnitude, color="black", linewidth=2.0)
+                    ax.plot(t_vec_one, c_vec_one, color="black", linewidth=2.0)
 
                     if krow == 0:
                         ax.set_title(cirrhosis_key, fontdict={
@@ -217,24 +212,18 @@ class ParametersScan(SorafenibSimulationExperiment):
 
                     ax = axes[krow, kcol]
                     # get data
-                    Q_ = self.Q_
-                    xres = self.results[f"task_scan_{scan_key}_{list(self.cirrhosis_map.keys())[0]}_{renal_key}"]
+                    cube = self.cubes[scan_key]
+                    par_vec = cube["scan"].values
+                    t_vec = cube["time"].values
+                    c_data = cube[sid].sel(
+                        cirrhosis=list(self.cirrhosis_map.keys())[0], renal=renal_key
+                    ).values
 
-                    # scanned dimension
-                    scandim = xres._redop_dims()[0]
-
-                    parameter_id = scan_data["parameter"]
-                    par_vec = Q_(xres[parameter_id].values[0], xres.uinfo[parameter_id])
-                    t_vec = xres.dim_mean("time").to(self.units["time"])
+                    # update ymax
+                    ymax[sid] = max(ymax[sid], np.max(c_data))
 
                     for k_par, par in enumerate(par_vec):
-                        c_vec = Q_(
-                            xres[sid].sel({scandim: k_par}).values, xres.uinfo[sid]
-                        ).to(self.units[sid])
-
-                        # update ymax
-                        if np.max(c_vec.magnitude) > ymax[sid]:
-                            ymax[sid] = np.max(c_vec.magnitude)
+                        c_vec = c_data[k_par]
 
                         # plot all curves for the scan
                         facecolor = self.renal_colors[renal_key]
@@ -253,9 +242,9 @@ class ParametersScan(SorafenibSimulationExperiment):
                             cvalue = 1 - ((par - 0.1) / 1.8)  # red less function, blue more function
                             color = cmap(cvalue)
 
-                        ax.plot(t_vec.magnitude, c_vec.magnitude, color=color, linewidth=linewidth)
+                        ax.plot(t_vec, c_vec, color=color, linewidth=linewidth)
 
-                    ax.plot(t_vec_one.magnitude, c_vec_one.magnitude, color="black", linewidth=2.0)
+                    ax.plot(t_vec_one, c_vec_one, color="black", linewidth=2.0)
 
                     if krow == 0:
                         ax.set_title(renal_key, fontdict={
@@ -298,7 +287,6 @@ class ParametersScan(SorafenibSimulationExperiment):
 
     def figures_mpl_pharmacokinetics(self):
         """Visualize dependency of pharmacokinetics parameters."""
-        Q_ = self.Q_
         figures = {}
         parameters = [
             "aucinf",
@@ -310,7 +298,9 @@ class ParametersScan(SorafenibSimulationExperiment):
             # "cl_renal",
         ]
 
+        grid = self.scan_grid(design=self.scan_design)
         for scan_key, scan_data in self.scan_map.items():
+            pk_cube = self.pk_cubes[scan_key]
             f, axes = plt.subplots(nrows=1, ncols=5, figsize=(6 * 5, 6 * 1))
             f.subplots_adjust(wspace=0.3)
             axes = axes.flatten()
@@ -326,24 +316,15 @@ class ParametersScan(SorafenibSimulationExperiment):
 
                 for renal_key in self.renal_map:
                     for cirrhosis_key in self.cirrhosis_map:
-                        if (cirrhosis_key != list(self.cirrhosis_map.keys())[0]) and (renal_key != list(self.renal_map.keys())[0]):
-                            # not interested in double changes
+                        if (cirrhosis_key, renal_key) not in grid:
+                            # not simulated (double changes)
                             continue
 
-                        sim_key = f"scan_{scan_key}_{cirrhosis_key}_{renal_key}"
-                        xres = self.results[f"task_{sim_key}"]
-                        df = self.pk_dfs[sim_key]
-
                         # This was scanned
-                        parameter_id = scan_data["parameter"]
-                        x_vec = Q_(xres[parameter_id].values[0], xres.uinfo[parameter_id])
-
-                        pk_vec = df[f"{pk_key}"]
-                        pk_vec = pk_vec.to_numpy()
-
-                        x = x_vec
-                        y = Q_(pk_vec, df[f"{pk_key}_unit"][0])
-                        y = y.to(self.pk_units[pk_key])
+                        x = pk_cube["scan"].values
+                        y = pk_cube[pk_key].sel(
+                            cirrhosis=cirrhosis_key, renal=renal_key
+                        ).values
 
                         if cirrhosis_key != list(self.cirrhosis_map.keys())[0]:
                             ax.plot(
@@ -1,20 +1,19 @@
-"""Overview of all experimental studies."""
-from .aboualfa2006 import Aboualfa2006
-from .andriamanana2013 import Andriamanana2013
-from .awada2005 import Awada2005
-from .bins2017 import Bins2017
-from .duran2007 import Duran2007
-from .ferrario2016 import Ferrario2016
-from .fucile2015 import Fucile2015
-from .fukudo2014 import Fukudo2014
-from .hornecker2012 import Hornecker2012
-from .huang2017 import Huang2017
-from .huh2021 import Huh2021
-from .hussaarts2020 import Hussaarts2020
-from .ishii2014 import Ishii2014
-from .mammatas2020 import Mammatas2020
-from .strumberg2005 import Strumberg2005
-from .zimmerman2012 import Zimmerman2012
+"""Overview of all experimental studies.
 
+Studies are imported lazily on first access, see experiments.registry.
+"""
+from pkdb_models.models.sorafenib.experiments.registry import (
+    load_module_attribute,
+    subpackage_modules,
+)
 
+_MODULES = subpackage_modules("studies")
+__all__ = list(_MODULES)
 
+
+def __getattr__(name: str):
+    if name in _MODULES:
+        value = load_module_attribute(__name__, _MODULES, name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
@@ -1,15 +1,16 @@
-import copy
 from typing import Dict
 
 from sbmlsim.data import DataSet, load_pkdb_dataframe
 from sbmlsim.fit import FitMapping, FitData
 from pkdb_models.models import sorafenib
 
+from pkdb_models.models.sorafenib.decimation import Decimation
+from pkdb_models.models.sorafenib.dosing import DosingSchedule
 from pkdb_models.models.sorafenib.experiments.base_experiment import (
     SorafenibSimulationExperiment
 )
 from sbmlsim.plot import Axis, Figure
-from sbmlsim.simulation import Timecourse, TimecourseSim
+from sbmlsim.simulation import TimecourseSim
 
 from pkdb_models.models.sorafenib.helpers import run_experiments
 
@@ -24,6 +25,8 @@ class Aboualfa2006(SorafenibSimulationExperiment):
 
     No fit mappings due to liver disfunction.
     """
+    # dense multi-dose timecourses, peaks and troughs are kept
+    decimation = Decimation.MINMAX
 
     def datasets(self) -> Dict[str, DataSet]:
         dsets = {}
@@ -46,30 +49,20 @@ class Aboualfa2006(SorafenibSimulationExperiment):
         tcsims = {}
         for cirrhosis_key in self.cirrhosis_map:
 
-            tc0 = Timecourse(
-                start=0,
-                end=24 * 60,  # [min]
-                steps=200,
+            # 28 days of daily dosing
+            schedule = DosingSchedule.regular(
+                dose=Q_(400, "mg"), interval=24 * 60, n_doses=28
+            )
+            tcsims[f"sor_po400_{cirrhosis_key}"] = self.dosing_simulation(
+                schedule=schedule,
+                end=28 * 24 * 60,  # [min]
+                steps=28 * 200,
                 changes={
-                    **self.default_changes(),
-                    "PODOSE_sor": Q_(400, "mg"),
                     "f_cirrhosis": Q_(
                         self.cirrhosis_map[cirrhosis_key], "dimensionless"
                     ),
                 },
-            )
-            tc1 = Timecourse(
-                start=0,
-                end=24 * 60,  # [min]
-                steps=200,
-                changes={
-                    "PODOSE_sor": Q_(400, "mg"),
-                },
-            )
-
-            tcsims[f"sor_po400_{cirrhosis_key}"] = TimecourseSim(
-                [tc0] + [copy.deepcopy(tc1) for _ in range(27)],
-                time_offset=-27*24*60
+                time_offset=-27 * 24 * 60,
             )
 
         return tcsims
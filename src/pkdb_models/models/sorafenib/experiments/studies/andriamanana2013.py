@@ -1,4 +1,3 @@
-from copy import deepcopy
 from typing import Dict
 
 from sbmlsim.data import DataSet, load_pkdb_dataframe
@@ -1,4 +1,3 @@
-from copy import deepcopy
 from typing import Dict
 
 from sbmlsim.data import DataSet, load_pkdb_dataframe
@@ -6,11 +5,12 @@ from sbmlsim.fit import FitMapping, FitData
 
 from pkdb_models.models import sorafenib
 
+from pkdb_models.models.sorafenib.dosing import DosingSchedule
 from pkdb_models.models.sorafenib.experiments.base_experiment import (
     SorafenibSimulationExperiment
 )
 from sbmlsim.plot import Axis, Figure
-from sbmlsim.simulation import Timecourse, TimecourseSim
+from sbmlsim.simulation import TimecourseSim
 
 from pkdb_models.models.sorafenib.helpers import run_experiments
 
@@ -39,34 +39,14 @@ class Awada2005(SorafenibSimulationExperiment):
         Q_ = self.Q_
         tcsims = {}
         for dose in self.doses:
-            tc0 = Timecourse(
-                start=0,
-                end=24 * 60,  # [min]
-                steps=200,
-                changes={
-                    **self.default_changes(),
-                    "PODOSE_sor": Q_(dose, "mg"),
-                },
+            # 21 daily doses, observed 100 hr after the last dose
+            schedule = DosingSchedule.regular(
+                dose=Q_(dose, "mg"), interval=24 * 60, n_doses=21
             )
-            tc1 = Timecourse(
-                start=0,
-                end=24 * 60,  # [min]
-                steps=200,
-                changes={
-                    "PODOSE_sor": Q_(dose, "mg"),
-                },
-            )
-            tc2 = Timecourse(
-                start=0,
-                end=100 * 60,  # [min]
-                steps=200,
-                changes={
-                    "PODOSE_sor": Q_(dose, "mg"),
-                },
-            )
-
-            tcsims[f"sor_po{dose}"] = TimecourseSim(
-                [tc0] + [deepcopy(tc1) for _ in range(19)] + [tc2],
+            tcsims[f"sor_po{dose}"] = self.dosing_simulation(
+                schedule=schedule,
+                end=(20 * 24 + 100) * 60,  # [min]
+                steps=21 * 200,
             )
 
         return tcsims
@@ -1,11 +1,11 @@
-from copy import deepcopy
 from typing import Dict
 from sbmlsim.data import DataSet, load_pkdb_dataframe
 from sbmlsim.fit import FitMapping, FitData
 from sbmlsim.plot import Axis, Figure
 from pkdb_models.models import sorafenib
-from sbmlsim.simulation import Timecourse, TimecourseSim
+from sbmlsim.simulation import TimecourseSim
 from pkdb_models.models.sorafenib.helpers import run_experiments
+from pkdb_models.models.sorafenib.dosing import DosingSchedule
 from pkdb_models.models.sorafenib.experiments.base_experiment import SorafenibSimulationExperiment
 
 
@@ -13,6 +13,7 @@ class Bins2017(SorafenibSimulationExperiment):
     doses = [200, 400]
     substances = ["sor", "sg", "sg_sor", "m2_sor"]
     yids = ["[Cve_sor]", "[Cve_sg]", "Cve_sg_sor", "Cve_m2_sor"]
+    observables = yids
     datainfo = {
         "sor": ["SOR_sor"],  # ["SOR_sor", "SORRIF_sor"],
         "sg": ["SOR_sg"],    # ["SOR_sg", "SORRIF_sg"],
@@ -50,27 +51,15 @@ class Bins2017(SorafenibSimulationExperiment):
         tcsims = {}
 
         for dose in self.doses:
-            tc0 = Timecourse(
-                start=0,
-                end=24 * 60,  # [min]
-                steps=200,
-                changes={
-                    **self.default_changes(),
-                    "PODOSE_sor": Q_(dose, "mg"),
-                },
+            # assumed 2 weeks of treatment
+            schedule = DosingSchedule.regular(
+                dose=Q_(dose, "mg"), interval=24 * 60, n_doses=14
             )
-            tc1 = Timecourse(
-                start=0,
-                end=24 * 60,  # [min]
-                steps=200,
-                changes={
-                    "PODOSE_sor": Q_(dose, "mg"),
-                },
-            )
-
-            tcsims[f"sor_po_{dose}"] = TimecourseSim(
-                [tc0] + [deepcopy(tc1) for _ in range(13)],  # assumed 2 weeks of treatment,
-                time_offset=-13*24*60
+            tcsims[f"sor_po_{dose}"] = self.dosing_simulation(
+                schedule=schedule,
+                end=14 * 24 * 60,  # [min]
+                steps=14 * 200,
+                time_offset=-13 * 24 * 60,
             )
 
         return tcsims
@@ -1,15 +1,15 @@
-from copy import deepcopy
 from typing import Dict
 
 from sbmlsim.data import DataSet, load_pkdb_dataframe
 from sbmlsim.fit import FitMapping, FitData
 from pkdb_models.models import sorafenib
 
+from pkdb_models.models.sorafenib.dosing import DosingSchedule
 from pkdb_models.models.sorafenib.experiments.base_experiment import (
     SorafenibSimulationExperiment
 )
 from sbmlsim.plot import Axis, Figure
-from sbmlsim.simulation import Timecourse, TimecourseSim
+from sbmlsim.simulation import TimecourseSim
 
 from pkdb_models.models.sorafenib.helpers import run_experiments
 
@@ -39,27 +39,15 @@ class Duran2007(SorafenibSimulationExperiment):
         tcsims = {}
 
         for dose in self.doses:
-            tc_first_day = Timecourse(
-                start=0,
-                end=24 * 60,  # [min] (24 hours)
-                steps=1000,
-                changes={
-                    **self.default_changes(),
-                    "PODOSE_sor": Q_(dose, 'mg'),
-                }
+            # 5 daily doses, last dose observed
+            schedule = DosingSchedule.regular(
+                dose=Q_(dose, "mg"), interval=24 * 60, n_doses=5
             )
-            tc_dosing = Timecourse(
-                start=0,
-                end=24 * 60,  # [min] (24 hours)
-                steps=1000,
-                changes={
-                    "PODOSE_sor": Q_(dose, 'mg'),
-                }
-            )
-
-            tcsims[f"sor_po_{dose}_multi"] = TimecourseSim(
-                [tc_first_day] + [deepcopy(tc_dosing) for _ in range(4)],
-                time_offset=-4 * 24 * 60
+            tcsims[f"sor_po_{dose}_multi"] = self.dosing_simulation(
+                schedule=schedule,
+                end=5 * 24 * 60,  # [min]
+                steps=5 * 1000,
+                time_offset=-4 * 24 * 60,
             )
 
         return tcsims
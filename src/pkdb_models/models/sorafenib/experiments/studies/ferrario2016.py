@@ -1,11 +1,11 @@
-from copy import deepcopy
 from typing import Dict
 from sbmlsim.data import DataSet, load_pkdb_dataframe
 from sbmlsim.fit import FitMapping, FitData
 from sbmlsim.plot import Axis, Figure
 from pkdb_models.models import sorafenib
-from sbmlsim.simulation import Timecourse, TimecourseSim
+from sbmlsim.simulation import TimecourseSim
 from pkdb_models.models.sorafenib.helpers import run_experiments
+from pkdb_models.models.sorafenib.dosing import DosingSchedule
 from pkdb_models.models.sorafenib.experiments.base_experiment import SorafenibSimulationExperiment
 
 
@@ -14,6 +14,7 @@ class Ferrario2016(SorafenibSimulationExperiment):
     doses = [200]
     substances = ["sor", "m2"]
     yids = ["[Cve_sor]", "[Cve_m2]"]
+    observables = yids
     groups = {
         "sor": ["SOF20_sor", "SOF22_sor", "SOF23_sor", "SOF27_sor", "SOF32_sor", "SOF33_sor"],
         "m2": ["SOF20_m2", "SOF22_m2", "SOF23_m2", "SOF27_m2", "SOF32_m2", "SOF33_m2"]
@@ -42,28 +43,16 @@ class Ferrario2016(SorafenibSimulationExperiment):
         tcsims = {}
 
         for dose in self.doses:
-            tc0 = Timecourse(
-                start=0,
-                end=24 * 60,  # [min]
-                steps=200,
-                changes={
-                    **self.default_changes(),
-                    "PODOSE_sor": Q_(dose, "mg"),
-                },
+            # assumed 2 weeks of treatment
+            schedule = DosingSchedule.regular(
+                dose=Q_(dose, "mg"), interval=24 * 60, n_doses=14
             )
-            tc1 = Timecourse(
-                start=0,
-                end=24 * 60,  # [min]
-                steps=200,
-                changes={
-                    "PODOSE_sor": Q_(dose, "mg"),
-                },
-            )
-
             for substance in self.substances:
-                tcsims[f"{substance}_po_{dose}"] = TimecourseSim(
-                    [tc0] + [deepcopy(tc1) for _ in range(13)],  # assumed 2 weeks of treatment,
-                    time_offset=-13 * 24 * 60
+                tcsims[f"{substance}_po_{dose}"] = self.dosing_simulation(
+                    schedule=schedule,
+                    end=14 * 24 * 60,  # [min]
+                    steps=14 * 200,
+                    time_offset=-13 * 24 * 60,
                 )
 
         return tcsims
@@ -1,15 +1,16 @@
-from copy import deepcopy
 from typing import Dict
 
 from sbmlsim.data import DataSet, load_pkdb_dataframe
 from sbmlsim.fit import FitMapping, FitData
 from pkdb_models.models import sorafenib
 
+from pkdb_models.models.sorafenib.decimation import Decimation
+from pkdb_models.models.sorafenib.dosing import DosingSchedule
 from pkdb_models.models.sorafenib.experiments.base_experiment import (
     SorafenibSimulationExperiment
 )
 from sbmlsim.plot import Axis, Figure
-from sbmlsim.simulation import Timecourse, TimecourseSim
+from sbmlsim.simulation import TimecourseSim
 
 from pkdb_models.models.sorafenib.helpers import run_experiments
 
@@ -20,6 +21,8 @@ class Fucile2015(SorafenibSimulationExperiment):
     14 days of pretreatment, twice daily, either 200 or 400 mg b.i.d
     """
     doses = [200, 400]  # b.i.d.
+    # dense multi-dose timecourses, peaks and troughs are kept
+    decimation = Decimation.MINMAX
     #colors = {
         #200: "tab:blue",
         #400: "tab:orange",
@@ -60,27 +63,15 @@ class Fucile2015(SorafenibSimulationExperiment):
         Q_ = self.Q_
         tcsims = {}
         for dose in self.doses:
-            tc_first_day = Timecourse(
-                start=0,
-                end=12 * 60,  # [min]
-                steps=200,
-                changes={
-                    **self.default_changes(),
-                    "PODOSE_sor": Q_(dose/2.0, 'mg'),
-                }
+            # 14 days twice daily, last dose observed
+            schedule = DosingSchedule.regular(
+                dose=Q_(dose/2.0, "mg"), interval=12 * 60, n_doses=29
             )
-            tc_dosing = Timecourse(
-                start=0,
-                end=12 * 60,  # [min]
-                steps=200,
-                changes={
-                    "PODOSE_sor": Q_(dose/2.0, 'mg'),
-                }
-            )
-
-            tcsims[f"sor_po_{dose}_multi"] = TimecourseSim(
-                [tc_first_day] + [deepcopy(tc_dosing) for _ in range(28)],
-                time_offset=-14 * 24 * 60
+            tcsims[f"sor_po_{dose}_multi"] = self.dosing_simulation(
+                schedule=schedule,
+                end=29 * 12 * 60,  # [min]
+                steps=29 * 200,
+                time_offset=-14 * 24 * 60,
             )
 
         return tcsims
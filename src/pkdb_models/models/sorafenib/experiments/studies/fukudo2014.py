@@ -1,11 +1,11 @@
-from copy import deepcopy
 from typing import Dict
 from sbmlsim.data import DataSet, load_pkdb_dataframe
 from sbmlsim.fit import FitMapping, FitData
 from sbmlsim.plot import Figure
-from sbmlsim.simulation import Timecourse, TimecourseSim
+from sbmlsim.simulation import TimecourseSim
 from pkdb_models.models import sorafenib
 
+from pkdb_models.models.sorafenib.dosing import DosingSchedule
 from pkdb_models.models.sorafenib.experiments.base_experiment import (
     SorafenibSimulationExperiment
 )
@@ -36,28 +36,16 @@ class Fukudo2014(SorafenibSimulationExperiment):
         #dose = 800  # [mg] twice daily
         Q_ = self.Q_
         tcsims = {}
-        for dose in self.doses:
-          tc0 = Timecourse(
-            start=0,
-            end=12 * 60,  # [min]
-            steps=200,
-            changes={
-                **self.default_changes(),
-                "PODOSE_sor": Q_(dose/2.0, "mg"),
-            },
-        )
-        tc1 = Timecourse(
-            start=0,
-            end=12 * 60,  # [min]
-            steps=200,
-            changes={
-                "PODOSE_sor": Q_(dose/2.0, "mg"),
-            },
+        dose = self.doses[-1]
+        # 7 days pretreatment twice daily
+        schedule = DosingSchedule.regular(
+            dose=Q_(dose/2.0, "mg"), interval=12 * 60, n_doses=15
         )
-
-        tcsims[f"sor_po800"] = TimecourseSim(
-            [tc0] + [deepcopy(tc1) for _ in range(14)],  # 7 days pretreatment
-            time_offset=-7 * 24 * 60
+        tcsims[f"sor_po800"] = self.dosing_simulation(
+            schedule=schedule,
+            end=15 * 12 * 60,  # [min]
+            steps=15 * 200,
+            time_offset=-7 * 24 * 60,
         )
 
         return tcsims
@@ -1,5 +1,4 @@
 
-from copy import deepcopy
 from typing import Dict
 
 import numpy as np
@@ -8,9 +7,11 @@ from sbmlsim.data import DataSet, load_pkdb_dataframe
 from sbmlsim.plot import Axis, Figure
 from pkdb_models.models import sorafenib
 from sbmlsim.plot.serialization_matplotlib import FigureMPL
-from sbmlsim.simulation import Timecourse, TimecourseSim
+from sbmlsim.simulation import TimecourseSim
 from sbmlutils.console import console
 
+from pkdb_models.models.sorafenib.decimation import Decimation
+from pkdb_models.models.sorafenib.dosing import DosingSchedule
 from pkdb_models.models.sorafenib.experiments.base_experiment import SorafenibSimulationExperiment
 from pkdb_models.models.sorafenib.helpers import run_experiments
 
@@ -23,6 +24,10 @@ class Hornecker2012(SorafenibSimulationExperiment):
     """
     doses = [400, 800, 1200, 1600, 2000, 2400]
     n_doses = 15
+    # dose required for the pharmacokinetics
+    observables = ["[Cve_sor]", "PODOSE_sor"]
+    # dense multi-dose timecourses, peaks and troughs are kept
+    decimation = Decimation.MINMAX
 
     def datasets(self) -> Dict[str, DataSet]:
         dsets = {}
@@ -42,27 +47,14 @@ class Hornecker2012(SorafenibSimulationExperiment):
         tcsims = {}
 
         for dose in self.doses:
-            tc0 = Timecourse(
-                start=0,
-                end=24 * 60,  # [min]
-                steps=200,
-                changes={
-                    **self.default_changes(),
-                    "PODOSE_sor": Q_(dose, "mg"),
-                },
+            # assumed 2 weeks of treatment
+            schedule = DosingSchedule.regular(
+                dose=Q_(dose, "mg"), interval=24 * 60, n_doses=self.n_doses
             )
-            tc1 = Timecourse(
-                start=0,
-                end=24 * 60,  # [min]
-                steps=200,
-                changes={
-                    "PODOSE_sor": Q_(dose, "mg"),
-                },
-            )
-
-            tcsims[f"sor_po{dose}"] = TimecourseSim(
-                [tc0] + [deepcopy(tc1) for _ in range(self.n_doses-1)],  # assumed 2 weeks of treatment,
-                # time_offset=-14 * 24 * 60
+            tcsims[f"sor_po{dose}"] = self.dosing_simulation(
+                schedule=schedule,
+                end=self.n_doses * 24 * 60,  # [min]
+                steps=self.n_doses * 200,
             )
 
         return tcsims
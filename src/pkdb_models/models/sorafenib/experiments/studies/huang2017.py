@@ -16,6 +16,7 @@ class Huang2017(SorafenibSimulationExperiment):
     """Simulation experiment of Huang2017."""
     doses = [200, 400]
     substances = ["sor", "m2"]
+    observables = ["[Cve_sor]", "[Cve_m2]"]
 
     def datasets(self) -> Dict[str, DataSet]:
         dsets = {}
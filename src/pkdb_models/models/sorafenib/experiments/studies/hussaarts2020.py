@@ -1,12 +1,12 @@
 
-from copy import deepcopy
 from typing import Dict
 from sbmlsim.data import DataSet, load_pkdb_dataframe
 from sbmlsim.fit import FitMapping, FitData
 from sbmlsim.plot import Axis, Figure
 from pkdb_models.models import sorafenib
-from sbmlsim.simulation import Timecourse, TimecourseSim
+from sbmlsim.simulation import TimecourseSim
 from pkdb_models.models.sorafenib.helpers import run_experiments
+from pkdb_models.models.sorafenib.dosing import DosingSchedule
 from pkdb_models.models.sorafenib.experiments.base_experiment import SorafenibSimulationExperiment
 
 class Hussaarts2020(SorafenibSimulationExperiment):
@@ -14,6 +14,7 @@ class Hussaarts2020(SorafenibSimulationExperiment):
     doses = [200, 400, 600, 800]
     substances = ["sor", "sg", "sg_sor"]
     yids = ["[Cve_sor]", "[Cve_sg]", "Cve_sg_sor"]
+    observables = yids
     datainfo = {
         "sor": ["SOR_sor"],         # ["SOR_sor", "SORPROB_sor"],
         "sg": ["SOR_sg"],           # ["SOR_sg", "SORPROB_sg"],
@@ -49,27 +50,15 @@ class Hussaarts2020(SorafenibSimulationExperiment):
         tcsims = {}
 
         for dose in self.doses:
-            tc0 = Timecourse(
-                start=0,
-                end=24 * 60,  # [min]
-                steps=200,
-                changes={
-                    **self.default_changes(),
-                    "PODOSE_sor": Q_(dose, "mg"),
-                },
+            # assumed 2 weeks of treatment
+            schedule = DosingSchedule.regular(
+                dose=Q_(dose, "mg"), interval=24 * 60, n_doses=15
             )
-            tc1 = Timecourse(
-                start=0,
-                end=24 * 60,  # [min]
-                steps=200,
-                changes={
-                    "PODOSE_sor": Q_(dose, "mg"),
-                },
-            )
-
-            tcsims[f"sor_po{dose}"] = TimecourseSim(
-                [tc0] + [deepcopy(tc1) for _ in range(14)],  # assumed 2 weeks of treatment,
-                time_offset=-14 * 24 * 60
+            tcsims[f"sor_po{dose}"] = self.dosing_simulation(
+                schedule=schedule,
+                end=15 * 24 * 60,  # [min]
+                steps=15 * 200,
+                time_offset=-14 * 24 * 60,
             )
 
         return tcsims
@@ -1,11 +1,11 @@
-from copy import deepcopy
 from typing import Dict
 from sbmlsim.data import DataSet, load_pkdb_dataframe
 from sbmlsim.fit import FitMapping, FitData
+from pkdb_models.models.sorafenib.dosing import DosingSchedule
 from pkdb_models.models.sorafenib.experiments.base_experiment import SorafenibSimulationExperiment
 from sbmlsim.plot import Axis, Figure
 from pkdb_models.models import sorafenib
-from sbmlsim.simulation import Timecourse, TimecourseSim
+from sbmlsim.simulation import TimecourseSim
 from pkdb_models.models.sorafenib.helpers import run_experiments
 
 
@@ -17,6 +17,7 @@ class Ishii2014(SorafenibSimulationExperiment):
     doses =[200]
     substances = ["sor", "m2"]
     yids = ["[Cve_sor]", "[Cve_m2]"]
+    observables = yids
     labels = ["SOF_sor", "SOF_m2"]
 
     def datasets(self) -> Dict[str, DataSet]:
@@ -38,28 +39,15 @@ class Ishii2014(SorafenibSimulationExperiment):
         Q_ = self.Q_
         tcsims = {}
 
-        for dose in self.doses:
-          tc0 = Timecourse(
-            start=0,
-            end=24 * 60,  # [min]
-            steps=200,
-            changes={
-                **self.default_changes(),
-                "PODOSE_sor": Q_(200, "mg"),
-            },
-        )
-        tc1 = Timecourse(
-            start=0,
-            end=24 * 60,  # [min]
-            steps=200,
-            changes={
-                "PODOSE_sor": Q_(200, "mg"),
-            },
+        # 9 daily doses, last dose observed
+        schedule = DosingSchedule.regular(
+            dose=Q_(200, "mg"), interval=24 * 60, n_doses=9
         )
-
-        tcsims[f"sor_po_200"] = TimecourseSim(
-            [tc0] + [deepcopy(tc1) for _ in range(8)],  # assumed 2 weeks of treatment,
-            time_offset=-7 * 24 * 60
+        tcsims[f"sor_po_200"] = self.dosing_simulation(
+            schedule=schedule,
+            end=9 * 24 * 60,  # [min]
+            steps=9 * 200,
+            time_offset=-7 * 24 * 60,
         )
 
         return tcsims
@@ -1,10 +1,10 @@
-from copy import deepcopy
 from typing import Dict
 
 from sbmlsim.data import DataSet, load_pkdb_dataframe
 from sbmlsim.fit import FitMapping, FitData
 from pkdb_models.models import sorafenib
 
+from pkdb_models.models.sorafenib.dosing import DosingSchedule
 from pkdb_models.models.sorafenib.experiments.base_experiment import (
     SorafenibSimulationExperiment
 )
@@ -56,27 +56,15 @@ class Strumberg2005(SorafenibSimulationExperiment):
                         )
                     )
                 elif label.endswith("MD"):
-                    tc0 = Timecourse(
-                        start=0,
-                        end=24 * 60,  # [min]
-                        steps=200,
-                        changes={
-                            **self.default_changes(),
-                            "PODOSE_sor": Q_(dose, "mg"),
-                        },
+                    # assumed 2 weeks of treatment
+                    schedule = DosingSchedule.regular(
+                        dose=Q_(dose, "mg"), interval=24 * 60, n_doses=15
                     )
-                    tc1 = Timecourse(
-                        start=0,
-                        end=24 * 60,  # [min]
-                        steps=200,
-                        changes={
-                            "PODOSE_sor": Q_(dose, "mg"),
-                        },
-                    )
-
-                    tcsims[f"sor_po_{dose}_MD"] = TimecourseSim(
-                        [tc0] + [deepcopy(tc1) for _ in range(14)],  # assumed 2 weeks of treatment
-                         time_offset=-14 * 24 * 60
+                    tcsims[f"sor_po_{dose}_MD"] = self.dosing_simulation(
+                        schedule=schedule,
+                        end=15 * 24 * 60,  # [min]
+                        steps=15 * 200,
+                        time_offset=-14 * 24 * 60,
                     )
 
         return tcsims
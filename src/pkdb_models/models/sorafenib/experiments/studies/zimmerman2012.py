@@ -1,11 +1,11 @@
-from copy import deepcopy
 from typing import Dict
 from pkdb_models.models import sorafenib
 from sbmlsim.data import DataSet, load_pkdb_dataframe
 from sbmlsim.fit import FitMapping, FitData
+from pkdb_models.models.sorafenib.dosing import DosingSchedule
 from pkdb_models.models.sorafenib.experiments.base_experiment import SorafenibSimulationExperiment
 from sbmlsim.plot import Axis, Figure
-from sbmlsim.simulation import Timecourse, TimecourseSim
+from sbmlsim.simulation import TimecourseSim
 from pkdb_models.models.sorafenib.helpers import run_experiments
 
 
@@ -14,6 +14,7 @@ class Zimmerman2012(SorafenibSimulationExperiment):
     doses = [150, 200]
     substances = ["sor", "m2", "sg"]
     yids = ["[Cve_sor]", "[Cve_sg]", "[Cve_sg]"]
+    observables = ["[Cve_sor]", "[Cve_sg]"]
     datainfo = {
         "sor": ["SOF150_sor", "SOF200_sor"],
         "m2": ["SOF150_m2", "SOF200_m2"],
@@ -44,27 +45,15 @@ class Zimmerman2012(SorafenibSimulationExperiment):
         tcsims = {}
 
         for dose in self.doses:
-            tc_first_day = Timecourse(
-                start=0,
-                end=24 * 60,  # [min] (24 hours)
-                steps=1000,
-                changes={
-                    **self.default_changes(),
-                    "PODOSE_sor": Q_(dose, 'mg'),
-                }
-            )
-            tc_dosing = Timecourse(
-                start=0,
-                end=24 * 60,  # [min] (24 hours)
-                steps=1000,
-                changes={
-                    "PODOSE_sor": Q_(dose, 'mg'),
-                }
+            # 5 daily doses, last dose observed
+            schedule = DosingSchedule.regular(
+                dose=Q_(dose, "mg"), interval=24 * 60, n_doses=5
             )
-
-            tcsims[f"sor_po{dose}"] = TimecourseSim(
-                [tc_first_day] + [deepcopy(tc_dosing) for _ in range(4)],
-                time_offset=-4 * 24 * 60
+            tcsims[f"sor_po{dose}"] = self.dosing_simulation(
+                schedule=schedule,
+                end=5 * 24 * 60,  # [min]
+                steps=5 * 1000,
+                time_offset=-4 * 24 * 60,
             )
 
         return tcsims
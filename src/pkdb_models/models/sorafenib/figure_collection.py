@@ -0,0 +1,89 @@
+"""Collection of the PNG figures of all experiments in one folder.
+
+Figures are collected when they are saved by the experiment (see
+SorafenibSimulationExperiment.save_mpl_figures) in the folder
+
+    <output_dir>/_figures/
+
+next to the experiment folders. Figures are hardlinked (the collected figure
+is updated when the figure is rendered again); if hardlinks are not
+supported (e.g. network filesystems, different devices) figures are copied,
+but only if the content hash differs from the collected figure.
+
+Every experiment writes its part of the manifest ('.<sid>.json'), the parts
+are combined in 'figures.json' with the source path and hash of every
+collected figure, so the tree does not have to be rescanned.
+"""
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, List
+
+from sbmlutils.log import get_logger
+
+from pkdb_models.models.sorafenib.cache import hash_file
+
+logger = get_logger(__name__)
+
+FIGURES_DIR = "_figures"
+MANIFEST = "figures.json"
+
+
+def collect_figure(path: Path, figures_dir: Path) -> bool:
+    """Hardlink or copy figure into figures_dir.
+
+    :return: True if the collected figure changed
+    """
+    target = figures_dir / path.name
+    if target.exists():
+        if os.path.samefile(path, target) or hash_file(path) == hash_file(target):
+            return False
+        target.unlink()
+
+    try:
+        os.link(path, target)
+    except OSError:
+        shutil.copy2(path, target)
+    return True
+
+
+def collect_figures(sid: str, paths: List[Path], figures_dir: Path) -> None:
+    """Collect figures of experiment and write its part of the manifest."""
+    figures_dir.mkdir(parents=True, exist_ok=True)
+    entries = {}
+    n_changed = 0
+    for path in paths:
+        try:
+            n_changed += collect_figure(path, figures_dir)
+        except OSError as err:
+            logger.error(f"Figure '{path}' could not be collected: {err}")
+            continue
+        entries[path.name] = {
+            "sid": sid,
+            "source": str(path),
+            "sha256": hash_file(path),
+        }
+    logger.debug(f"{sid}: {n_changed}/{len(paths)} figures collected")
+
+    # atomic write, parts are written by the worker processes
+    part_path = figures_dir / f".{sid}.json"
+    tmp_path = part_path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(entries, f, indent=2)
+    os.replace(tmp_path, part_path)
+
+
+def write_manifest(figures_dir: Path) -> Path:
+    """Combine the manifest parts of all experiments in 'figures.json'."""
+    figures: Dict[str, Dict] = {}
+    for part_path in sorted(figures_dir.glob(".*.json")):
+        with open(part_path, "r") as f:
+            for name, entry in json.load(f).items():
+                if (figures_dir / name).exists():
+                    figures[name] = entry
+
+    manifest_path = figures_dir / MANIFEST
+    with open(manifest_path, "w") as f:
+        json.dump({"figures": figures}, f, indent=2)
+    return manifest_path
@@ -0,0 +1,168 @@
+"""Parallel and incremental rendering of experiment figures.
+
+Rendering the figures (savefig in all figure formats) is distributed over a
+pool of worker processes. Figures are only rendered if their inputs changed,
+i.e. the hash of
+
+    - the source files of the experiment (figure definitions) and of the
+      modules used by the figure code (pharmacokinetics, scans, decimation),
+    - the datasets and the simulation results,
+    - the figure settings (including line decimation) and formats
+
+differs from the hash stored in the figure manifest '<sid>_figures.json' in
+the output directory of the experiment, or if figure files are missing.
+"""
+import atexit
+import hashlib
+import json
+import multiprocessing
+import pickle
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import matplotlib
+import numpy as np
+from sbmlsim.plot import Figure
+from sbmlutils.log import get_logger
+
+from pkdb_models.models.sorafenib import decimation, sorafenib_pk
+from pkdb_models.models.sorafenib.cache import hash_file, hash_json
+from pkdb_models.models.sorafenib.data_cache import datasets_hash
+from pkdb_models.models.sorafenib.experiments import scan_cube, scan_grid
+
+logger = get_logger(__name__)
+
+# process pool shared by all experiments of the process
+_executor: Optional[Executor] = None
+_executor_jobs: int = 0
+
+# modules of the package used by the figure code of the experiments
+FIGURE_MODULES = [sorafenib_pk, scan_cube, scan_grid, decimation]
+
+
+def figures_hash(experiment, figure_formats: List[str]) -> str:
+    """Hash of all inputs of the figures of the experiment."""
+    h = hashlib.sha256()
+    for task_key in sorted(experiment._results.keys()):
+        xds = experiment._results[task_key].xds
+        h.update(task_key.encode("utf-8"))
+        for key in sorted(xds.data_vars):
+            h.update(str(key).encode("utf-8"))
+            h.update(np.ascontiguousarray(xds[key].values).tobytes())
+
+    return hash_json({
+        "sources": datasets_hash(experiment),
+        "modules": {
+            module.__name__: hash_file(Path(module.__file__))
+            for module in FIGURE_MODULES
+        },
+        "results": h.hexdigest(),
+        "matplotlib": matplotlib.__version__,
+        "settings": {
+            "fig_dpi": Figure.fig_dpi,
+            "legend_fontsize": Figure.legend_fontsize,
+            "decimation": getattr(experiment, "decimation", None),
+            "decimation_pixels": getattr(experiment, "decimation_pixels", None),
+        },
+        "formats": list(figure_formats),
+    })
+
+
+def _manifest_path(results_path: Path, sid: str) -> Path:
+    return results_path / f"{sid}_figures.json"
+
+
+def outdated_figures(
+    results_path: Path,
+    sid: str,
+    figure_paths: Dict[str, List[Path]],
+    key: str,
+) -> List[str]:
+    """Keys of figures which have to be rendered."""
+    manifest_path = _manifest_path(results_path, sid)
+    manifest = {}
+    if manifest_path.exists():
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+
+    return [
+        fkey
+        for fkey, paths in figure_paths.items()
+        if manifest.get(fkey) != key or not all(path.exists() for path in paths)
+    ]
+
+
+def write_manifest(results_path: Path, sid: str, keys: Dict[str, str]) -> None:
+    """Store the input hashes of the rendered figures."""
+    with open(_manifest_path(results_path, sid), "w") as f:
+        json.dump(keys, f, indent=2)
+
+
+def _get_executor(jobs: int) -> Executor:
+    global _executor, _executor_jobs
+    if _executor is None or _executor_jobs != jobs:
+        if _executor is not None:
+            _executor.shutdown()
+        _executor = ProcessPoolExecutor(
+            max_workers=jobs,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+        _executor_jobs = jobs
+    return _executor
+
+
+@atexit.register
+def shutdown() -> None:
+    """Shutdown the rendering processes."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown()
+        _executor = None
+
+
+def _init_worker() -> None:
+    matplotlib.use("Agg")
+
+
+def _render_figure(fig_pickle: bytes, paths: List[Path]) -> List[Path]:
+    """Render pickled matplotlib figure in all formats."""
+    from matplotlib import pyplot as plt
+
+    fig_mpl = pickle.loads(fig_pickle)
+    try:
+        for path in paths:
+            fig_mpl.savefig(path, bbox_inches="tight")
+    finally:
+        plt.close(fig_mpl)
+    return paths
+
+
+def render_figures(
+    mpl_figures: Dict,
+    figure_paths: Dict[str, List[Path]],
+    jobs: int = 1,
+) -> None:
+    """Render figures to the paths, in worker processes if jobs > 1."""
+    if jobs > 1 and len(mpl_figures) > 1:
+        try:
+            tasks = {
+                fkey: pickle.dumps(fig_mpl) for fkey, fig_mpl in mpl_figures.items()
+            }
+        except Exception as err:
+            # figures with unpicklable artists are rendered in the process
+            logger.warning(f"Figures are rendered serially: {err}")
+        else:
+            executor = _get_executor(jobs)
+            futures = [
+                executor.submit(_render_figure, fig_pickle, figure_paths[fkey])
+                for fkey, fig_pickle in tasks.items()
+            ]
+            for future in futures:
+                future.result()
+            return
+
+    for fkey, fig_mpl in mpl_figures.items():
+        for path in figure_paths[fkey]:
+            fig_mpl.savefig(path, bbox_inches="tight")
@@ -0,0 +1,235 @@
+"""Evaluation of the objective on persistent worker processes.
+
+A residual evaluation simulates the tasks of all fit experiments one after
+the other, so a single local optimization only uses one core. The fit
+mappings are therefore partitioned over persistent workers: every worker
+initializes its own copy of the optimization problem once (models,
+datasets, weights) and is restricted to the mappings of its partition.
+Every evaluation sends the parameter vector to all workers and gathers the
+residual vectors in the order of the mappings. Changes of the integrator
+tolerances (see fidelity) are sent to the running workers.
+
+Mappings of an experiment are always evaluated by the same worker (they
+share simulations), the experiments are distributed by their number of
+simulations (longest processing time first).
+
+Errors of the workers are sent to the main process with their type.
+Integration errors (RuntimeError) are re-raised as RuntimeError, i.e. the
+optimization handles them like failed integrations of a serial evaluation;
+all other errors raise ObjectiveWorkerError and abort the optimization.
+"""
+import multiprocessing
+from multiprocessing.connection import Connection
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from sbmlutils.log import get_logger
+
+from pkdb_models.models.sorafenib.fitting.fidelity import FidelityLevel
+
+logger = get_logger(__name__)
+
+
+class ObjectiveWorkerError(Exception):
+    """Error in an objective worker which is not an integration error."""
+
+
+def _is_integration_error(err: BaseException) -> bool:
+    """Integration errors are RuntimeErrors (raised by roadrunner)."""
+    return isinstance(err, RuntimeError) and not isinstance(
+        err, (NotImplementedError, RecursionError)
+    )
+
+
+def _error_info(err: BaseException, integration: bool) -> Tuple[str, str, bool]:
+    """Error information sent to the main process (type, repr, integration)."""
+    return type(err).__name__, repr(err), integration
+
+
+def partition_mappings(
+    experiment_keys: List[str], simulations: List[Any], n_workers: int
+) -> List[List[int]]:
+    """Partition the mapping indices by experiment over the workers.
+
+    :param experiment_keys: experiment of every mapping
+    :param simulations: simulation of every mapping
+    :param n_workers: number of partitions
+    :return: sorted mapping indices per worker (empty partitions removed)
+    """
+    groups: Dict[str, List[int]] = {}
+    for k, key in enumerate(experiment_keys):
+        groups.setdefault(key, []).append(k)
+
+    def cost(indices: List[int]) -> int:
+        return len({id(simulations[k]) for k in indices})
+
+    partitions: List[List[int]] = [[] for _ in range(n_workers)]
+    loads = [0] * n_workers
+    for indices in sorted(groups.values(), key=cost, reverse=True):
+        k_min = int(np.argmin(loads))
+        partitions[k_min].extend(indices)
+        loads[k_min] += cost(indices)
+
+    return [sorted(p) for p in partitions if p]
+
+
+def _worker_loop(
+    conn: Connection, problem_kwargs: Dict, settings: Dict, indices: List[int]
+) -> None:
+    """Evaluate residuals of the mappings for the received parameters.
+
+    Messages are ("residuals", xlog) and ("fidelity", FidelityLevel), None
+    stops the worker.
+    """
+    from pkdb_models.models.sorafenib.fitting.optimization import (
+        SorafenibOptimizationProblem,
+    )
+
+    # evaluations are memoized by the main process
+    try:
+        problem = SorafenibOptimizationProblem(
+            **{**problem_kwargs, "objective_workers": 1, "memo_size": 0}
+        )
+        problem.initialize(**settings)
+        problem.restrict(indices)
+    except Exception as err:
+        # errors of the initialization are never integration errors
+        conn.send(("error", _error_info(err, integration=False)))
+        conn.close()
+        return
+    conn.send(("ready", None))
+
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        command, value = message
+        try:
+            if command == "fidelity":
+                problem.set_fidelity(value)
+                conn.send(("ok", None))
+            else:
+                # trajectory is recorded by the main process
+                problem._trajectory = []
+                conn.send(("ok", problem.residuals(value)))
+        except Exception as err:
+            conn.send(("error", _error_info(err, _is_integration_error(err))))
+    conn.close()
+
+
+class ObjectiveWorkers:
+    """Persistent workers evaluating partitions of the fit mappings.
+
+    :param problem_kwargs: arguments of SorafenibOptimizationProblem
+    :param settings: arguments of SorafenibOptimizationProblem.initialize
+    :param partitions: mapping indices of the workers
+    :param lengths: number of residuals of every mapping
+    """
+
+    def __init__(
+        self,
+        problem_kwargs: Dict,
+        settings: Dict,
+        partitions: List[List[int]],
+        lengths: List[int],
+    ):
+        self.partitions = partitions
+        self.lengths = lengths
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(int)
+
+        ctx = multiprocessing.get_context("spawn")
+        self.connections: List[Connection] = []
+        self.processes = []
+        for indices in partitions:
+            conn, child_conn = ctx.Pipe()
+            process = ctx.Process(
+                target=_worker_loop,
+                args=(child_conn, problem_kwargs, settings, indices),
+                daemon=True,
+            )
+            process.start()
+            child_conn.close()
+            self.connections.append(conn)
+            self.processes.append(process)
+
+        try:
+            for conn in self.connections:
+                self._receive(conn)
+        except (RuntimeError, ObjectiveWorkerError, EOFError, OSError):
+            self.close()
+            raise
+        logger.info(
+            f"{len(partitions)} objective workers with "
+            f"{[len(p) for p in partitions]} mappings"
+        )
+
+    @staticmethod
+    def _receive(conn: Connection):
+        status, value = conn.recv()
+        if status == "error":
+            ObjectiveWorkers._raise_error(value)
+        return value
+
+    @staticmethod
+    def _raise_error(error: Tuple[str, str, bool]) -> None:
+        """Raise error of worker, RuntimeError only for integration errors."""
+        error_type, error_repr, integration = error
+        if integration:
+            raise RuntimeError(f"Error in objective worker: {error_repr}")
+        raise ObjectiveWorkerError(
+            f"{error_type} in objective worker: {error_repr}"
+        )
+
+    @property
+    def alive(self) -> bool:
+        """Workers are running, False after close or a terminated worker."""
+        return len(self.connections) > 0
+
+    def residuals(self, xlog: np.ndarray) -> np.ndarray:
+        """Residuals of all mappings in the order of the mappings."""
+        replies = self._request(("residuals", np.asarray(xlog, dtype=float)))
+        res = np.empty(self.offsets[-1])
+        for part, indices in zip(replies, self.partitions):
+            pos = 0
+            for k in indices:
+                res[self.offsets[k]:self.offsets[k + 1]] = part[pos:pos + self.lengths[k]]
+                pos += self.lengths[k]
+        return res
+
+    def set_fidelity(self, level: FidelityLevel) -> None:
+        """Set integrator tolerances of the running workers."""
+        self._request(("fidelity", level))
+
+    def _request(self, message) -> List:
+        """Send message to all workers and read the replies of all workers.
+
+        The replies of all workers are read before errors are raised, replies
+        left in the pipes would be read by the next request. If a worker
+        terminated, the workers are stopped (see alive).
+        """
+        try:
+            for conn in self.connections:
+                conn.send(message)
+            replies = [conn.recv() for conn in self.connections]
+        except (EOFError, OSError) as err:
+            self.close()
+            raise RuntimeError(f"Objective worker terminated: {err!r}") from err
+
+        errors = [value for status, value in replies if status == "error"]
+        if errors:
+            # errors which are not integration errors take precedence
+            errors.sort(key=lambda error: error[2])
+            self._raise_error(errors[0])
+        return [value for _, value in replies]
+
+    def close(self) -> None:
+        """Stop the workers."""
+        for conn in self.connections:
+            try:
+                conn.send(None)
+                conn.close()
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(timeout=10)
+        self.connections, self.processes = [], []
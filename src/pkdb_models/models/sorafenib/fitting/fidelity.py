@@ -0,0 +1,69 @@
+"""Multi-fidelity least square fitting.
+
+Far from the optimum the objective does not have to be simulated with full
+accuracy. With a fidelity schedule every start is optimized level by level:
+the optimization at a level starts at the optimum of the previous level and
+terminates with the 'ftol' of the level, i.e. the integrator tolerances are
+tightened as the optimizer converges. The last level defines the accuracy
+of the fit, by default the tolerances of the experiments (run_experiments).
+
+The output of the objective is already restricted to the data time points
+(see optimization.py), a coarser output grid would change the objective, so
+the levels differ in the integrator tolerances.
+
+For every start the optimum is evaluated with all fidelities, the report
+(see fidelity_report) contains the difference of these costs to the cost
+with the final fidelity.
+"""
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+import pandas as pd
+from sbmlsim.fit.result import OptimizationResult
+
+
+@dataclass
+class FidelityLevel:
+    """Fidelity of the objective evaluation.
+
+    :param relative_tolerance: relative tolerance of the integrator
+    :param absolute_tolerance: absolute tolerance of the integrator
+    :param ftol: termination of the least square optimization at the level
+    """
+
+    relative_tolerance: float
+    absolute_tolerance: float
+    ftol: float = 1e-8
+
+
+DEFAULT_FIDELITIES: List[FidelityLevel] = [
+    FidelityLevel(relative_tolerance=1e-4, absolute_tolerance=1e-4, ftol=1e-4),
+    FidelityLevel(relative_tolerance=1e-6, absolute_tolerance=1e-6, ftol=1e-6),
+    FidelityLevel(relative_tolerance=1e-10, absolute_tolerance=1e-10, ftol=1e-8),
+]
+
+
+def fidelity_report(opt_result: OptimizationResult) -> pd.DataFrame:
+    """Costs of the levels for all starts of a multi-fidelity optimization.
+
+    Columns: start, level, tolerances, number of evaluations, duration and
+    cost of the optimization at the level; 'cost_xopt' is the cost of the
+    final optimum of the start at the fidelity of the level, 'delta_cost' and
+    'delta_cost_rel' the difference to the cost at the final fidelity.
+    """
+    rows = []
+    for k, fit in enumerate(opt_result.fits):
+        levels = getattr(fit, "fidelities", None)
+        if not levels:
+            continue
+        cost_final = levels[-1]["cost_xopt"]
+        for level in levels:
+            delta = level["cost_xopt"] - cost_final
+            rows.append({
+                "start": k,
+                **level,
+                "delta_cost": delta,
+                "delta_cost_rel": delta / cost_final if cost_final else np.nan,
+            })
+    return pd.DataFrame(rows)
@@ -1,22 +1,33 @@
-"""Parameter fit problems for sorafenib."""
-from sbmlutils.log import get_logger
+"""Parameter fit problems for sorafenib.
+
+Fit experiments are created lazily on first use (see get_fitexp_all), so
+importing this module does not load any experiment or dataset.
+"""
+import inspect
+import json
+from functools import lru_cache
+from pathlib import Path
 
-from pkdb_models.models.sorafenib import SORAFENIB_PATH, DATA_PATHS
+from sbmlutils.log import get_logger
 
-from pkdb_models.models.sorafenib.experiments.studies import *
+from pkdb_models.models.sorafenib import CACHE_PATH, SORAFENIB_PATH, DATA_PATHS
 
-from typing import Dict, List, Type, Union, Callable
+from typing import Dict, List, Optional, Tuple, Type, Union, Callable
 
 from sbmlsim.experiment import ExperimentRunner, SimulationExperiment
 from sbmlsim.fit import FitExperiment, FitMapping
 
-from pkdb_models.models.sorafenib.experiments.studies.ferrario2016 import Ferrario2016
-from pkdb_models.models.sorafenib.experiments.studies.fukudo2014 import Fukudo2014
-from pkdb_models.models.sorafenib.experiments.studies.hussaarts2020 import Hussaarts2020
-from pkdb_models.models.sorafenib.experiments.studies.ishii2014 import Ishii2014
+from pkdb_models.models.sorafenib.cache import hash_file, hash_json
+from pkdb_models.models.sorafenib.experiments.base_experiment import (
+    SorafenibSimulationExperiment,
+)
+from pkdb_models.models.sorafenib.experiments.registry import load_experiment
 
 logger = get_logger(__name__)
 
+# serialized fit experiments
+FIT_EXPERIMENTS_CACHE_PATH = CACHE_PATH / "fit_experiments"
+
 
 def fit_experiments_for_filter(
     experiment_classes: Union[
@@ -74,29 +85,165 @@ class Ishi2014:
     pass
 
 
-experiment_classes = [
-    Aboualfa2006,
-    Andriamanana2013,
-    Awada2005,
-    Bins2017,  # TODO: exclude RIF !
-    Duran2007,
-    Ferrario2016,
-    Fucile2015,
-    Fukudo2014,
-    Hornecker2012,
-    Huang2017,
-    Huh2021,
-    Hussaarts2020,  # TODO: exclude PROB !
-    Ishii2014,
-    Mammatas2020,
-    Strumberg2005,
-    Zimmerman2012,
+experiment_names = [
+    "Aboualfa2006",
+    "Andriamanana2013",
+    "Awada2005",
+    "Bins2017",  # TODO: exclude RIF !
+    "Duran2007",
+    "Ferrario2016",
+    "Fucile2015",
+    "Fukudo2014",
+    "Hornecker2012",
+    "Huang2017",
+    "Huh2021",
+    "Hussaarts2020",  # TODO: exclude PROB !
+    "Ishii2014",
+    "Mammatas2020",
+    "Strumberg2005",
+    "Zimmerman2012",
 ]
 
 
-logger.info("--- ALL ---")
-fitexp_all = fit_experiments_for_filter(
-    experiment_classes,
-    metadata_filter=filter_empty,
-)
-logger.info(fitexp_all)
+def fit_experiments_to_dict(
+    fit_experiments: Dict[str, List[FitExperiment]]
+) -> Dict[str, List[Dict]]:
+    """Serialize fit experiments, classes are stored by name."""
+    return {
+        key: [
+            {
+                "experiment": fit_exp.experiment_class.__name__,
+                "mappings": fit_exp.mappings,
+                "weights": None if fit_exp.use_mapping_weights else fit_exp.weights,
+                "use_mapping_weights": fit_exp.use_mapping_weights,
+            }
+            for fit_exp in fit_exps
+        ]
+        for key, fit_exps in fit_experiments.items()
+    }
+
+
+def fit_experiments_from_dict(d: Dict[str, List[Dict]]) -> Dict[str, List[FitExperiment]]:
+    """Restore fit experiments, only the experiment classes are imported."""
+    return {
+        key: [
+            FitExperiment(
+                experiment=load_experiment(item["experiment"]),
+                mappings=item["mappings"],
+                weights=item["weights"],
+                use_mapping_weights=item["use_mapping_weights"],
+            )
+            for item in items
+        ]
+        for key, items in d.items()
+    }
+
+
+def _sources_hash(experiment_classes: List[Type[SimulationExperiment]]) -> str:
+    """Hash of the source files defining the fit mappings."""
+    paths = {Path(inspect.getsourcefile(SorafenibSimulationExperiment))}
+    for experiment_class in experiment_classes:
+        paths.add(Path(inspect.getsourcefile(experiment_class)))
+    return hash_json({str(path.name): hash_file(path) for path in sorted(paths)})
+
+
+def _filter_hash(metadata_filter: Callable) -> Optional[str]:
+    """Hash of the filter and its module, None if it cannot be persisted.
+
+    Lambdas, closures and other callables without a unique module-level
+    definition are not identified by their name and are only memoized in
+    memory.
+    """
+    qualname = getattr(metadata_filter, "__qualname__", "")
+    if (
+        not inspect.isfunction(metadata_filter)
+        or metadata_filter.__name__ == "<lambda>"
+        or "<locals>" in qualname
+        or metadata_filter.__closure__ is not None
+    ):
+        return None
+    try:
+        source = inspect.getsource(metadata_filter)
+        path = Path(inspect.getsourcefile(metadata_filter))
+    except (OSError, TypeError):
+        return None
+    return hash_json({
+        "filter": f"{metadata_filter.__module__}.{qualname}",
+        "source": source,
+        "module": hash_file(path),
+    })
+
+
+@lru_cache(maxsize=None)
+def _fit_experiments_memoized(
+    experiment_names: Tuple[str, ...],
+    metadata_filter: Callable,
+    use_mapping_weights: bool,
+    default_weight: bool,
+) -> Dict[str, Dict]:
+    """Serialized fit experiments for filter, memoized and stored on disk."""
+    experiment_classes = [load_experiment(name) for name in experiment_names]
+    filter_hash = _filter_hash(metadata_filter)
+    path = None
+    if filter_hash is not None:
+        key = hash_json({
+            "experiments": experiment_names,
+            "filter": filter_hash,
+            "use_mapping_weights": use_mapping_weights,
+            "default_weight": default_weight,
+            "sources": _sources_hash(experiment_classes),
+        })
+        path = FIT_EXPERIMENTS_CACHE_PATH / f"{metadata_filter.__name__}_{key}.json"
+        if path.exists():
+            with open(path, "r") as f:
+                return json.load(f)
+
+    fit_experiments = fit_experiments_for_filter(
+        experiment_classes,
+        metadata_filter=metadata_filter,
+        use_mapping_weights=use_mapping_weights,
+        default_weight=default_weight,
+    )
+    d = fit_experiments_to_dict(fit_experiments)
+    if path is not None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(d, f, indent=2)
+    return d
+
+
+def get_fit_experiments_for_filter(
+    experiment_names: List[str],
+    metadata_filter: Callable,
+    use_mapping_weights: bool = True,
+    default_weight: bool = None,
+) -> Dict[str, List[FitExperiment]]:
+    """Fit experiments for filter, built on first use.
+
+    The selected mappings are memoized per filter and stored on disk
+    (invalidated by changes of the experiment and filter sources), so the
+    experiments and datasets are only loaded once. Mappings of lambda and
+    closure filters are only memoized in memory.
+    """
+    d = _fit_experiments_memoized(
+        tuple(experiment_names),
+        metadata_filter,
+        use_mapping_weights,
+        default_weight,
+    )
+    return fit_experiments_from_dict(d)
+
+
+def get_fitexp_all() -> Dict[str, List[FitExperiment]]:
+    """Fit experiments with all mappings."""
+    return get_fit_experiments_for_filter(
+        experiment_names,
+        metadata_filter=filter_empty,
+    )
+
+
+def __getattr__(name: str):
+    # fitexp_all is created lazily on first access
+    if name == "fitexp_all":
+        return get_fitexp_all()
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
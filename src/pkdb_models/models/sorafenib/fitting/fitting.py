@@ -1,9 +1,14 @@
 """Sorafenib parameter fitting."""
+import functools
 import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
 import itertools
-from typing import List, Dict, Tuple
+from typing import Callable, List, Dict, Optional, Tuple
+
+import pandas as pd
 
 from sbmlsim.fit import FitParameter, FitExperiment
 from sbmlsim.fit.result import OptimizationResult
@@ -14,7 +19,17 @@ from sbmlsim.fit.options import *
 from sbmlsim.fit.sampling import SamplingType
 
 from pkdb_models.models.sorafenib.fitting.fit_experiments import (
-    fitexp_all,
+    get_fitexp_all,
+)
+from pkdb_models.models.sorafenib.fitting.fidelity import (
+    FidelityLevel,
+    fidelity_report,
+)
+from pkdb_models.models.sorafenib.fitting.memo import MEMO_CACHE_PATH
+from pkdb_models.models.sorafenib.fitting.multistart import run_multistart
+from pkdb_models.models.sorafenib.fitting.optimization import (
+    JacobianType,
+    SorafenibOptimizationProblem,
 )
 from pkdb_models.models.sorafenib.fitting.parameters import (
     parameters_all,
@@ -47,21 +62,53 @@ fit_kwargs = {
 
 
 def create_optimization_problem(
-    fit_experiments: List[FitExperiment], opid: str, parameters: List[FitParameter]
+    fit_experiments: List[FitExperiment],
+    opid: str,
+    parameters: List[FitParameter],
+    output_sampling: bool = True,
+    jacobian: JacobianType = JacobianType.FINITE_DIFFERENCES,
+    objective_workers: int = 1,
+    memo_path: Optional[Path] = None,
+    fidelities: Optional[List[FidelityLevel]] = None,
 ) -> OptimizationProblem:
-    op = OptimizationProblem(
+    """Create optimization problem.
+
+    :param output_sampling: simulate only the data time points in the objective
+    :param jacobian: calculation of the Jacobian in least square fitting
+    :param objective_workers: number of processes evaluating the residuals
+    :param memo_path: directory of persisted objective memos
+    :param fidelities: fidelity schedule of least square fitting
+    """
+    op = SorafenibOptimizationProblem(
         opid=opid,
         fit_experiments=fit_experiments,
         fit_parameters=parameters,
+        output_sampling=output_sampling,
+        jacobian=jacobian,
+        objective_workers=objective_workers,
+        memo_path=memo_path,
+        fidelities=fidelities,
         base_path=SORAFENIB_PATH,
         data_path=DATA_PATHS,
     )
     return op
 
 
-def fitlsq(op, **kwargs) -> Tuple[OptimizationResult, OptimizationProblem]:
-    """Local least square fitting."""
-    opt_res = run_optimization(
+def _optimization_runner(checkpoint_path: Optional[Path]) -> Callable:
+    """Runner of multistart optimization, checkpointed if path is given."""
+    if checkpoint_path is None:
+        return run_optimization
+    return functools.partial(run_multistart, path=checkpoint_path)
+
+
+def fitlsq(
+    op, checkpoint_path: Optional[Path] = None, **kwargs
+) -> Tuple[OptimizationResult, OptimizationProblem]:
+    """Local least square fitting.
+
+    :param checkpoint_path: directory for checkpoints of the starts, see multistart
+    """
+    opt_res = _optimization_runner(checkpoint_path)(
         problem=op,
         seed=1238,
         algorithm=OptimizationAlgorithmType.LEAST_SQUARE,
@@ -77,9 +124,14 @@ def fitlsq(op, **kwargs) -> Tuple[OptimizationResult, OptimizationProblem]:
     return opt_res, op
 
 
-def fitde(op, **kwargs) -> Tuple[OptimizationResult, OptimizationProblem]:
-    """Global differential evolution fitting."""
-    opt_res = run_optimization(
+def fitde(
+    op, checkpoint_path: Optional[Path] = None, **kwargs
+) -> Tuple[OptimizationResult, OptimizationProblem]:
+    """Global differential evolution fitting.
+
+    :param checkpoint_path: directory for checkpoints of the starts, see multistart
+    """
+    opt_res = _optimization_runner(checkpoint_path)(
         problem=op,
         seed=1234,
         algorithm=OptimizationAlgorithmType.DIFFERENTIAL_EVOLUTION,
@@ -113,53 +165,192 @@ class FitExperimentSubset(Enum):
     ALL = 1
 
 
+def fit_op(
+    op: OptimizationProblem,
+    fit_method: FitMethod,
+    size: int = 10,
+    n_cores: int = 10,
+    checkpoint_path: Optional[Path] = None,
+) -> Tuple[OptimizationResult, OptimizationProblem]:
+    """Run multistart optimization of the problem with the fit method."""
+    opt_result: OptimizationResult
+    op_checkpoint_path = None
+    if checkpoint_path is not None:
+        op_checkpoint_path = checkpoint_path / op.opid
+    if fit_method == FitMethod.LSQ:
+        opt_result, op = fitlsq(
+            op, size=size, n_cores=n_cores, checkpoint_path=op_checkpoint_path, **fit_kwargs
+        )
+    elif fit_method == FitMethod.DE:
+        opt_result, op = fitde(
+            op, size=size, n_cores=n_cores, checkpoint_path=op_checkpoint_path, **fit_kwargs
+        )
+
+    return opt_result, op
+
+
+def split_cores(n_cores: int, n_problems: int) -> Tuple[int, int]:
+    """Split cores in (problems in parallel, cores per problem)."""
+    n_parallel = max(1, min(n_cores, n_problems))
+    return n_parallel, max(1, n_cores // n_parallel)
+
+
+def _summary_row(opid: str, opt_result: OptimizationResult) -> Dict:
+    """Best fit of optimization result for the summary table."""
+    df = opt_result.df_fits
+    return {
+        "opid": opid,
+        "cost": df.cost.iloc[0],
+        "starts": len(df),
+        "success": int(df.success.sum()),
+        "duration": df.duration.sum(),
+        **dict(zip([p.pid for p in opt_result.parameters], opt_result.xopt)),
+    }
+
+
+def fit_ops_parallel(
+    ops: List[OptimizationProblem],
+    fit_method: FitMethod,
+    size: int = 10,
+    n_cores: int = 10,
+    checkpoint_path: Optional[Path] = None,
+    summary_path: Optional[Path] = None,
+) -> Dict[str, Tuple[OptimizationResult, OptimizationProblem]]:
+    """Run independent optimization problems on a process pool.
+
+    The cores are split between the problems and the starts of every
+    problem (see split_cores). The best fit of every problem is added to the
+    summary table as soon as the problem is finished.
+
+    :param summary_path: TSV with the best fit of the finished problems
+    """
+    n_parallel, n_cores_op = split_cores(n_cores, len(ops))
+    logger.info(
+        f"Fitting {len(ops)} problems, {n_parallel} in parallel with "
+        f"{n_cores_op} cores each"
+    )
+
+    rows: List[Dict] = []
+    finished: Dict[str, Tuple[OptimizationResult, OptimizationProblem]] = {}
+
+    def add_result(opt_result: OptimizationResult, op: OptimizationProblem) -> None:
+        finished[op.opid] = (opt_result, op)
+        rows.append(_summary_row(op.opid, opt_result))
+        logger.info(f"{op.opid} finished ({len(finished)}/{len(ops)})")
+        if summary_path is not None:
+            summary_path.parent.mkdir(parents=True, exist_ok=True)
+            pd.DataFrame(rows).sort_values(by="cost").to_csv(
+                summary_path, sep="\t", index=False
+            )
+
+    kwargs = {
+        "fit_method": fit_method,
+        "size": size,
+        "n_cores": n_cores_op,
+        "checkpoint_path": checkpoint_path,
+    }
+    if n_parallel == 1:
+        for op in ops:
+            add_result(*fit_op(op, **kwargs))
+    else:
+        # worker processes are not daemonic, i.e. can run the starts in parallel
+        with ProcessPoolExecutor(
+            max_workers=n_parallel,
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            futures = [executor.submit(fit_op, op, **kwargs) for op in ops]
+            for future in as_completed(futures):
+                add_result(*future.result())
+
+    # results in order of the problems
+    return {op.opid: finished[op.opid] for op in ops}
+
+
 def fit_sorafenib(
     optimization_strategy: OptimizationStrategy,
     fit_method: FitMethod,
     fit_experiments: List[FitExperiment],
     parameters: List[FitParameter],
+    jacobian: JacobianType = JacobianType.FINITE_DIFFERENCES,
+    size: int = 10,
+    n_cores: int = 10,
+    checkpoint_path: Optional[Path] = None,
+    summary_path: Optional[Path] = None,
+    objective_workers: int = 1,
+    memo_path: Optional[Path] = None,
+    fidelities: Optional[List[FidelityLevel]] = None,
 ) -> Dict[str, Tuple[OptimizationResult, OptimizationProblem]]:
-
+    """Fit experiments with given strategy and method.
+
+    :param jacobian: calculation of the Jacobian in least square fitting
+    :param size: number of starts of the multistart optimization
+    :param n_cores: number of cores, with OptimizationStrategy.SINGLE split
+        between the experiments and their starts
+    :param checkpoint_path: directory for checkpoints of the starts; finished
+        starts are stored in '<checkpoint_path>/<opid>/<key>', unfinished
+        starts are resumed and a larger size adds starts to the existing run;
+        a changed problem, model or study data starts a new run
+    :param summary_path: TSV with the best fit of every experiment, updated
+        as the fits finish (OptimizationStrategy.SINGLE)
+    :param objective_workers: processes evaluating the residuals of every
+        start (OptimizationStrategy.ALL), the experiments are distributed
+        over the workers. Requires n_cores=1 or a checkpoint_path, the
+        multiprocessing pool of run_optimization cannot start workers.
+    :param memo_path: directory of persisted objective memos; evaluations of
+        previous fits of the same problem are reused
+    :param fidelities: fidelity schedule of least square fitting, starts are
+        optimized with increasing integrator tolerances (see fidelity.py)
+    """
     if not isinstance(optimization_strategy, OptimizationStrategy):
         raise ValueError
     if not isinstance(fit_method, FitMethod):
         raise ValueError
 
-    def fit_op(
-        op: OptimizationProblem,
-    ) -> Tuple[OptimizationResult, OptimizationProblem]:
-        """Wrapper for optimization function."""
-
-        # run optimization
-        opt_result: OptimizationResult
-        op: OptimizationProblem
-        if fit_method == FitMethod.LSQ:
-            opt_result, op = fitlsq(op, size=10, n_cores=10, **fit_kwargs)
-        elif fit_method == FitMethod.DE:
-            opt_result, op = fitde(op, size=10, n_cores=10, **fit_kwargs)
-
-        return opt_result, op
-
     # store optimization results
     results = {}
 
     if optimization_strategy == OptimizationStrategy.SINGLE:
         # fit all experiments individually
-        for fit_exp in fit_experiments:
-            opid = fit_exp.experiment_class.__name__
-
-            op = create_optimization_problem(
-                fit_experiments=[fit_exp], opid=opid, parameters=parameters
+        ops = [
+            create_optimization_problem(
+                fit_experiments=[fit_exp],
+                opid=fit_exp.experiment_class.__name__,
+                parameters=parameters,
+                jacobian=jacobian,
+                memo_path=memo_path,
+                fidelities=fidelities,
             )
-            results[opid] = fit_op(op=op)
+            for fit_exp in fit_experiments
+        ]
+        results = fit_ops_parallel(
+            ops,
+            fit_method=fit_method,
+            size=size,
+            n_cores=n_cores,
+            checkpoint_path=checkpoint_path,
+            summary_path=summary_path,
+        )
 
     elif optimization_strategy == OptimizationStrategy.ALL:
         # fit all experiments together
         opid = "all"
         op = create_optimization_problem(
-            fit_experiments=fit_experiments, opid=opid, parameters=parameters
+            fit_experiments=fit_experiments,
+            opid=opid,
+            parameters=parameters,
+            jacobian=jacobian,
+            objective_workers=objective_workers,
+            memo_path=memo_path,
+            fidelities=fidelities,
+        )
+        results[opid] = fit_op(
+            op,
+            fit_method=fit_method,
+            size=size,
+            n_cores=n_cores,
+            checkpoint_path=checkpoint_path,
         )
-        results[opid] = fit_op(op)
+        op.close()
 
     return results
 
@@ -170,7 +361,7 @@ def get_fit_experiments(fit_subset: FitExperimentSubset, study_ids: List[str] =
         raise ValueError
 
     if fit_subset == FitExperimentSubset.ALL:
-        fitexp_dict = fitexp_all
+        fitexp_dict = get_fitexp_all()
 
     if study_ids:
         fit_experiments = [fitexp_dict[sid] for sid in study_ids]
@@ -199,18 +390,36 @@ def run_fit_subset(
     fit_method: FitMethod,
     output_name: str,
     output_dir: Path,
+    size: int = 10,
+    fidelities: Optional[List[FidelityLevel]] = None,
 ):
     """Fits subset of data.
 
-    Used for iterative fitting of parameters.
+    Used for iterative fitting of parameters. Finished starts are stored in
+    '<output_dir>/<output_name>_starts', an interrupted fit is resumed by
+    running it again. Objective evaluations are memoized in MEMO_CACHE_PATH,
+    i.e. the analysis of a repeated fit does not simulate the optimum again.
+
+    With fidelities (e.g. DEFAULT_FIDELITIES) the costs of the optima at the
+    fidelity levels are written to '<output_dir>/<output_name>_fidelities.tsv'
+    and the analysis uses the tolerances of the final level.
     """
     results_all: Dict[str, Tuple[OptimizationResult, OptimizationProblem]] = fit_sorafenib(
         fit_experiments=fit_experiments,
         parameters=parameters,
         optimization_strategy=OptimizationStrategy.ALL,
         fit_method=fit_method,
+        size=size,
+        checkpoint_path=output_dir / f"{output_name}_starts",
+        memo_path=MEMO_CACHE_PATH,
+        fidelities=fidelities,
     )
 
+    analysis_kwargs = {**fit_kwargs}
+    if fidelities:
+        analysis_kwargs["relative_tolerance"] = fidelities[-1].relative_tolerance
+        analysis_kwargs["absolute_tolerance"] = fidelities[-1].absolute_tolerance
+
     # parameters for plots
     mpl_parameters = {
         # 'axes.labelsize': 12,
@@ -225,9 +434,19 @@ def run_fit_subset(
             output_dir=output_dir,
             show_plots=True,
             show_titles=False,
-            **fit_kwargs
+            **analysis_kwargs
         )
         opt_analysis.run(mpl_parameters=mpl_parameters)
+        op.close()
+
+        if fidelities:
+            df = fidelity_report(opt_result)
+            df.to_csv(output_dir / f"{output_name}_fidelities.tsv", sep="\t", index=False)
+            if not df.empty:
+                logger.info(
+                    f"{key}: maximal relative cost difference to the final "
+                    f"fidelity: {df.delta_cost_rel.abs().max():.3g}"
+                )
 
     return results_all
 
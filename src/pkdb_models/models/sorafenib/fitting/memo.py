@@ -0,0 +1,139 @@
+"""Memo of objective evaluations.
+
+Optimizers evaluate the residuals repeatedly at the same parameter vectors,
+e.g. Latin hypercube starts of repeated fits with the same seed, line
+searches returning to the current iterate, and OptimizationAnalysis which
+simulates the optimum with complete data for every plot. ResidualMemo is an
+LRU memo of
+
+    log10 parameter vector -> per-mapping residuals                (objective)
+    log10 parameter vector -> residual data with simulated observables
+                              (x_obs, y_obs, y_obsip, ...)     (complete data)
+
+The memo is optionally persisted in '<path>/<key>.pkl'. The key is the hash
+of the problem (experiments, parameters, settings), the model, the study
+data, the data of the mappings, the sbmlsim version and the sources of the
+experiments (with their base classes), the optimization problem and the
+simulator (see multistart.objective_hash), i.e. a persisted memo is only
+reused by the same problem and code.
+"""
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sbmlsim.fit.optimization import OptimizationProblem
+from sbmlutils.log import get_logger
+
+from pkdb_models.models.sorafenib import CACHE_PATH
+from pkdb_models.models.sorafenib.cache import hash_json
+from pkdb_models.models.sorafenib.fitting.multistart import objective_hash, problem_hash
+
+logger = get_logger(__name__)
+
+MEMO_CACHE_PATH = CACHE_PATH / "fit_memo"
+
+
+def memo_key(problem: OptimizationProblem, settings: Dict[str, Any]) -> str:
+    """Key of the memo of an initialized problem."""
+    return hash_json({
+        "problem": problem_hash(problem, algorithm=None, settings=settings),
+        "objective": objective_hash(problem),
+        "data": [
+            problem.x_references,
+            problem.y_references,
+            problem.y_errors,
+            problem.weights,
+        ],
+    })
+
+
+class ResidualMemo:
+    """LRU memo of residuals at parameter vectors.
+
+    :param max_size: maximum number of memoized evaluations
+    :param path: directory of persisted memos, None for in-memory memo
+    :param key: key of the problem, see memo_key
+    """
+
+    def __init__(
+        self, max_size: int = 1000, path: Optional[Path] = None, key: Optional[str] = None
+    ):
+        self.max_size = max_size
+        self.path = Path(path) if path is not None else None
+        self.key = key
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[bool, bytes], Any]" = OrderedDict()
+        self._modified = False
+
+        if self._file is not None and self._file.exists():
+            try:
+                with open(self._file, "rb") as f:
+                    self._entries = pickle.load(f)
+                logger.info(f"{len(self._entries)} evaluations loaded from '{self._file}'")
+            except (OSError, EOFError, pickle.UnpicklingError) as err:
+                logger.warning(f"Memo '{self._file}' could not be loaded: {err}")
+
+    @property
+    def _file(self) -> Optional[Path]:
+        if self.path is None or self.key is None:
+            return None
+        return self.path / f"{self.key}.pkl"
+
+    @staticmethod
+    def _entry_key(xlog: np.ndarray, complete_data: bool) -> Tuple[bool, bytes]:
+        return complete_data, np.asarray(xlog, dtype=np.float64).tobytes()
+
+    def get(self, xlog: np.ndarray, complete_data: bool = False) -> Optional[Any]:
+        """Memoized evaluation at xlog, None if not memoized."""
+        key = self._entry_key(xlog, complete_data)
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, xlog: np.ndarray, value: Any, complete_data: bool = False) -> None:
+        """Memoize evaluation at xlog, least recently used entries are evicted."""
+        self._entries[self._entry_key(xlog, complete_data)] = value
+        self._entries.move_to_end(self._entry_key(xlog, complete_data))
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        self._modified = True
+
+    def save(self) -> None:
+        """Persist memo, merged with evaluations persisted by other processes."""
+        if self._file is None or not self._modified:
+            return
+        entries: "OrderedDict[Tuple[bool, bytes], Any]" = OrderedDict()
+        if self._file.exists():
+            try:
+                with open(self._file, "rb") as f:
+                    entries = pickle.load(f)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                pass
+        entries.update(self._entries)
+        while len(entries) > self.max_size:
+            entries.popitem(last=False)
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(entries, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self._file)
+        self._modified = False
+        logger.debug(
+            f"{len(entries)} evaluations saved to '{self._file}' "
+            f"({self.hits} hits, {self.misses} misses)"
+        )
+
+
+def split_residuals(res: np.ndarray, lengths: List[int]) -> List[np.ndarray]:
+    """Split residual vector in the residuals of the mappings."""
+    return np.split(res, np.cumsum(lengths)[:-1])
@@ -0,0 +1,331 @@
+"""Checkpointed multistart optimization.
+
+sbmlsim.fit.runner.run_optimization runs all starts of a multistart
+optimization in one blocking call and only returns after every start has
+finished. Long fits on preemptible nodes lose all finished starts if the job
+is killed. run_multistart runs the same optimization, but every finished
+start is stored in the checkpoint directory
+
+    <path>/<key>/run.json       problem hash and start values of all starts
+    <path>/<key>/start_<k>.pkl  result and trajectory of finished start k
+    <path>/<key>/starts.tsv     summary of finished starts (cost, status, x)
+
+The key is the hash of the problem (experiments, parameters, bounds,
+settings) and of the inputs of the objective (model, study data, sources of
+the experiments, problem and simulator, sbmlsim version), see
+checkpoint_key. Restarting with the same path resumes the unfinished starts,
+a larger size adds starts to an existing run (the start values of existing
+starts are kept). A changed problem or changed inputs start a new run
+directory, checkpoints are never reused for a different objective.
+"""
+import inspect
+import json
+import multiprocessing
+import os
+import pickle
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import sbmlsim
+from sbmlsim.fit.optimization import OptimizationProblem
+from sbmlsim.fit.options import (
+    LossFunctionType,
+    OptimizationAlgorithmType,
+    ResidualType,
+    WeightingPointsType,
+)
+from sbmlsim.fit.result import OptimizationResult
+from sbmlsim.fit.sampling import SamplingType, create_samples
+from sbmlutils.log import get_logger
+
+from pkdb_models.models.sorafenib import MODEL_PATH, dosing
+from pkdb_models.models.sorafenib.cache import hash_file, hash_json
+
+logger = get_logger(__name__)
+
+# problem of the worker process, initialized once per worker
+_worker_problem: Optional[OptimizationProblem] = None
+
+
+def problem_hash(
+    problem: OptimizationProblem,
+    algorithm: Optional[OptimizationAlgorithmType],
+    settings: Dict[str, Any],
+) -> str:
+    """Hash of the experiments, parameters and settings of the problem."""
+    return hash_json({
+        "opid": problem.opid,
+        "experiments": [
+            {
+                "experiment": fit_exp.experiment_class.__name__,
+                "mappings": fit_exp.mappings,
+                "weights": str(fit_exp.weights),
+                "use_mapping_weights": fit_exp.use_mapping_weights,
+            }
+            for fit_exp in problem.fit_experiments
+        ],
+        "parameters": [
+            [p.pid, p.start_value, p.lower_bound, p.upper_bound, str(p.unit)]
+            for p in problem.parameters
+        ],
+        "algorithm": str(algorithm),
+        "settings": {key: str(value) for key, value in sorted(settings.items())},
+    })
+
+
+def objective_hash(problem: OptimizationProblem) -> str:
+    """Hash of the inputs of the objective which are not part of problem_hash.
+
+    Covers the model, the study data of the fit experiments, the sbmlsim
+    version and the sources of the experiments (with their base classes),
+    the optimization problem and the simulator.
+    """
+    data_paths = problem.data_path
+    if data_paths is None:
+        data_paths = []
+    elif isinstance(data_paths, (str, Path)):
+        data_paths = [data_paths]
+
+    classes = [fit_exp.experiment_class for fit_exp in problem.fit_experiments]
+    sources: List[Path] = [Path(dosing.__file__)]
+    for cls in classes + [type(problem)]:
+        for base in cls.__mro__:
+            if base.__module__.startswith("pkdb_models"):
+                sources.append(Path(inspect.getsourcefile(base)))
+    for cls in classes:
+        sid = cls.__name__
+        for data_path in data_paths:
+            sources.extend((Path(data_path) / sid).glob(f".{sid}_*.tsv"))
+
+    return hash_json({
+        "model": hash_file(MODEL_PATH),
+        "sbmlsim": sbmlsim.__version__,
+        "sources": {str(path): hash_file(path) for path in sorted(set(sources))},
+    })
+
+
+def checkpoint_key(
+    problem: OptimizationProblem,
+    algorithm: Optional[OptimizationAlgorithmType],
+    settings: Dict[str, Any],
+) -> str:
+    """Key of the checkpoints of a multistart optimization."""
+    return hash_json({
+        "problem": problem_hash(problem, algorithm=algorithm, settings=settings),
+        "objective": objective_hash(problem),
+    })
+
+
+class MultistartCheckpoint:
+    """Checkpoint directory of a multistart optimization.
+
+    :param path: checkpoint directory
+    :param key: hash of the optimization problem, see checkpoint_key
+    """
+
+    def __init__(self, path: Path, key: str):
+        self.path = Path(path)
+        self.key = key
+        self.starts: List[Dict] = []
+
+        run_path = self.path / "run.json"
+        if run_path.exists():
+            with open(run_path, "r") as f:
+                run = json.load(f)
+            if run["key"] == key:
+                self.starts = run["starts"]
+            else:
+                logger.warning(
+                    f"Checkpoints in '{self.path}' belong to a different "
+                    f"optimization problem and are removed."
+                )
+                for start_path in self.path.glob("start_*.pkl"):
+                    start_path.unlink()
+
+    def add_starts(self, x0s: List[Optional[List[float]]], seeds: List[int]) -> None:
+        """Add starts with start values and seeds."""
+        for x0, seed in zip(x0s, seeds):
+            self.starts.append({"x0": x0, "seed": int(seed)})
+        self.path.mkdir(parents=True, exist_ok=True)
+        _write_atomic(
+            self.path / "run.json",
+            json.dumps({"key": self.key, "starts": self.starts}, indent=2).encode("utf-8"),
+        )
+
+    def _start_path(self, k: int) -> Path:
+        return self.path / f"start_{k:04d}.pkl"
+
+    def finished(self) -> List[int]:
+        """Indices of finished starts."""
+        return [k for k in range(len(self.starts)) if self._start_path(k).exists()]
+
+    def save(self, k: int, fit, trajectory: List) -> None:
+        """Store finished start."""
+        _write_atomic(
+            self._start_path(k),
+            pickle.dumps((fit, trajectory), protocol=pickle.HIGHEST_PROTOCOL),
+        )
+
+    def load(self, k: int) -> Tuple[Any, List]:
+        """Load finished start."""
+        with open(self._start_path(k), "rb") as f:
+            return pickle.load(f)
+
+    def write_summary(self, pids: List[str]) -> pd.DataFrame:
+        """Write summary of the finished starts, sorted by cost."""
+        rows = []
+        for k in self.finished():
+            fit, _ = self.load(k)
+            rows.append({
+                "start": k,
+                "cost": fit.cost,
+                "success": fit.success,
+                "status": fit.status,
+                "duration": fit.duration,
+                **dict(zip(pids, np.atleast_1d(fit.x))),
+            })
+        df = pd.DataFrame(rows)
+        if not df.empty:
+            df = df.sort_values(by="cost")
+        df.to_csv(self.path / "starts.tsv", sep="\t", index=False)
+        return df
+
+
+def _write_atomic(path: Path, content: bytes) -> None:
+    """Write file atomically, partial files are never read."""
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _init_worker(problem: OptimizationProblem, settings: Dict[str, Any]) -> None:
+    """Initialize the problem once per worker."""
+    global _worker_problem
+    _worker_problem = problem
+    _worker_problem.initialize(**settings)
+
+
+def _run_start(
+    k: int,
+    x0: Optional[List[float]],
+    seed: int,
+    algorithm: OptimizationAlgorithmType,
+    kwargs: Dict,
+) -> Tuple[int, Any, List]:
+    """Run single start with the problem of the worker."""
+    np.random.seed(seed)
+    fit, trajectory = _worker_problem._optimize_single(
+        x0=None if x0 is None else np.asarray(x0),
+        algorithm=algorithm,
+        **kwargs,
+    )
+    return k, fit, trajectory
+
+
+def run_multistart(
+    problem: OptimizationProblem,
+    path: Path,
+    size: int = 5,
+    algorithm: OptimizationAlgorithmType = OptimizationAlgorithmType.LEAST_SQUARE,
+    sampling: SamplingType = SamplingType.UNIFORM,
+    seed: Optional[int] = None,
+    residual: ResidualType = ResidualType.ABSOLUTE,
+    loss_function: LossFunctionType = LossFunctionType.LINEAR,
+    weighting_curves: List = None,
+    weighting_points: WeightingPointsType = WeightingPointsType.NO_WEIGHTING,
+    variable_step_size: bool = True,
+    relative_tolerance: float = 1e-6,
+    absolute_tolerance: float = 1e-6,
+    n_cores: int = 1,
+    **kwargs,
+) -> OptimizationResult:
+    """Run checkpointed multistart optimization.
+
+    Arguments as in sbmlsim.fit.runner.run_optimization.
+
+    :param path: checkpoint directory, the run is stored in '<path>/<key>'
+    :param size: total number of starts of the run
+    :return: OptimizationResult of all starts
+    """
+    settings = {
+        "residual": residual,
+        "loss_function": loss_function,
+        "weighting_curves": weighting_curves if weighting_curves else [],
+        "weighting_points": weighting_points,
+        "variable_step_size": variable_step_size,
+        "relative_tolerance": relative_tolerance,
+        "absolute_tolerance": absolute_tolerance,
+    }
+    key = checkpoint_key(
+        problem,
+        algorithm=algorithm,
+        settings={
+            **settings,
+            **kwargs,
+            "sampling": sampling,
+            "seed": seed,
+            "fidelities": getattr(problem, "fidelities", None),
+        },
+    )
+    path = Path(path) / key[:12]
+    checkpoint = MultistartCheckpoint(path=path, key=key)
+
+    # additional starts, seeded by the number of existing starts
+    n_new = size - len(checkpoint.starts)
+    if n_new > 0:
+        batch_seed = None if seed is None else seed + len(checkpoint.starts)
+        rng = np.random.RandomState(batch_seed)
+        if algorithm == OptimizationAlgorithmType.LEAST_SQUARE:
+            x0s = create_samples(
+                parameters=problem.parameters,
+                size=n_new,
+                sampling=sampling,
+                seed=batch_seed,
+            ).values.tolist()
+        else:
+            x0s = [None] * n_new
+        checkpoint.add_starts(x0s, seeds=rng.randint(low=1, high=2**31 - 1, size=n_new))
+
+    finished = set(checkpoint.finished())
+    pending = [k for k in range(len(checkpoint.starts)) if k not in finished]
+    logger.info(
+        f"{problem.opid}: {len(finished)}/{len(checkpoint.starts)} starts finished, "
+        f"running {len(pending)} starts in '{path}'"
+    )
+
+    if pending:
+        n_cores = max(1, min(n_cores, len(pending)))
+        args = [
+            (k, checkpoint.starts[k]["x0"], checkpoint.starts[k]["seed"], algorithm, kwargs)
+            for k in pending
+        ]
+        if n_cores == 1:
+            _init_worker(problem, settings)
+            for arg in args:
+                checkpoint.save(*_run_start(*arg))
+                checkpoint.write_summary(problem.pids)
+        else:
+            with ProcessPoolExecutor(
+                max_workers=n_cores,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(problem, settings),
+            ) as executor:
+                futures = [executor.submit(_run_start, *arg) for arg in args]
+                for future in as_completed(futures):
+                    checkpoint.save(*future.result())
+                    checkpoint.write_summary(problem.pids)
+
+    fits, trajectories = [], []
+    for k in range(len(checkpoint.starts)):
+        fit, trajectory = checkpoint.load(k)
+        fits.append(fit)
+        trajectories.append(trajectory)
+    return OptimizationResult(
+        parameters=problem.parameters, fits=fits, trajectories=trajectories
+    )
@@ -0,0 +1,497 @@
+"""Optimization problem for the sorafenib fitting.
+
+The sbmlsim OptimizationProblem simulates every fit mapping on the complete
+output grid of the simulation (e.g. 200 steps per dosing interval, or every
+integrator step with variable step size) and interpolates the results to
+the data time points. In the objective only the data time points are
+required, so the fit simulations are sampled at the union of the time
+points of all mappings of the simulation (see dosing.set_output_times).
+The complete timecourses are only simulated for the analysis of the
+results (residuals with complete_data).
+
+The Jacobian of the least squares residuals is by default approximated by
+scipy with finite differences, i.e. one simulation of all fit experiments
+per parameter in every iteration. With JacobianType.BROYDEN the Jacobian is
+calculated by forward differences in the logarithmic parameter space (with
+a small step instead of 'diff_step') only every 'jacobian_refresh'
+iterations, in between it is updated with Broyden's rank-one update from
+the residuals of the accepted steps, which requires no additional
+simulations.
+
+With 'objective_workers' > 1 every residual evaluation is distributed over
+persistent worker processes, every worker simulates the mappings of a subset
+of the fit experiments (see decomposition.py). This parallelizes single
+local optimizations (e.g. OptimizationStrategy.ALL with one start). Worker
+processes cannot be started in daemonic processes (multiprocessing pool of
+sbmlsim.fit.runner.run_optimization), in this case the residuals are
+evaluated serially.
+
+Evaluations are memoized by parameter vector (see memo.py), with
+'memo_path' the memo is persisted across fits of the same problem.
+
+With 'fidelities' least square optimizations run through a schedule of
+integrator tolerances (see fidelity.py).
+"""
+import atexit
+import multiprocessing
+from copy import deepcopy
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sbmlsim.fit import FitExperiment, FitParameter
+from sbmlsim.fit.optimization import OptimizationProblem
+from sbmlsim.fit.options import OptimizationAlgorithmType
+from sbmlsim.simulation import TimecourseSim
+from sbmlutils.log import get_logger
+
+from pkdb_models.models.sorafenib.dosing import DosingSimulatorSerial, set_output_times
+from pkdb_models.models.sorafenib.fitting.decomposition import (
+    ObjectiveWorkerError,
+    ObjectiveWorkers,
+    partition_mappings,
+)
+from pkdb_models.models.sorafenib.fitting.fidelity import FidelityLevel
+from pkdb_models.models.sorafenib.fitting.memo import (
+    ResidualMemo,
+    memo_key,
+    split_residuals,
+)
+
+logger = get_logger(__name__)
+
+
+class JacobianType(Enum):
+    """Calculation of the Jacobian in least square optimization."""
+
+    FINITE_DIFFERENCES = 1  # scipy finite differences in every iteration
+    BROYDEN = 2  # forward differences with Broyden updates
+
+
+class SorafenibOptimizationProblem(OptimizationProblem):
+    """Optimization problem with simulations sampled at the data time points.
+
+    :param output_sampling: simulate fit mappings only at the data time points
+    :param jacobian: calculation of the Jacobian in least square optimization
+    :param jacobian_step: step of forward differences in log10 parameter space
+    :param jacobian_refresh: iterations between forward difference Jacobians
+    :param objective_workers: number of processes evaluating the residuals
+    :param memo_size: number of memoized evaluations, 0 disables the memo
+    :param memo_path: directory of persisted memos, None for in-memory memo
+    :param fidelities: fidelity schedule of least square optimizations, the
+        last level is the fidelity of the fit
+    """
+
+    def __init__(
+        self,
+        opid: str,
+        fit_experiments: List[FitExperiment],
+        fit_parameters: List[FitParameter],
+        output_sampling: bool = True,
+        jacobian: JacobianType = JacobianType.FINITE_DIFFERENCES,
+        jacobian_step: float = 1e-3,
+        jacobian_refresh: int = 5,
+        objective_workers: int = 1,
+        memo_size: int = 1000,
+        memo_path: Optional[Path] = None,
+        fidelities: Optional[List[FidelityLevel]] = None,
+        **kwargs,
+    ):
+        super().__init__(
+            opid=opid,
+            fit_experiments=fit_experiments,
+            fit_parameters=fit_parameters,
+            **kwargs,
+        )
+        self.output_sampling = output_sampling
+        self.sampled_simulations: List[TimecourseSim] = []
+
+        self.jacobian_type = jacobian
+        self.jacobian_step = jacobian_step
+        self.jacobian_refresh = jacobian_refresh
+        self._last_residuals: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._jac: Optional[np.ndarray] = None
+        self._jac_x: Optional[np.ndarray] = None
+        self._jac_f: Optional[np.ndarray] = None
+        self._jac_updates: int = 0
+
+        self.objective_workers = objective_workers
+        self._workers: Optional[ObjectiveWorkers] = None
+        self.memo_size = memo_size
+        self.memo_path = memo_path
+        self.memo: Optional[ResidualMemo] = None
+        self.fidelities = fidelities
+        self._init_kwargs: Dict[str, Any] = {
+            "opid": opid,
+            "fit_experiments": fit_experiments,
+            "fit_parameters": fit_parameters,
+            "output_sampling": output_sampling,
+            "jacobian": jacobian,
+            "jacobian_step": jacobian_step,
+            "jacobian_refresh": jacobian_refresh,
+            "memo_size": memo_size,
+            "memo_path": memo_path,
+            "fidelities": fidelities,
+            **kwargs,
+        }
+        self._init_settings: Dict[str, Any] = {}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Worker processes are not pickled, copies start their own workers."""
+        state = self.__dict__.copy()
+        state["_workers"] = None
+        return state
+
+    def initialize(
+        self,
+        variable_step_size: bool = True,
+        relative_tolerance: float = 1e-6,
+        absolute_tolerance: float = 1e-6,
+        **kwargs,
+    ) -> None:
+        """Initialize optimization problem.
+
+        The simulator supports the dosing simulations of the experiments and
+        output times, see OptimizationProblem.initialize for arguments.
+        """
+        self.close()
+        self._init_settings = {
+            "variable_step_size": variable_step_size,
+            "relative_tolerance": relative_tolerance,
+            "absolute_tolerance": absolute_tolerance,
+            **kwargs,
+        }
+        super().initialize(
+            variable_step_size=variable_step_size,
+            relative_tolerance=relative_tolerance,
+            absolute_tolerance=absolute_tolerance,
+            **kwargs,
+        )
+        self.set_simulator(
+            DosingSimulatorSerial(
+                absolute_tolerance=absolute_tolerance,
+                relative_tolerance=relative_tolerance,
+                variable_step_size=variable_step_size,
+            )
+        )
+        self.sampled_simulations = self._sample_simulations()
+        self._init_memo()
+
+    def _init_memo(self) -> None:
+        """Memo of the current settings, kept if the settings are unchanged."""
+        if self.memo_size <= 0:
+            return
+        key = memo_key(
+            self,
+            settings={**self._init_settings, "output_sampling": self.output_sampling},
+        )
+        if self.memo is None or self.memo.key != key:
+            if self.memo is not None:
+                self.memo.save()
+            self.memo = ResidualMemo(
+                max_size=self.memo_size, path=self.memo_path, key=key
+            )
+
+    def set_fidelity(self, level: FidelityLevel) -> None:
+        """Set integrator tolerances of the objective evaluation.
+
+        Running objective workers are updated, restarted workers are
+        initialized with the updated settings.
+        """
+        self._init_settings.update(
+            relative_tolerance=level.relative_tolerance,
+            absolute_tolerance=level.absolute_tolerance,
+        )
+        self.set_simulator(
+            DosingSimulatorSerial(
+                absolute_tolerance=level.absolute_tolerance,
+                relative_tolerance=level.relative_tolerance,
+                variable_step_size=self._init_settings["variable_step_size"],
+            )
+        )
+        if self._workers is not None:
+            try:
+                self._workers.set_fidelity(level)
+            except RuntimeError as err:
+                # restarted with the updated settings by the next evaluation
+                logger.warning(f"{self.opid}: objective workers stopped: {err}")
+                self._workers.close()
+            except ObjectiveWorkerError:
+                self.close()
+                raise
+            self._discard_terminated_workers()
+        self._init_memo()
+
+    def _sample_simulations(self) -> List[TimecourseSim]:
+        """Copies of the simulations with output at the data time points.
+
+        Mappings of the same simulation share the sampled copy, which is
+        sampled at the union of their time points. Simulations of mappings
+        which are not a function of time are not sampled.
+        """
+        groups: Dict[int, List[int]] = {}
+        for k, simulation in enumerate(self.simulations):
+            groups.setdefault(id(simulation), []).append(k)
+
+        sampled: List[TimecourseSim] = list(self.simulations)
+        n_sampled = 0
+        for indices in groups.values():
+            if any(self.xid_observable[k] != "time" for k in indices):
+                continue
+            n_sampled += 1
+            simulation = deepcopy(self.simulations[indices[0]])
+            set_output_times(
+                simulation,
+                np.concatenate([self.x_references[k] for k in indices]),
+            )
+            for k in indices:
+                sampled[k] = simulation
+
+        logger.debug(
+            f"{self.opid}: {n_sampled}/{len(groups)} simulations sampled at the "
+            f"data time points"
+        )
+        return sampled
+
+    def restrict(self, indices: List[int]) -> None:
+        """Restrict the problem to the fit mappings with given indices."""
+        for key in [
+            "experiment_keys",
+            "mapping_keys",
+            "xid_observable",
+            "yid_observable",
+            "x_references",
+            "y_references",
+            "y_errors",
+            "y_errors_type",
+            "weights",
+            "weights_points",
+            "weights_curves",
+            "models",
+            "simulations",
+            "selections",
+            "sampled_simulations",
+        ]:
+            values = getattr(self, key)
+            if values:
+                setattr(self, key, [values[k] for k in indices])
+
+    def _start_workers(self) -> Optional[ObjectiveWorkers]:
+        """Start objective workers, None if residuals are evaluated serially."""
+        if self._workers is not None:
+            return self._workers
+        if multiprocessing.current_process().daemon:
+            logger.warning(
+                f"{self.opid}: objective workers cannot be started in daemonic "
+                f"processes, residuals are evaluated serially."
+            )
+            self.objective_workers = 1
+            return None
+
+        partitions = partition_mappings(
+            self.experiment_keys, self.simulations, self.objective_workers
+        )
+        if len(partitions) < 2:
+            self.objective_workers = 1
+            return None
+        self._workers = ObjectiveWorkers(
+            problem_kwargs=self._init_kwargs,
+            settings=self._init_settings,
+            partitions=partitions,
+            lengths=[len(y_ref) for y_ref in self.y_references],
+        )
+        atexit.register(self.close)
+        return self._workers
+
+    def _discard_terminated_workers(self) -> None:
+        """Terminated workers are restarted by the next evaluation."""
+        if self._workers is not None and not self._workers.alive:
+            self._workers = None
+            atexit.unregister(self.close)
+
+    def close(self) -> None:
+        """Stop the objective workers and persist the memo."""
+        if self.memo is not None:
+            self.memo.save()
+        if self._workers is not None:
+            self._workers.close()
+            self._workers = None
+            atexit.unregister(self.close)
+
+    def residuals(self, xlog: np.ndarray, complete_data=False):
+        """Calculate residuals for given parameter vector.
+
+        Sampled simulations are used in the optimization, the complete
+        timecourses for the complete data. With objective workers the
+        residuals of the optimization are evaluated in parallel. Memoized
+        evaluations are not simulated again.
+        """
+        value = None
+        if self.memo is not None:
+            value = self.memo.get(xlog, complete_data=complete_data)
+
+        if value is None:
+            res = self._evaluate(xlog, complete_data=complete_data)
+            if self.memo is not None:
+                self.memo.put(
+                    xlog,
+                    res if complete_data else split_residuals(
+                        res, [len(y_ref) for y_ref in self.y_references]
+                    ),
+                    complete_data=complete_data,
+                )
+        elif complete_data:
+            res = value
+        else:
+            res = np.concatenate(value)
+            self._trajectory.append(
+                (np.power(10, xlog), 0.5 * np.sum(np.power(res, 2)))
+            )
+
+        if not complete_data:
+            self._last_residuals = (np.array(xlog, dtype=float), res)
+        return res
+
+    def _evaluate(self, xlog: np.ndarray, complete_data=False):
+        """Simulate the residuals, see residuals."""
+        if (
+            self.objective_workers > 1
+            and not complete_data
+            and self._start_workers() is not None
+        ):
+            try:
+                res = self._workers.residuals(xlog)
+            finally:
+                self._discard_terminated_workers()
+            self._trajectory.append(
+                (np.power(10, xlog), 0.5 * np.sum(np.power(res, 2)))
+            )
+        elif not self.output_sampling or complete_data or not self.sampled_simulations:
+            res = super().residuals(xlog, complete_data=complete_data)
+        else:
+            simulations = self.simulations
+            self.simulations = self.sampled_simulations
+            try:
+                res = super().residuals(xlog, complete_data=complete_data)
+            finally:
+                self.simulations = simulations
+        return res
+
+    def _optimize_single(self, x0: np.ndarray = None, algorithm=None, **kwargs):
+        """Run single optimization, see OptimizationProblem._optimize_single.
+
+        Uses the Broyden Jacobian in least square optimizations if selected,
+        least square optimizations run through the fidelities if given.
+        """
+        if algorithm is None:
+            algorithm = OptimizationAlgorithmType.LEAST_SQUARE
+        if self.fidelities and algorithm == OptimizationAlgorithmType.LEAST_SQUARE:
+            result = self._optimize_fidelities(x0=x0, algorithm=algorithm, **kwargs)
+        else:
+            result = self._optimize(x0=x0, algorithm=algorithm, **kwargs)
+        if self.memo is not None:
+            self.memo.save()
+        return result
+
+    def _optimize(self, x0: np.ndarray, algorithm, **kwargs):
+        """Run single optimization with the current fidelity."""
+        if (
+            self.jacobian_type == JacobianType.BROYDEN
+            and algorithm == OptimizationAlgorithmType.LEAST_SQUARE
+        ):
+            kwargs.pop("diff_step", None)
+            kwargs["jac"] = self.jacobian
+            self._jac = None
+        return super()._optimize_single(x0=x0, algorithm=algorithm, **kwargs)
+
+    def _optimize_fidelities(self, x0: np.ndarray, algorithm, **kwargs):
+        """Run single optimization through the fidelity levels.
+
+        Every level starts at the optimum of the previous level. The
+        optimum is evaluated at all levels, the costs are stored in the
+        'fidelities' of the result (see fidelity.fidelity_report).
+        """
+        x = self.x0 if x0 is None else x0
+        trajectory: List = []
+        levels: List[Dict[str, Any]] = []
+        duration = 0.0
+        for k, level in enumerate(self.fidelities):
+            self.set_fidelity(level)
+            if k < len(self.fidelities) - 1:
+                level_kwargs = {**kwargs, "ftol": level.ftol}
+            else:
+                level_kwargs = {"ftol": level.ftol, **kwargs}
+            fit, level_trajectory = self._optimize(
+                x0=x, algorithm=algorithm, **level_kwargs
+            )
+            x = fit.x
+            trajectory.extend(level_trajectory)
+            duration += fit.duration
+            levels.append({
+                "level": k,
+                "relative_tolerance": level.relative_tolerance,
+                "absolute_tolerance": level.absolute_tolerance,
+                "nfev": getattr(fit, "nfev", np.nan),
+                "duration": fit.duration,
+                "cost": fit.cost,
+            })
+            logger.info(
+                f"{self.opid}: fidelity {k} (rtol={level.relative_tolerance}, "
+                f"atol={level.absolute_tolerance}), cost={fit.cost:.6g}, "
+                f"nfev={levels[-1]['nfev']}"
+            )
+
+        # cost of the optimum with all fidelities
+        xlog = np.log10(x)
+        for k, level in enumerate(self.fidelities):
+            self.set_fidelity(level)
+            levels[k]["cost_xopt"] = self.cost_least_square(xlog)
+
+        fit.x0 = self.x0 if x0 is None else x0
+        fit.duration = duration
+        fit.fidelities = levels
+        return fit, trajectory
+
+    def jacobian(self, xlog: np.ndarray) -> np.ndarray:
+        """Jacobian of the residuals in log10 parameter space.
+
+        Forward differences every 'jacobian_refresh' calls, otherwise
+        Broyden's update with the residuals at xlog. The optimizer evaluates
+        the residuals at xlog before requesting the Jacobian, so the
+        residuals are reused.
+        """
+        xlog = np.array(xlog, dtype=float)
+        if self._last_residuals is not None and np.array_equal(
+            self._last_residuals[0], xlog
+        ):
+            f = self._last_residuals[1]
+        else:
+            f = self.residuals(xlog)
+
+        if self._jac is None or self._jac_updates >= self.jacobian_refresh:
+            self._jac = self._jacobian_differences(xlog, f)
+            self._jac_updates = 0
+        else:
+            dx = xlog - self._jac_x
+            dx2 = np.dot(dx, dx)
+            if dx2 > 0:
+                df = f - self._jac_f
+                self._jac = self._jac + np.outer(df - self._jac.dot(dx), dx) / dx2
+            self._jac_updates += 1
+
+        self._jac_x, self._jac_f = xlog, f
+        return self._jac
+
+    def _jacobian_differences(self, xlog: np.ndarray, f: np.ndarray) -> np.ndarray:
+        """Forward differences Jacobian, steps are reversed at upper bounds."""
+        ub = np.log10(self.bounds[1])
+        jac = np.empty((len(f), len(xlog)))
+        for k in range(len(xlog)):
+            h = self.jacobian_step
+            if xlog[k] + h > ub[k]:
+                h = -h
+            xk = xlog.copy()
+            xk[k] += h
+            jac[:, k] = (self.residuals(xk) - f) / h
+        return jac
@@ -1,4 +1,7 @@
-from typing import List, Type, Union
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Type, Union
 
 from pkdb_models.models.sorafenib import (
     DATA_PATHS,
@@ -6,50 +9,190 @@ from pkdb_models.models.sorafenib import (
     SORAFENIB_PATH,
     RESULTS_PATH,
 )
-from sbmlsim.experiment import ExperimentRunner, SimulationExperiment
+from sbmlsim.experiment import SimulationExperiment
+from sbmlsim.plot import Figure
 from sbmlsim.report.experiment_report import ExperimentReport, ReportResults
 from sbmlsim.simulator import SimulatorSerial
 from sbmlutils import log
 from sbmlutils.console import console
 
+from pkdb_models.models.sorafenib.cache import CachedSimulatorSerial
+from pkdb_models.models.sorafenib.dosing import DosingSimulatorSerial
+from pkdb_models.models.sorafenib.experiments.base_experiment import (
+    SorafenibSimulationExperiment,
+)
+from pkdb_models.models.sorafenib.model_pool import PooledExperimentRunner, model_pool
+from pkdb_models.models.sorafenib.results_store import ResultsStore
+
 logger = log.get_logger(__name__)
 
+# settings shared by serial and parallel execution
+runner_kwargs = {
+    "absolute_tolerance": 1e-10,
+    "relative_tolerance": 1e-10,
+}
+run_kwargs = {
+    "show_figures": True,
+    # results are stored in HDF5 stores, see results_store
+    "save_results": True,
+    "figure_formats": ["svg", "png"],
+    "reduced_selections": True,
+}
+
+# simulator of the worker process, model is loaded once per worker
+_worker_simulator: Optional[SimulatorSerial] = None
+
 
 def run_experiments(
         experiment_classes: Union[
             Type[SimulationExperiment], List[Type[SimulationExperiment]]
         ],
         output_dir: str,
+        jobs: int = 1,
+        use_cache: bool = True,
+        compression: Optional[str] = "gzip",
+        prune_results: bool = False,
 ) -> object:
-    """Execute given simulation experiment(s)."""
+    """Execute given simulation experiment(s).
+
+    :param jobs: number of worker processes; experiments are distributed over
+        the workers if jobs > 1, a single experiment renders its figures in
+        parallel.
+    :param use_cache: reuse cached simulation results for unchanged model,
+        simulations and integrator settings.
+    :param compression: compression of the results stores ("gzip", "lzf" or
+        None for memory-mappable series), see ResultsStore.
+    :param prune_results: remove the studies of the store at H5_PATH which
+        are not part of this run (only for runs of all experiments); by
+        default the results of the run are merged into the store.
+    """
     output_path = RESULTS_PATH / output_dir
-    # simulator = SimulatorParallel(model=MODEL_PATH)
-    simulator = SimulatorSerial(model=MODEL_PATH)
-    if isinstance(experiment_classes, SimulationExperiment):
+    if not isinstance(experiment_classes, (list, tuple)):
         experiment_classes = [experiment_classes]
 
-    runner = ExperimentRunner(
+    if jobs > 1 and len(experiment_classes) > 1:
+        report_data = _run_experiments_parallel(
+            experiment_classes=experiment_classes,
+            output_path=output_path,
+            jobs=jobs,
+            use_cache=use_cache,
+            compression=compression,
+        )
+    else:
+        SorafenibSimulationExperiment.figure_jobs = jobs
+        SorafenibSimulationExperiment.results_compression = compression
+        simulator = _create_simulator(use_cache=use_cache)
+        report_data = _run_experiments_serial(
+            experiment_classes=experiment_classes,
+            output_path=output_path,
+            simulator=simulator,
+        )
+
+    report_results = ReportResults()
+    report_results.data = report_data
+
+    # create HTML report
+    report = ExperimentReport(report_results, metadata=None)
+    report.create_report(output_path, report_type=ExperimentReport.ReportType.HTML)
+
+    # collect the results of the experiments in one store, results of other
+    # studies are kept unless the store is pruned
+    if run_kwargs["save_results"]:
+        store_paths = [
+            output_path / cls.__name__ / f"{cls.__name__}.h5"
+            for cls in experiment_classes
+        ]
+        store = ResultsStore()
+        store.merge([p for p in store_paths if p.exists()], replace=prune_results)
+        console.print(f"Results stored in: file://{store.path}", style="info")
+
+    console.print("Successfully executed simulation experiments", style="success")
+
+
+def _run_experiments_serial(
+    experiment_classes: List[Type[SimulationExperiment]],
+    output_path: Path,
+    simulator: SimulatorSerial,
+) -> Dict[str, Dict]:
+    """Execute simulation experiments and return the report data."""
+    runner = PooledExperimentRunner(
         experiment_classes=experiment_classes,
         data_path=DATA_PATHS,
         base_path=SORAFENIB_PATH,
         simulator=simulator,
-        absolute_tolerance=1e-10,
-        relative_tolerance=1e-10,
-    )
-    results = runner.run_experiments(
-        output_path=output_path,
-        show_figures=True,
-        save_results=False,
-        figure_formats=["svg", "png"],
-        reduced_selections=True,
+        **runner_kwargs,
     )
+    results = runner.run_experiments(output_path=output_path, **run_kwargs)
 
     report_results = ReportResults()
     for exp_result in results:
         report_results.add_experiment_result(exp_result=exp_result)
 
-    # create HTML report
-    report = ExperimentReport(report_results, metadata=None)
-    report.create_report(output_path, report_type=ExperimentReport.ReportType.HTML)
+    return report_results.data
 
-    console.print("Successfully executed simulation experiments", style="success")
+
+def _create_simulator(use_cache: bool) -> SimulatorSerial:
+    """Create simulator for the sorafenib model."""
+    model = model_pool.get(MODEL_PATH)
+    if use_cache:
+        return CachedSimulatorSerial(model=model)
+    return DosingSimulatorSerial(model=model)
+
+
+def _init_worker(
+    figure_settings: Dict, use_cache: bool, compression: Optional[str]
+) -> None:
+    """Load the model once per worker and apply the figure and store settings."""
+    global _worker_simulator
+    _worker_simulator = _create_simulator(use_cache=use_cache)
+    for key, value in figure_settings.items():
+        setattr(Figure, key, value)
+    SorafenibSimulationExperiment.results_compression = compression
+
+
+def _run_experiment_worker(
+    experiment_class: Type[SimulationExperiment], output_path: Path
+) -> Dict[str, Dict]:
+    """Execute simulation experiment in worker process."""
+    return _run_experiments_serial(
+        experiment_classes=[experiment_class],
+        output_path=output_path,
+        simulator=_worker_simulator,
+    )
+
+
+def _run_experiments_parallel(
+    experiment_classes: List[Type[SimulationExperiment]],
+    output_path: Path,
+    jobs: int,
+    use_cache: bool,
+    compression: Optional[str],
+) -> Dict[str, Dict]:
+    """Execute simulation experiments in a pool of worker processes.
+
+    The report data is collected in the order of the experiment classes, so
+    the report is identical to the serial execution.
+    """
+    jobs = min(jobs, len(experiment_classes))
+    console.print(f"Running {len(experiment_classes)} experiments on {jobs} workers")
+
+    # class attributes are not inherited by spawned processes
+    figure_settings = {
+        "fig_dpi": Figure.fig_dpi,
+        "legend_fontsize": Figure.legend_fontsize,
+    }
+    with ProcessPoolExecutor(
+        max_workers=jobs,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(figure_settings, use_cache, compression),
+    ) as executor:
+        futures = [
+            executor.submit(_run_experiment_worker, experiment_class, output_path)
+            for experiment_class in experiment_classes
+        ]
+        report_data = {}
+        for future in futures:
+            report_data.update(future.result())
+
+    return report_data
@@ -0,0 +1,110 @@
+"""Process-wide pool of compiled models.
+
+Loading the sorafenib model requires parsing and JIT compiling the flat
+SBML. The pool compiles every model once per process and hands out the
+compiled instance, reset to its initial state, to all experiments,
+simulators and runners.
+
+Compiled models are additionally stored as roadrunner state file next to
+the SBML (e.g. 'sorafenib_body_flat_<sha256>_rr<version>.state'). The file
+is invalidated by the hash of the SBML and the roadrunner version, so new
+processes (experiment and fitting workers) load the model without
+compilation.
+"""
+from pathlib import Path
+from typing import Dict, List, Optional, Type
+
+import roadrunner
+from sbmlsim.experiment import ExperimentRunner, SimulationExperiment
+from sbmlsim.model import AbstractModel, RoadrunnerSBMLModel
+from sbmlsim.units import UnitsInformation
+from sbmlutils.log import get_logger
+
+from pkdb_models.models.sorafenib import MODEL_PATH
+from pkdb_models.models.sorafenib.cache import hash_file
+
+logger = get_logger(__name__)
+
+# model definition shared by all experiments, allows lookup of compiled model
+MODEL = AbstractModel(
+    source=MODEL_PATH,
+    language_type=AbstractModel.LanguageType.SBML,
+    changes={},
+)
+
+
+class PooledRoadrunnerSBMLModel(RoadrunnerSBMLModel):
+    """Roadrunner model with state file invalidated by the SBML hash."""
+
+    # store and load compiled models as state files
+    use_state_file: bool = True
+
+    def get_state_path(self) -> Optional[Path]:
+        """Get path of the state file next to the SBML."""
+        if not self.use_state_file or not self.source.is_path():
+            return None
+        path = Path(self.source.path)
+        sha = hash_file(path)[:16]
+        return path.parent / f"{path.stem}_{sha}_rr{roadrunner.__version__}.state"
+
+    def remove_stale_state_files(self) -> None:
+        """Remove state files of previous versions of the SBML."""
+        if self.state_path is None:
+            return
+        path = Path(self.source.path)
+        for state_path in path.parent.glob(f"{path.stem}_*_rr*.state"):
+            if state_path != self.state_path:
+                logger.debug(f"Remove stale state file: '{state_path}'")
+                state_path.unlink(missing_ok=True)
+
+
+class ModelPool:
+    """Pool of compiled models of the process.
+
+    All models share the unit registry of the pool, so the unit information
+    of pooled models can be combined.
+    """
+
+    def __init__(self):
+        self.ureg = UnitsInformation._default_ureg()
+        self._models: Dict[str, RoadrunnerSBMLModel] = {}
+
+    def get(self, source: Path = MODEL_PATH) -> RoadrunnerSBMLModel:
+        """Get compiled model for SBML, reset to the initial state."""
+        path = Path(source).resolve()
+        key = f"{path}_{hash_file(path)}"
+        model = self._models.get(key)
+        if model is None:
+            model = PooledRoadrunnerSBMLModel(source=path, ureg=self.ureg)
+            model.remove_stale_state_files()
+            self._models[key] = model
+        else:
+            model.r.resetToOrigin()
+        return model
+
+    def clear(self) -> None:
+        """Remove all models from the pool."""
+        self._models.clear()
+
+
+# process-wide pool
+model_pool = ModelPool()
+
+
+class PooledExperimentRunner(ExperimentRunner):
+    """ExperimentRunner using the compiled models of the model pool."""
+
+    def __init__(
+        self,
+        experiment_classes: List[Type[SimulationExperiment]],
+        **kwargs,
+    ):
+        kwargs.setdefault("ureg", model_pool.ureg)
+        super().__init__(experiment_classes=experiment_classes, **kwargs)
+
+    def initialize(self, experiment_classes, **kwargs):
+        """Initialize experiments with the pooled model."""
+        if self.ureg is model_pool.ureg:
+            # experiments resolve the shared model definition to the pooled model
+            self.models[MODEL] = model_pool.get(MODEL_PATH)
+        super().initialize(experiment_classes, **kwargs)
@@ -1,16 +1,23 @@
-"""Sorafenib model factory."""
+"""Sorafenib model factory.
+
+The factory is incremental: every output is only rebuilt if the hash of
+its inputs (definition modules, upstream SBML files) changed. The hashes
+are stored in 'factory_hashes.json' in the output directory. Independent
+tissue models are built in parallel worker processes.
+"""
+import hashlib
+import importlib
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
 from sbmlutils.converters import odefac
 
 from pkdb_models.models.sorafenib import MODEL_BASE_PATH
-from pkdb_models.models.sorafenib.models.model_kidney import model_kidney
-from pkdb_models.models.sorafenib.models.model_liver import model_liver
-from pkdb_models.models.sorafenib.models.model_intestine import model_intestine
-from pkdb_models.models.sorafenib.models.model_body import model_body
-
 
+import sbmlutils
 from sbmlutils.comp import flatten_sbml
 from sbmlutils.console import console
 from sbmlutils.cytoscape import visualize_sbml
@@ -18,10 +25,191 @@ from sbmlutils.factory import create_model
 from pymetadata.omex import *
 
 
+_PACKAGE = "pkdb_models.models.sorafenib.models"
+
+# model definitions (module: model attribute), tissues are independent
+TISSUE_MODELS = {
+    "model_kidney": "model_kidney",
+    "model_liver": "model_liver",
+    "model_intestine": "model_intestine",
+}
+BODY_MODEL = {"model_body": "model_body"}
+
+# modules used by all model definitions
+SHARED_MODULES = ["templates", "annotations"]
+
+HASHES_FILENAME = "factory_hashes.json"
+
+
+def _hash_paths(paths: List[Path], extra: str = "") -> str:
+    """Hash of file contents."""
+    h = hashlib.sha256(extra.encode("utf-8"))
+    for path in paths:
+        h.update(path.name.encode("utf-8"))
+        h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+def _module_path(module: str) -> Path:
+    """Path of module of the model package without importing it."""
+    return Path(__file__).parent / f"{module}.py"
+
+
+def _definition_hash(module: str) -> str:
+    """Hash of model definition module and shared modules."""
+    paths = [_module_path(m) for m in [module] + SHARED_MODULES]
+    return _hash_paths(paths, extra=f"sbmlutils{sbmlutils.__version__}")
+
+
+def _build_model(module: str, attribute: str, model_output_dir: Path) -> Dict[str, Path]:
+    """Create SBML and differential equations of model definition."""
+    model = getattr(importlib.import_module(f"{_PACKAGE}.{module}"), attribute)
+    factory_results = create_model(
+        model=model,
+        filepath=model_output_dir / f"{model.sid}.xml", sbml_level=3, sbml_version=2
+    )
+    sbml_path = factory_results.sbml_path
+
+    # create differential equations
+    md_path = model_output_dir / f"{model.sid}.md"
+    ode_factory = odefac.SBML2ODE.from_file(sbml_file=sbml_path)
+    ode_factory.to_markdown(md_file=md_path)
+
+    return {"sid": model.sid, "sbml": sbml_path, "md": md_path}
+
+
+def _build_flat_model(sbml_path: Path, model_output_dir: Path) -> Dict[str, Path]:
+    """Create flat SBML and differential equations of comp model."""
+    sid = sbml_path.stem
+    sbml_path_flat = model_output_dir / f"{sid}_flat.xml"
+    flatten_sbml(sbml_path, sbml_flat_path=sbml_path_flat)
+
+    # create differential equations
+    md_path = model_output_dir / f"{sid}_flat.md"
+    ode_factory = odefac.SBML2ODE.from_file(sbml_file=sbml_path_flat)
+    ode_factory.to_markdown(md_file=md_path)
+
+    return {"sid": f"{sid}_flat", "sbml": sbml_path_flat, "md": md_path}
+
+
+def _outputs_exist(outputs: Optional[Dict]) -> bool:
+    return outputs is not None and all(
+        Path(outputs[key]).exists() for key in ["sbml", "md"]
+    )
+
+
 def create_models(
-    model_output_dir: Path, create_tissues: bool = True
+    model_output_dir: Path,
+    create_tissues: bool = True,
+    force: bool = False,
+    jobs: int = None,
 ) -> Dict[str, Path]:
-    """Creates tissue and whole-body model."""
+    """Creates tissue and whole-body model.
+
+    :param force: rebuild all outputs, also if the inputs did not change
+    :param jobs: number of worker processes for the tissue models
+        (default: number of tissue models)
+    """
+    hashes_path = model_output_dir / HASHES_FILENAME
+    hashes: Dict[str, Dict] = {}
+    if hashes_path.exists() and not force:
+        with open(hashes_path, "r") as f:
+            hashes = json.load(f)
+
+    def is_current(key: str, input_hash: str) -> bool:
+        info = hashes.get(key)
+        return (
+            info is not None
+            and info["hash"] == input_hash
+            and _outputs_exist(
+                {k: model_output_dir / v for k, v in info["outputs"].items()}
+            )
+        )
+
+    def store(key: str, input_hash: str, outputs: Dict[str, Path], built: bool):
+        hashes[key] = {
+            "hash": input_hash,
+            "outputs": {
+                "sbml": Path(outputs["sbml"]).name,
+                "md": Path(outputs["md"]).name,
+            },
+            "sid": outputs["sid"],
+        }
+        built_outputs[outputs["sid"]] = built
+
+    built_outputs: Dict[str, bool] = {}
+    model_outputs: Dict[str, Dict] = {}
+    if create_tissues:
+        # tissue models are independent and built in parallel
+        for definitions in [TISSUE_MODELS, BODY_MODEL]:
+            pending = {}
+            for module, attribute in definitions.items():
+                input_hash = _definition_hash(module)
+                if is_current(module, input_hash):
+                    info = hashes[module]
+                    console.print(f"{info['sid']}: unchanged, skipped")
+                    outputs = {
+                        "sid": info["sid"],
+                        "sbml": model_output_dir / info["outputs"]["sbml"],
+                        "md": model_output_dir / info["outputs"]["md"],
+                    }
+                    store(module, input_hash, outputs, built=False)
+                    model_outputs[module] = outputs
+                else:
+                    pending[module] = (attribute, input_hash)
+
+            if len(pending) > 1 and (jobs is None or jobs > 1):
+                with ProcessPoolExecutor(
+                    max_workers=min(jobs or len(pending), len(pending)),
+                    mp_context=multiprocessing.get_context("spawn"),
+                ) as executor:
+                    futures = {
+                        module: executor.submit(
+                            _build_model, module, attribute, model_output_dir
+                        )
+                        for module, (attribute, _) in pending.items()
+                    }
+                    built = {module: f.result() for module, f in futures.items()}
+            else:
+                built = {
+                    module: _build_model(module, attribute, model_output_dir)
+                    for module, (attribute, _) in pending.items()
+                }
+
+            for module, outputs in built.items():
+                store(module, pending[module][1], outputs, built=True)
+                model_outputs[module] = outputs
+
+    else:
+        # use existing tissue and body models
+        for module in list(TISSUE_MODELS) + list(BODY_MODEL):
+            info = hashes.get(module)
+            sid = info["sid"] if info else f"sorafenib_{module.split('_', 1)[1]}"
+            model_outputs[module] = {
+                "sid": sid,
+                "sbml": model_output_dir / f"{sid}.xml",
+                "md": model_output_dir / f"{sid}.md",
+            }
+
+    # create whole-body model, depends on body and tissue SBML
+    body_sbml = model_outputs["model_body"]["sbml"]
+    flat_hash = _hash_paths(
+        [model_outputs[module]["sbml"] for module in list(TISSUE_MODELS) + list(BODY_MODEL)],
+        extra=f"sbmlutils{sbmlutils.__version__}",
+    )
+    if is_current("flat", flat_hash):
+        console.print(f"{body_sbml.stem}_flat: unchanged, skipped")
+        outputs = {
+            "sid": hashes["flat"]["sid"],
+            "sbml": model_output_dir / hashes["flat"]["outputs"]["sbml"],
+            "md": model_output_dir / hashes["flat"]["outputs"]["md"],
+        }
+        store("flat", flat_hash, outputs, built=False)
+    else:
+        outputs = _build_flat_model(body_sbml, model_output_dir)
+        store("flat", flat_hash, outputs, built=True)
+    model_outputs["flat"] = outputs
+
     results: Dict[str, Dict[str, Any]] = {
         "README": {
             "path": MODEL_BASE_PATH.parent / "README.md",
@@ -56,74 +244,44 @@ def create_models(
             ),
         },
     }
-    if create_tissues:
-        for model in [
-            model_kidney,
-            model_liver,
-            model_intestine,
-            model_body,
-        ]:
-            factory_results = create_model(
-                model=model,
-                filepath=model_output_dir / f"{model.sid}.xml", sbml_level=3, sbml_version=2
-            )
-            sbml_path = factory_results.sbml_path
-            results[model.sid] = {
-                "path": sbml_path,
-                "entry": ManifestEntry(
-                    location=f"./models/{sbml_path.name}",
-                    format=EntryFormat.SBML_L3V2,
-                    master=False,
-                ),
-            }
-
-            # create differential equations
-            md_path = model_output_dir / f"{model.sid}.md"
-            ode_factory = odefac.SBML2ODE.from_file(sbml_file=sbml_path)
-            ode_factory.to_markdown(md_file=md_path)
-            results[f"{model.sid}_md"] = {
-                "path": md_path,
-                "entry": ManifestEntry(
-                    location=f"./models/{md_path.name}",
-                    format=EntryFormat.MARKDOWN,
-                    master=False,
-                ),
-            }
-
-    # create whole-body model
-    sbml_path = results["sorafenib_body"]["path"]
-    sbml_path_flat = model_output_dir / f"{model_body.sid}_flat.xml"
-    flatten_sbml(sbml_path, sbml_flat_path=sbml_path_flat)
-
-    results["sorafenib_body_flat"] = {
-        "path": sbml_path_flat,
-        "entry": ManifestEntry(
-            location=f"./models/{sbml_path_flat.name}",
-            format=EntryFormat.SBML_L3V2,
-            master=False,
-        ),
-    }
-
-    # create differential equations
-    md_path = model_output_dir / f"{model_body.sid}_flat.md"
-    ode_factory = odefac.SBML2ODE.from_file(sbml_file=sbml_path_flat)
-    ode_factory.to_markdown(md_file=md_path)
-    results[f"{model.sid}_flat_md"] = {
-        "path": md_path,
-        "entry": ManifestEntry(
-            location=f"./models/{md_path.name}",
-            format=EntryFormat.MARKDOWN,
-            master=False,
-        ),
-    }
+    modules = list(TISSUE_MODELS) + list(BODY_MODEL) if create_tissues else []
+    for module in modules + ["flat"]:
+        outputs = model_outputs[module]
+        sid = outputs["sid"]
+        results[sid] = {
+            "path": outputs["sbml"],
+            "entry": ManifestEntry(
+                location=f"./models/{outputs['sbml'].name}",
+                format=EntryFormat.SBML_L3V2,
+                master=False,
+            ),
+            "built": built_outputs[sid],
+        }
+        results[f"{sid}_md"] = {
+            "path": outputs["md"],
+            "entry": ManifestEntry(
+                location=f"./models/{outputs['md'].name}",
+                format=EntryFormat.MARKDOWN,
+                master=False,
+            ),
+            "built": built_outputs[sid],
+        }
 
     # create omex
-    omex = Omex()
-    for info in results.values():
-        omex.add_entry(entry_path=info["path"], entry=info["entry"])
-    omex.to_omex(omex_path=model_output_dir / "sorafenib_model.omex")
+    omex_path = model_output_dir / "sorafenib_model.omex"
+    omex_hash = _hash_paths([info["path"] for info in results.values()])
+    if omex_path.exists() and hashes.get("omex", {}).get("hash") == omex_hash:
+        console.print(f"{omex_path.name}: unchanged, skipped")
+    else:
+        omex = Omex()
+        for info in results.values():
+            omex.add_entry(entry_path=info["path"], entry=info["entry"])
+        omex.to_omex(omex_path=omex_path)
+        console.print(omex.manifest.dict())
+    hashes["omex"] = {"hash": omex_hash}
 
-    console.print(omex.manifest.dict())
+    with open(hashes_path, "w") as f:
+        json.dump(hashes, f, indent=2)
 
     return results
 
@@ -138,7 +296,7 @@ if __name__ == "__main__":
     for k, key in enumerate(results):
         info = results[key]
         path: Path = info["path"]
-        if path.suffix != ".xml":
+        if path.suffix != ".xml" or not info.get("built", True):
             continue
 
         console.print(path)
@@ -0,0 +1,280 @@
+"""Population simulations of virtual patient cohorts.
+
+Virtual patients are sampled from covariate distributions (anthropometry,
+cardiac output, cirrhosis and renal function). The cohort is simulated in
+batches of patients distributed over worker processes. Every batch writes
+its timecourses and pharmacokinetic parameters as separate parquet files,
+i.e. results are streamed to disk and never collected in memory.
+
+Results are stored in <output_path>:
+
+    population.parquet       covariates of the patients
+    timecourses/part-*.parquet   timecourses (patient, time, selections)
+    pk/part-*.parquet        pharmacokinetic parameters per patient
+    metadata.json            schedule, units and settings
+
+Partitioned parquet files can be read lazily, e.g. with
+`pd.read_parquet(output_path / "pk")`.
+"""
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sbmlsim.simulator import SimulatorSerial
+from sbmlutils.console import console
+from sbmlutils.log import get_logger
+
+from pkdb_models.models.sorafenib import MODEL_PATH, RESULTS_PATH_POPULATION
+from pkdb_models.models.sorafenib.dosing import (
+    DosingSchedule,
+    DosingSimulatorSerial,
+    DosingTimecourseSim,
+)
+from pkdb_models.models.sorafenib.experiments.base_experiment import (
+    SorafenibSimulationExperiment,
+)
+from pkdb_models.models.sorafenib.helpers import runner_kwargs
+from pkdb_models.models.sorafenib.model_pool import model_pool
+from pkdb_models.models.sorafenib.sorafenib_pk import nca
+
+logger = get_logger(__name__)
+
+# covariates with units in the model
+COVARIATES: Dict[str, str] = {
+    "BW": "kg",
+    "HEIGHT": "cm",
+    "HR": "1/min",
+    "COBW": "ml/s/kg",
+    "f_cirrhosis": "dimensionless",
+    "KI__f_renal_function": "dimensionless",
+}
+
+# outputs stored for every patient
+SELECTIONS: List[str] = [
+    "time",
+    "[Cve_sor]",
+    "[Cve_m2]",
+    "[Cve_sg]",
+]
+
+# simulator of the worker process, model is loaded once per worker
+_worker_simulator: Optional[SimulatorSerial] = None
+
+
+def sample_population(
+    n: int,
+    seed: Optional[int] = None,
+    cirrhosis_fractions: Optional[Dict[str, float]] = None,
+    renal_fractions: Optional[Dict[str, float]] = None,
+) -> pd.DataFrame:
+    """Sample covariates of n virtual patients.
+
+    Height and body mass index are sampled independently, the body weight
+    follows from both. Cirrhosis and renal impairment are sampled from the
+    categories of SorafenibSimulationExperiment.
+
+    :param n: number of patients
+    :param seed: seed of the random number generator
+    :param cirrhosis_fractions: fraction of patients per cirrhosis category,
+        default only controls
+    :param renal_fractions: fraction of patients per renal function category,
+        default only normal renal function
+    :return: DataFrame with patient index and covariates in model units
+    """
+    rng = np.random.default_rng(seed)
+
+    height = np.clip(rng.normal(170, 9, size=n), 145, 200)  # [cm]
+    bmi = np.clip(rng.lognormal(np.log(25), 0.15, size=n), 16, 45)  # [kg/m^2]
+    bw = bmi * (height / 100) ** 2  # [kg]
+
+    df = pd.DataFrame({
+        "patient": np.arange(n),
+        "BW": bw,
+        "HEIGHT": height,
+        "HR": np.clip(rng.normal(70, 10, size=n), 45, 110),  # [1/min]
+        "COBW": np.clip(rng.normal(1.548, 0.2, size=n), 1.0, 2.2),  # [ml/s/kg]
+        "f_cirrhosis": _sample_categories(
+            rng, n,
+            values=SorafenibSimulationExperiment.cirrhosis_map,
+            fractions=cirrhosis_fractions or {"Control": 1.0},
+        ),
+        "KI__f_renal_function": _sample_categories(
+            rng, n,
+            values=SorafenibSimulationExperiment.renal_map,
+            fractions=renal_fractions or {"Normal renal function": 1.0},
+        ),
+    })
+    return df
+
+
+def _sample_categories(
+    rng: np.random.Generator,
+    n: int,
+    values: Dict[str, float],
+    fractions: Dict[str, float],
+) -> np.ndarray:
+    """Sample parameter values of categories with given fractions."""
+    for key in fractions:
+        if key not in values:
+            raise ValueError(f"Unknown category '{key}', use one of {list(values)}")
+    keys = list(fractions)
+    p = np.array([fractions[key] for key in keys], dtype=float)
+    idx = rng.choice(len(keys), size=n, p=p / p.sum())
+    return np.array([values[key] for key in keys])[idx]
+
+
+def simulate_population(
+    population: pd.DataFrame,
+    schedule: DosingSchedule,
+    end: float,
+    steps: int,
+    output_path: Path,
+    pk_window: Optional[Tuple[float, float]] = None,
+    batch_size: int = 250,
+    jobs: int = 1,
+) -> Path:
+    """Simulate dosing schedule for all patients of population.
+
+    :param population: covariates, see sample_population
+    :param schedule: dosing schedule
+    :param end: end time of simulation [min]
+    :param steps: number of output steps
+    :param output_path: directory for the results
+    :param pk_window: time window [min] for the pharmacokinetic parameters,
+        e.g. the last dosing interval; default complete timecourse
+    :param batch_size: number of patients per batch
+    :param jobs: number of worker processes
+    :return: output_path
+    """
+    output_path = Path(output_path)
+    for subdir in ["timecourses", "pk"]:
+        (output_path / subdir).mkdir(parents=True, exist_ok=True)
+        for path in (output_path / subdir).glob("part-*.parquet"):
+            path.unlink()
+    population.to_parquet(output_path / "population.parquet", index=False)
+
+    batches = [
+        population.iloc[k:k + batch_size]
+        for k in range(0, len(population), batch_size)
+    ]
+    tasks = [
+        (k, batch, schedule, end, steps, output_path, pk_window)
+        for k, batch in enumerate(batches)
+    ]
+    console.print(
+        f"Simulating {len(population)} patients in {len(batches)} batches "
+        f"on {jobs} workers"
+    )
+    if jobs > 1 and len(batches) > 1:
+        with ProcessPoolExecutor(
+            max_workers=min(jobs, len(batches)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        ) as executor:
+            units = list(executor.map(_simulate_batch_worker, tasks))[0]
+    else:
+        _init_worker()
+        units = [_simulate_batch_worker(task) for task in tasks][0]
+
+    metadata = {
+        "n_patients": len(population),
+        "schedule": {
+            "times": list(schedule.times),
+            "doses": [str(dose) for dose in schedule.doses],
+            "missed": list(schedule.missed),
+        },
+        "end": end,
+        "steps": steps,
+        "pk_window": pk_window,
+        "covariate_units": COVARIATES,
+        "units": units,
+    }
+    with open(output_path / "metadata.json", "w") as f:
+        json.dump(metadata, f, indent=2)
+
+    console.print(f"Population results: file://{output_path}", style="success")
+    return output_path
+
+
+def _init_worker() -> None:
+    """Load the model once per worker."""
+    global _worker_simulator
+    if _worker_simulator is None:
+        # population results are not cached, these would fill the result cache
+        _worker_simulator = DosingSimulatorSerial(
+            model=model_pool.get(MODEL_PATH), **runner_kwargs
+        )
+        _worker_simulator.set_timecourse_selections(SELECTIONS)
+
+
+def _simulate_batch_worker(task: Tuple) -> Dict[str, str]:
+    """Simulate batch of patients and write results.
+
+    :return: units of the selections
+    """
+    k, batch, schedule, end, steps, output_path, pk_window = task
+    simulator = _worker_simulator
+    Q_ = simulator.Q_
+
+    changes = SorafenibSimulationExperiment._default_changes(Q_=Q_)
+    dfs = []
+    for _, patient in batch.iterrows():
+        simulation = DosingTimecourseSim(
+            schedule=schedule,
+            start=0,
+            end=end,
+            steps=steps,
+            changes={
+                **changes,
+                **{
+                    sid: Q_(float(patient[sid]), unit)
+                    for sid, unit in COVARIATES.items()
+                },
+            },
+        )
+        dfs.append(simulator.run_timecourse(simulation).to_dataframe())
+
+    # timecourses in long format
+    patients = batch["patient"].values
+    df_tc = pd.concat(dfs, ignore_index=True)
+    df_tc.insert(0, "patient", np.repeat(patients, [len(df) for df in dfs]))
+    df_tc.to_parquet(output_path / "timecourses" / f"part-{k:05d}.parquet", index=False)
+
+    # pharmacokinetics of all patients of the batch
+    t = dfs[0]["time"].values
+    c = np.vstack([df["[Cve_sor]"].values for df in dfs])
+    if pk_window is not None:
+        mask = (t >= pk_window[0]) & (t <= pk_window[1])
+        t = t[mask] - pk_window[0]
+        c = c[:, mask]
+    pk = nca(t=t, c=c)
+    df_pk = pd.DataFrame({"patient": patients})
+    for key in ["auc", "aucinf", "cmax", "tmax", "kel", "thalf"]:
+        df_pk[key] = pk[key]
+    df_pk["cmin"] = np.nanmin(c, axis=1)
+    df_pk.to_parquet(output_path / "pk" / f"part-{k:05d}.parquet", index=False)
+
+    return {sid: str(simulator.uinfo[sid]) for sid in SELECTIONS}
+
+
+if __name__ == "__main__":
+    # 400 mg b.i.d. for 14 days, pharmacokinetics of the last interval
+    # doses in the unit registry shared by the pooled models and simulators
+    Q_ = model_pool.ureg.Quantity
+    n_doses = 28
+    interval = 12 * 60  # [min]
+    simulate_population(
+        population=sample_population(n=10000, seed=1234),
+        schedule=DosingSchedule.regular(
+            dose=Q_(400, "mg"), interval=interval, n_doses=n_doses
+        ),
+        end=n_doses * interval,
+        steps=n_doses * 24,
+        output_path=RESULTS_PATH_POPULATION / "sor_po400_bid",
+        pk_window=((n_doses - 1) * interval, n_doses * interval),
+        jobs=multiprocessing.cpu_count(),
+    )
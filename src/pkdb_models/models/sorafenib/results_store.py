@@ -0,0 +1,214 @@
+"""HDF5 store of simulation results.
+
+All timecourses, datasets and pharmacokinetic tables of the simulation
+experiments are stored in a single HDF5 file with the layout
+
+    /<study>/tasks/<task>/<observable>     simulation results (time, dims...)
+    /<study>/datasets/<dataset>/<column>   digitized data
+    /<study>/pk/<key>/<column>             pharmacokinetic parameters
+
+i.e. the groups are the study/task/observable index. Every series is a
+separate HDF5 dataset with 'units' (and 'dims') attributes, so single series
+are read without parsing the complete results. Series are chunked and
+compressed by default; stores written with compression=None are stored
+contiguous and can be memory-mapped (see ResultsStore.memmap).
+
+Experiments write their own store (no concurrent writes from worker
+processes), the stores of a run are merged into the store at H5_PATH. Results
+of other studies are kept; the store is only pruned to the studies of a run
+when all experiments are run.
+"""
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import h5py
+import numpy as np
+import pandas as pd
+from sbmlutils.log import get_logger
+
+from pkdb_models.models import sorafenib
+
+logger = get_logger(__name__)
+
+KINDS = ["tasks", "datasets", "pk"]
+
+
+class ResultsStore:
+    """HDF5 store of simulation results.
+
+    :param path: path of the HDF5 file, H5_PATH by default (read at creation,
+        so custom results paths are respected)
+    :param compression: compression filter of the series ("gzip", "lzf" or
+        None for contiguous, memory-mappable series)
+    """
+
+    def __init__(self, path: Optional[Path] = None, compression: Optional[str] = "gzip"):
+        self.path = Path(path) if path is not None else Path(sorafenib.H5_PATH)
+        self.compression = compression
+
+    # --- write ---------------------------------------------------------------
+    def write_experiment(
+        self,
+        study: str,
+        results: Dict = None,
+        datasets: Dict[str, pd.DataFrame] = None,
+        pk: Dict[str, pd.DataFrame] = None,
+    ) -> None:
+        """Write results of simulation experiment, replaces existing results.
+
+        :param study: sid of the experiment
+        :param results: XResults of the tasks
+        :param datasets: datasets of the experiment
+        :param pk: pharmacokinetic parameters
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with h5py.File(self.path, "a") as f:
+            if study in f:
+                del f[study]
+            group = f.create_group(study)
+            for task_key, xres in (results or {}).items():
+                self._write_xresult(group.create_group(f"tasks/{_escape(task_key)}"), xres)
+            for kind, dfs in [("datasets", datasets), ("pk", pk)]:
+                for key, df in (dfs or {}).items():
+                    self._write_dataframe(group.create_group(f"{kind}/{_escape(key)}"), df)
+
+    def _write_series(self, group: h5py.Group, name: str, data: np.ndarray):
+        data = np.asarray(data)
+        if data.dtype == object:
+            return group.create_dataset(
+                name, data=data.astype(str).astype(h5py.string_dtype())
+            )
+        if self.compression is None or data.size == 0:
+            return group.create_dataset(name, data=data)
+        return group.create_dataset(
+            name,
+            data=data,
+            chunks=True,
+            compression=self.compression,
+            shuffle=True,
+        )
+
+    def _write_xresult(self, group: h5py.Group, xres) -> None:
+        """Write all observables of XResult."""
+        for key in xres.xds.data_vars:
+            da = xres.xds[key]
+            dset = self._write_series(group, _escape(key), da.values)
+            dset.attrs["sid"] = key
+            dset.attrs["dims"] = json.dumps(list(da.dims))
+            if xres.uinfo is not None and key in xres.uinfo:
+                dset.attrs["units"] = str(xres.uinfo[key])
+
+    def _write_dataframe(self, group: h5py.Group, df: pd.DataFrame) -> None:
+        """Write columns of DataFrame."""
+        udict = getattr(df, "udict", None) or {}
+        group.attrs["columns"] = json.dumps([str(c) for c in df.columns])
+        for column in df.columns:
+            dset = self._write_series(group, _escape(str(column)), df[column].values)
+            dset.attrs["sid"] = str(column)
+            if column in udict:
+                dset.attrs["units"] = str(udict[column])
+
+    def merge(self, paths: Iterable[Path], replace: bool = False) -> None:
+        """Copy the studies of other stores into the store.
+
+        Studies are copied as stored (no recompression) and replace existing
+        results of the studies. With replace the store only contains the
+        studies of the given stores; it is written to a temporary file and
+        moved in place, i.e. readers never see a partially written store.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if not replace:
+            self._copy_studies(self.path, paths, mode="a")
+            return
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, suffix=".h5.tmp")
+        os.close(fd)
+        try:
+            self._copy_studies(Path(tmp_path), paths, mode="w")
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            Path(tmp_path).unlink(missing_ok=True)
+            raise
+
+    def _copy_studies(self, path: Path, paths: Iterable[Path], mode: str) -> None:
+        with h5py.File(path, mode) as f:
+            for src_path in paths:
+                with h5py.File(src_path, "r") as f_src:
+                    for study in f_src:
+                        if study in f:
+                            del f[study]
+                        f_src.copy(f_src[study], f, name=study)
+                logger.debug(f"Merged '{src_path}' into '{self.path}'")
+
+    # --- read ----------------------------------------------------------------
+    def index(self) -> pd.DataFrame:
+        """Index of all series (study, kind, key, sid, shape, units)."""
+        rows: List[Dict] = []
+        with h5py.File(self.path, "r") as f:
+            for study, group in f.items():
+                for kind in KINDS:
+                    if kind not in group:
+                        continue
+                    for key, subgroup in group[kind].items():
+                        for dset in subgroup.values():
+                            rows.append({
+                                "study": study,
+                                "kind": kind,
+                                "key": key,
+                                "sid": dset.attrs.get("sid", dset.name),
+                                "shape": dset.shape,
+                                "units": dset.attrs.get("units"),
+                            })
+        return pd.DataFrame(
+            rows, columns=["study", "kind", "key", "sid", "shape", "units"]
+        )
+
+    def read(
+        self,
+        study: str,
+        key: str,
+        sid: str,
+        kind: str = "tasks",
+        selection=(),
+    ) -> np.ndarray:
+        """Read series, only the chunks of the selection are read.
+
+        :param selection: numpy selection, e.g. np.s_[:, 0] for the first scan
+        """
+        with h5py.File(self.path, "r") as f:
+            dset = f[study][kind][_escape(key)][_escape(sid)]
+            return dset[selection]
+
+    def read_dataframe(self, study: str, key: str, kind: str = "datasets") -> pd.DataFrame:
+        """Read dataset or pharmacokinetic table as DataFrame."""
+        with h5py.File(self.path, "r") as f:
+            group = f[study][kind][_escape(key)]
+            data = {}
+            for column in json.loads(group.attrs["columns"]):
+                dset = group[_escape(column)]
+                values = dset[()]
+                if h5py.check_string_dtype(dset.dtype):
+                    values = dset.asstr()[()]
+                data[column] = values
+        return pd.DataFrame(data)
+
+    def memmap(self, study: str, key: str, sid: str, kind: str = "tasks") -> np.memmap:
+        """Memory-map series of store written without compression."""
+        with h5py.File(self.path, "r") as f:
+            dset = f[study][kind][_escape(key)][_escape(sid)]
+            offset = dset.id.get_offset()
+            if dset.chunks is not None or offset is None:
+                raise ValueError(
+                    f"Series '{dset.name}' is chunked and cannot be memory-mapped, "
+                    f"write the store with 'compression=None'."
+                )
+            dtype, shape = dset.dtype, dset.shape
+        return np.memmap(self.path, mode="r", dtype=dtype, shape=shape, offset=offset)
+
+
+def _escape(name: str) -> str:
+    """HDF5 name of series, '/' separates groups."""
+    return name.replace("/", "|")
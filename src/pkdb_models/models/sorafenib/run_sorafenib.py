@@ -7,7 +7,11 @@ from enum import Enum
 import optparse
 from pathlib import Path
 from pkdb_models.models.sorafenib import SORAFENIB_PATH
-from pkdb_models.models.sorafenib.simulations import run_simulation_experiments, EXPERIMENTS
+from pkdb_models.models.sorafenib.experiments.registry import (
+    EXPERIMENT_GROUPS,
+    load_experiment,
+    resolve_experiment_names,
+)
 from sbmlutils.console import console
 
 FACTORY_SCRIPT_PATH = SORAFENIB_PATH / "models" / "factory.py"
@@ -30,6 +34,7 @@ def _setup_custom_results_paths(results_dir: str):
     # Override the module paths
     sorafenib.RESULTS_PATH = custom_path
     sorafenib.RESULTS_PATH_SIMULATION = custom_path / "simulation"
+    sorafenib.H5_PATH = custom_path / "pkdb.h5"
     console.print(f"Figure output directory set to: [cyan]{custom_path}[/cyan]")
     return custom_path
 
@@ -56,14 +61,14 @@ def _list_available_experiments():
     """Display all available experiment groups and individual experiments."""
     console.rule("[bold cyan]Available Simulation Experiments[/bold cyan]", style="cyan")
     console.print("\n[bold]You can use these group names:[/bold]")
-    console.print(f"  {', '.join([g for g in EXPERIMENTS.keys()])}")
+    console.print(f"  {', '.join([g for g in EXPERIMENT_GROUPS.keys()])}")
     console.print("\n[bold]Or these individual experiment names:[/bold]")
 
     for group_name in ["studies", "misc", "scan"]:
-        if group_name in EXPERIMENTS and EXPERIMENTS[group_name]:
+        if group_name in EXPERIMENT_GROUPS and EXPERIMENT_GROUPS[group_name]:
             console.print(f"\n[yellow]{group_name}:[/yellow]")
-            for exp in EXPERIMENTS[group_name]:
-                console.print(f"  {exp.__name__}")
+            for exp_name in EXPERIMENT_GROUPS[group_name]:
+                console.print(f"  {exp_name}")
 
     console.print("\n[dim]Use '--experiments' with comma-separated names to run specific experiments.[/dim]")
     console.print('[dim]Example: run_sorafenib --action simulate --experiments "misc,LaCreta2016"[/dim]')
@@ -72,26 +77,8 @@ def _list_available_experiments():
 
 def _resolve_experiment_names(experiment_names: list) -> tuple:
     """Resolve experiment names to experiment classes."""
-    # Build dictionary of all available experiments by name
-    all_available_exp = {}
-    for category, exp_list in EXPERIMENTS.items():
-        if category != "all":
-            for exp in exp_list:
-                all_available_exp[exp.__name__] = exp
-
-    # Validate and collect requested experiments
-    experiment_classes = []
-    not_found = []
-
-    for exp_name in experiment_names:
-        # Check if it's a group name
-        if exp_name in EXPERIMENTS:
-            experiment_classes.extend(EXPERIMENTS[exp_name])
-        # Check if it's an individual experiment
-        elif exp_name in all_available_exp:
-            experiment_classes.append(all_available_exp[exp_name])
-        else:
-            not_found.append(exp_name)
+    names, not_found = resolve_experiment_names(experiment_names)
+    experiment_classes = [load_experiment(name) for name in names]
 
     return experiment_classes, not_found
 
@@ -114,6 +101,28 @@ def main() -> None:
         help="Comma-separated list of simulation experiments and/or groups (for '--action simulate'). "
              "Use '--action list_experiments' to see all available options.",
     )
+    parser.add_option(
+        "-j", "--jobs",
+        dest="jobs",
+        type="int",
+        default=1,
+        help="Optional: Number of worker processes for the simulation experiments (default: 1)",
+    )
+    parser.add_option(
+        "--no-cache",
+        dest="use_cache",
+        action="store_false",
+        default=True,
+        help="Optional: Do not reuse cached simulation results",
+    )
+    parser.add_option(
+        "--uncompressed",
+        dest="compression",
+        action="store_const",
+        const=None,
+        default="gzip",
+        help="Optional: Store results uncompressed, i.e. memory-mappable (default: gzip)",
+    )
 
     console.rule("[bold cyan]SORAFENIB PBPK MODEL[/bold cyan]", style="cyan")
 
@@ -128,6 +137,9 @@ def main() -> None:
     if not options.action:
         _parser_message("Required argument '--action' is missing.")
 
+    if options.jobs < 1:
+        _parser_message(f"Invalid number of jobs '{options.jobs}', must be >= 1.")
+
     try:
         action = Action(options.action.lower())
     except ValueError:
@@ -173,17 +185,31 @@ def main() -> None:
             console.rule(style="red bold")
             return
 
-        # Run the experiments
+        # Run the experiments (imported here for fast startup of the other actions)
+        from pkdb_models.models.sorafenib.simulations import run_simulation_experiments
         results_path = _get_current_results_path()
         console.rule("[bold cyan]Running Simulations[/bold cyan]", style="cyan")
-        run_simulation_experiments(experiment_classes=experiment_classes)
+        run_simulation_experiments(
+            experiment_classes=experiment_classes,
+            jobs=options.jobs,
+            use_cache=options.use_cache,
+            compression=options.compression,
+            # stale studies are only removed from the store for all experiments
+            prune_results="all" in exp_list,
+        )
         console.print("[bold green]Simulations finished.[/bold green]")
         console.print(f"[bold green]Results saved to: {results_path / 'simulation'}[/bold green]")
 
     elif action == Action.ALL:
         console.rule("[bold cyan]Running: Factory and all simulations.[/bold cyan]", style="cyan")
         _run_factory()
-        run_simulation_experiments(selected="all")
+        from pkdb_models.models.sorafenib.simulations import run_simulation_experiments
+        run_simulation_experiments(
+            selected="all",
+            jobs=options.jobs,
+            use_cache=options.use_cache,
+            compression=options.compression,
+        )
         console.print("\n[bold green]All scripts completed successfully![/bold green]")
 
     console.rule(style="white")
@@ -212,6 +238,12 @@ if __name__ == "__main__":
        Run all experiments:
        $ run_sorafenib --action simulate --experiments all
 
+       Run all experiments on 8 worker processes:
+       $ run_sorafenib --action simulate --experiments all --jobs 8
+
+       Run all experiments without cached simulation results:
+       $ run_sorafenib --action simulate --experiments all --no-cache
+
     5. Run Everything:
        Runs factory and all simulations.
        $ run_sorafenib --action all
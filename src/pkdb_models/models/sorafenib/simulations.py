@@ -1,13 +1,15 @@
 """Run sorafenib simulation experiments."""
-import shutil
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 from pymetadata.console import console
 
 from pkdb_models.models import sorafenib
-from pkdb_models.models.sorafenib.experiments.misc import *
-from pkdb_models.models.sorafenib.experiments.studies import *
+from pkdb_models.models.sorafenib import figure_collection
+from pkdb_models.models.sorafenib.experiments.registry import (
+    EXPERIMENT_GROUPS,
+    load_group,
+)
 from pkdb_models.models.sorafenib.helpers import run_experiments
 
 from sbmlutils import log
@@ -18,40 +20,25 @@ Figure.fig_dpi = 300
 
 logger = log.get_logger(__name__)
 
-EXPERIMENTS = \
-    {
-        'studies': [
-            Aboualfa2006,
-            Andriamanana2013,
-            Awada2005,
-            Bins2017,
-            Duran2007,
-            # Ferrario2016,
-            Fucile2015,
-            Fukudo2014,
-            Hornecker2012,
-            Huang2017,
-            Huh2021,
-            Hussaarts2020,
-            Ishii2014,
-            Mammatas2020,
-            Strumberg2005,
-            Zimmerman2012,  # children
-        ],
-        'misc': [
-            DoseDependencyExperiment,
-            HepaticImpairmentExperiment,
-            RenalImpairmentExperiment,
-        ]
-    }
-EXPERIMENTS["all"] = EXPERIMENTS["studies"] + EXPERIMENTS["misc"]
 
 def run_simulation_experiments(
     selected: str = None,
     experiment_classes: List = None,
-    output_dir: Path = None
+    output_dir: Path = None,
+    jobs: int = 1,
+    use_cache: bool = True,
+    compression: Optional[str] = "gzip",
+    prune_results: Optional[bool] = None,
 ) -> None:
-    """Run sorafenib simulation experiments."""
+    """Run sorafenib simulation experiments.
+
+    :param jobs: number of worker processes for the simulation experiments
+    :param use_cache: reuse cached simulation results
+    :param compression: compression of the HDF5 results stores (None for
+        memory-mappable series)
+    :param prune_results: remove studies not part of this run from the results
+        store, by default only for selected='all'
+    """
 
     Figure.fig_dpi = 600
     Figure.legend_fontsize = 10
@@ -63,14 +50,14 @@ def run_simulation_experiments(
             output_dir = sorafenib.RESULTS_PATH_SIMULATION / "custom_selection"
     elif selected:
         # Using the 'selected' parameter
-        if selected not in EXPERIMENTS:
+        if selected not in EXPERIMENT_GROUPS:
             console.rule(style="red bold")
             console.print(
-                f"[red]Error: Unknown group '{selected}'. Valid groups: {', '.join(EXPERIMENTS.keys())}[/red]"
+                f"[red]Error: Unknown group '{selected}'. Valid groups: {', '.join(EXPERIMENT_GROUPS.keys())}[/red]"
             )
             console.rule(style="red bold")
             return
-        experiments_to_run = EXPERIMENTS[selected]
+        experiments_to_run = load_group(selected)
         if output_dir is None:
             output_dir = sorafenib.RESULTS_PATH_SIMULATION / selected
     else:
@@ -78,20 +65,24 @@ def run_simulation_experiments(
         console.print("[yellow]Use selected='all' or selected='studies' or provide experiment_classes=[...][/yellow]\n")
         return
 
+    if prune_results is None:
+        prune_results = experiment_classes is None and selected == "all"
+
     # Run the experiments
-    run_experiments(experiment_classes=experiments_to_run, output_dir=output_dir)
+    run_experiments(
+        experiment_classes=experiments_to_run,
+        output_dir=output_dir,
+        jobs=jobs,
+        use_cache=use_cache,
+        compression=compression,
+        prune_results=prune_results,
+    )
 
-    # Collect figures into one folder
-    figures_dir = output_dir / "_figures"
-    figures_dir.mkdir(parents=True, exist_ok=True)
-    for f in output_dir.glob("**/*.png"):
-        if f.parent == figures_dir:
-            continue
-        try:
-            shutil.copy2(f, figures_dir / f.name)
-        except Exception as err:
-            print(f"file {f.name} in {f.parent} fails, skipping. Error: {err}")
-    console.print(f"Figures copied to: file://{figures_dir}", style="info")
+    # Figures are collected while saving, combine the manifests
+    figures_dir = output_dir / figure_collection.FIGURES_DIR
+    if figures_dir.exists():
+        manifest_path = figure_collection.write_manifest(figures_dir)
+        console.print(f"Figures collected in: file://{manifest_path}", style="info")
 
 if __name__ == "__main__":
     """
@@ -1,9 +1,15 @@
-"""Sorafenib pharmacokinetics."""
+"""Sorafenib pharmacokinetics.
+
+Non-compartmental analysis (NCA) for all points of a scan at once. The
+calculation follows pkdb_analysis.pk.pharmacokinetics.TimecoursePK, but
+operates on the complete (scan, time) array instead of single timecourses.
+"""
+from typing import Tuple
+
+import numpy as np
 import pandas as pd
 
-from pkdb_analysis.pk.pharmacokinetics import TimecoursePK
 from sbmlsim.result import XResult
-from sbmlutils.console import console
 from sbmlutils.log import get_logger
 
 logger = get_logger(__name__)
@@ -23,7 +29,6 @@ def calculate_sorafenib_pk(
         da = xres.sel(_time=slice(tstart, tend))
         da = da.assign_coords(_time=da._time-tstart)
         da["time"] = da["time"] - tstart
-        # console.print(da)
 
         xdata = XResult(
             xdataset=da,
@@ -37,28 +42,152 @@ def calculate_sorafenib_pk(
     Q_ = experiment.Q_
 
     # reads the initial dose from the results
-    print(xdata)
-    print(xdata.keys())
     dose_vec = Q_(xdata["PODOSE_sor"].values[0], xdata.uinfo["PODOSE_sor"])
+    dose = (dose_vec / experiment.Mr.sor).to("mmole")
+
+    t_unit = xdata.uinfo["time"]
+    c_unit = xdata.uinfo["[Cve_sor]"]
+    t = xdata.dim_mean("time").magnitude
+    c = xdata["[Cve_sor]"].transpose(scandim, "_time").values
+
+    pk = nca(t=t, c=c)
+
+    # units of all parameters
+    units = {
+        "auc": (Q_(1, c_unit) * Q_(1, t_unit)).units,
+        "aucinf": (Q_(1, c_unit) * Q_(1, t_unit)).units,
+        "tmax": Q_(1, t_unit).units,
+        "cmax": Q_(1, c_unit).units,
+        "kel": (1 / Q_(1, t_unit)).units,
+        "thalf": Q_(1, t_unit).units,
+    }
+
+    df = pd.DataFrame({"compound": "sorafenib"}, index=range(c.shape[0]))
+    for key, unit in units.items():
+        df[key] = pk[key]
+        df[f"{key}_unit"] = str(unit)
+
+    # dose dependent parameters
+    aucinf = Q_(pk["aucinf"], units["aucinf"])
+    kel = Q_(pk["kel"], units["kel"])
+    dose_dependent = {
+        "dose": dose,
+        "vd": (dose / (aucinf * kel)).to("l"),
+        "cl": (dose / aucinf).to("l/min"),
+    }
+    for key, q in dose_dependent.items():
+        df[key] = np.broadcast_to(q.magnitude, pk["aucinf"].shape)
+        df[f"{key}_unit"] = str(q.units)
 
-    # calculate all pharmacokinetics
-    pk_dicts = list()
-    for k_dose, dose in enumerate(dose_vec):
+    df["slope"] = pk["slope"]
+    df["intercept"] = pk["intercept"]
+    df["max_idx"] = pk["max_idx"]
 
-        t_vec: Q_ = xdata.dim_mean("time")
-        t_vec = Q_(t_vec.magnitude, xdata.uinfo["time"])
-        c_vec = Q_(
-            xdata["[Cve_sor]"].sel({scandim: k_dose}).values, xdata.uinfo["[Cve_sor]"]
+    return df
+
+
+def nca(t: np.ndarray, c: np.ndarray, min_threshold: float = 1e8) -> dict:
+    """Non-compartmental analysis of timecourses.
+
+    :param t: time vector (n_time)
+    :param c: concentrations (n_scan, n_time)
+    :param min_threshold: concentrations smaller than cmax/min_threshold are
+        ignored (numerical noise), as in TimecoursePK
+    :return: dictionary of parameter vectors (n_scan)
+    """
+    t = np.asarray(t, dtype=float)
+    c = np.array(c, dtype=float, ndmin=2)
+    n_scan, n_time = c.shape
+
+    # ignore numerical noise, only for timecourses with tiny values
+    with np.errstate(invalid="ignore"):
+        cmax_all = np.nanmax(np.where(np.isnan(c), -np.inf, c), axis=1)
+        cmin_nonzero = np.nanmin(
+            np.where((c != 0) & ~np.isnan(c), c, np.inf), axis=1
         )
-        dose = dose_vec[k_dose]
-        dose_mmole = dose / experiment.Mr.sor
-        tcpk = TimecoursePK(
-            time=t_vec,
-            concentration=c_vec,
-            substance="sorafenib",
-            dose=dose_mmole,
-            ureg=experiment.ureg,
+        tiny = (min_threshold * cmin_nonzero < cmax_all)[:, np.newaxis] & (
+            c * min_threshold < cmax_all[:, np.newaxis]
         )
-        pk_dicts.append(tcpk.pk.to_dict())
+    c = np.where(tiny, np.nan, c)
+    valid = ~np.isnan(c)
+    has_data = valid.any(axis=1)
+
+    auc = _auc(t, c, valid)
+
+    # maximum
+    max_idx = np.argmax(np.where(valid, c, -np.inf), axis=1)
+    rows = np.arange(n_scan)
+    cmax = np.where(has_data, c[rows, max_idx], np.nan)
+    tmax = np.where(has_data, t[max_idx], np.nan)
+
+    # log-linear regression after the maximum
+    slope, intercept = _terminal_regression(t, c, valid, max_idx)
+    kel = -slope
+    with np.errstate(divide="ignore", invalid="ignore"):
+        thalf = np.log(2) / kel
+
+        # extrapolation from the last measured concentration
+        last_idx = n_time - 1 - np.argmax(valid[:, ::-1], axis=1)
+        c_last = np.where(has_data, c[rows, last_idx], np.nan)
+        aucinf = auc - c_last / slope
+
+    return {
+        "auc": auc,
+        "aucinf": aucinf,
+        "tmax": tmax,
+        "cmax": cmax,
+        "kel": kel,
+        "thalf": thalf,
+        "slope": slope,
+        "intercept": intercept,
+        "max_idx": max_idx,
+    }
+
+
+def _auc(t: np.ndarray, c: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """Trapezoid rule over the valid points, NaN values are bridged."""
+    n_scan, n_time = c.shape
+    idx = np.arange(n_time)
+
+    # index of the preceding valid point for every point
+    last_valid = np.maximum.accumulate(np.where(valid, idx, -1), axis=1)
+    prev = np.full_like(last_valid, -1)
+    prev[:, 1:] = last_valid[:, :-1]
+
+    use = valid & (prev >= 0)
+    prev_safe = np.where(use, prev, 0)
+    rows = np.arange(n_scan)[:, np.newaxis]
+    c_prev = c[rows, prev_safe]
+    dt = t[np.newaxis, :] - t[prev_safe]
+    area = np.where(use, dt * (c + c_prev) / 2.0, 0.0)
+    return area.sum(axis=1)
+
+
+def _terminal_regression(
+    t: np.ndarray, c: np.ndarray, valid: np.ndarray, max_idx: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Least squares fit of log(c) after the maximum.
+
+    At least three points after the maximum are required; positive slopes
+    are not physically meaningful and set to NaN.
+    """
+    n_scan, n_time = c.shape
+    idx = np.arange(n_time)[np.newaxis, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        y = np.log(c)
+    mask = valid & np.isfinite(y) & (idx > max_idx[:, np.newaxis])
+
+    n = mask.sum(axis=1)
+    x = np.broadcast_to(t, c.shape)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_mean = np.where(mask, x, 0.0).sum(axis=1) / n
+        y_mean = np.where(mask, y, 0.0).sum(axis=1) / n
+        dx = np.where(mask, x - x_mean[:, np.newaxis], 0.0)
+        dy = np.where(mask, y - y_mean[:, np.newaxis], 0.0)
+        slope = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+        intercept = y_mean - slope * x_mean
 
-    return pd.DataFrame(pk_dicts)
+    undefined = (max_idx > n_time - 4) | (n < 3) | ~(slope <= 0.0)
+    slope = np.where(undefined, np.nan, slope)
+    intercept = np.where(undefined, np.nan, intercept)
+    return slope, intercept